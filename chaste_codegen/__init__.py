@@ -1,14 +1,23 @@
 """
 Main module for cardiac Chaste code generation
+
+The public classes and functions are imported when they are first used, so that e.g. ``chaste_codegen --version`` or
+``--show-outputs`` don't need to load sympy and cellmlmanip.
+
+The MathML handlers for our custom math functions (``exp_``, ``abs_`` etc.) are registered with cellmlmanip's
+Transpiler by ``chaste_codegen.model_with_conversions``. Code loading models with ``cellmlmanip.load_model`` directly,
+rather than with ``load_model_with_conversions``, should import ``chaste_codegen.model_with_conversions`` first.
 """
-from cellmlmanip.parser import Transpiler
+import importlib
+import importlib.util
 
-from ._chaste_printer import ChastePrinter  # noqa
 #
 # Load constants and version information
 #
 from ._config import (  # noqa
     DATA_DIR,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_TEMPLATE_CACHE_DIR,
     LOGGER,
     MODULE_DIR,
     TEMPLATE_SUBDIR,
@@ -17,43 +26,55 @@ from ._config import (  # noqa
     __version_int__,
     version,
 )
-from ._labview_printer import LabviewPrinter  # noqa
-from ._load_template import load_template  # noqa
+
+
 #
-# Load and expose public classes and functions
+# Public classes and functions, by the module they are imported from when first used
 #
-from ._math_functions import (  # noqa
-    RealFunction,
-    abs_,
-    acos_,
-    cos_,
-    exp_,
-    sin_,
-    sqrt_,
-    subs_math_func_placeholders,
-)
-from .backward_euler_model import BackwardEulerModel  # noqa
-from .backward_euler_opt_model import BackwardEulerOptModel  # noqa
-from .chaste_model import ChasteModel  # noqa
-from .cvode_chaste_model import CvodeChasteModel  # noqa
-from .cvode_opt_chaste_model import OptCvodeChasteModel  # noqa
-from .generalised_rush_larsen_1_model import GeneralisedRushLarsenFirstOrderModel  # noqa
-from .generalised_rush_larsen_1_opt_model import GeneralisedRushLarsenFirstOrderModelOpt  # noqa
-from .generalised_rush_larsen_2_model import GeneralisedRushLarsenSecondOrderModel  # noqa
-from .generalised_rush_larsen_2_opt_model import GeneralisedRushLarsenSecondOrderModelOpt  # noqa
-from .model_with_conversions import add_conversions, load_model_with_conversions  # noqa
-from .normal_chaste_model import NormalChasteModel  # noqa
-from .opt_chaste_model import OptChasteModel  # noqa
-from .rush_larsen_c import RushLarsenC  # noqa
-from .rush_larsen_labview import RushLarsenLabview  # noqa
-from .rush_larsen_model import RushLarsenModel  # noqa
-from .rush_larsen_opt_model import RushLarsenOptModel  # noqa
-
-
-# Set transpiler to prodcue our custom classes in order to avoid premature simplification/canonisation
-Transpiler.set_mathml_handler('exp', exp_)
-Transpiler.set_mathml_handler('abs', abs_)
-Transpiler.set_mathml_handler('acos', acos_)
-Transpiler.set_mathml_handler('cos', cos_)
-Transpiler.set_mathml_handler('sqrt', sqrt_)
-Transpiler.set_mathml_handler('sin', sin_)
+_LAZY_ATTRIBUTES = {
+    'ChastePrinter': '_chaste_printer',
+    'PrintCache': '_chaste_printer',
+    'LabviewPrinter': '_labview_printer',
+    'load_template': '_load_template',
+    'RealFunction': '_math_functions',
+    'abs_': '_math_functions',
+    'acos_': '_math_functions',
+    'cos_': '_math_functions',
+    'exp_': '_math_functions',
+    'sin_': '_math_functions',
+    'sqrt_': '_math_functions',
+    'subs_math_func_placeholders': '_math_functions',
+    'BackwardEulerModel': 'backward_euler_model',
+    'BackwardEulerOptModel': 'backward_euler_opt_model',
+    'ChasteModel': 'chaste_model',
+    'CvodeChasteModel': 'cvode_chaste_model',
+    'OptCvodeChasteModel': 'cvode_opt_chaste_model',
+    'GeneralisedRushLarsenFirstOrderModel': 'generalised_rush_larsen_1_model',
+    'GeneralisedRushLarsenFirstOrderModelOpt': 'generalised_rush_larsen_1_opt_model',
+    'GeneralisedRushLarsenSecondOrderModel': 'generalised_rush_larsen_2_model',
+    'GeneralisedRushLarsenSecondOrderModelOpt': 'generalised_rush_larsen_2_opt_model',
+    'add_conversions': 'model_with_conversions',
+    'load_model_with_conversions': 'model_with_conversions',
+    'NormalChasteModel': 'normal_chaste_model',
+    'OptChasteModel': 'opt_chaste_model',
+    'RushLarsenC': 'rush_larsen_c',
+    'RushLarsenLabview': 'rush_larsen_labview',
+    'RushLarsenModel': 'rush_larsen_model',
+    'RushLarsenOptModel': 'rush_larsen_opt_model',
+}
+
+
+def __getattr__(name):
+    """ Import public classes and functions (and submodules e.g. ``chaste_codegen.chaste_model``) on first use """
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module('.' + _LAZY_ATTRIBUTES[name], __name__), name)
+    elif not name.startswith('__') and importlib.util.find_spec('.' + name, __name__) is not None:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
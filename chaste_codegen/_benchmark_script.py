@@ -0,0 +1,241 @@
+######################################################################
+#       Benchmarks for code generation, for running as executable    #
+######################################################################
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import cellmlmanip
+import sympy
+
+import chaste_codegen as cg
+from chaste_codegen import (
+    DATA_DIR,
+    LOGGER,
+    CodegenError,
+    load_model_with_conversions,
+)
+from chaste_codegen._command_line_script import EXTENSION_LOOKUP_FROM_CONVERSION_TYPE, TRANSLATORS, TRANSLATORS_OPT
+from chaste_codegen._load_template import set_template_cache_dir
+from chaste_codegen._script_utils import write_file
+
+
+try:
+    import resource
+except ImportError:  # pragma: no linux cover
+    resource = None  # not available on Windows
+
+
+# Folder with the CellML models used in the tests, benchmarked by default
+DEFAULT_MODELS = os.path.join(DATA_DIR, 'tests', 'cellml', 'cellml')
+
+# Model types that need to be generated from a model without chaste specific conversions
+SKIP_CONVERSION_TYPES = ('rush-larsen-labview', 'rush-larsen-c')
+
+# Benchmarked times below this (in seconds) are not compared, as they are dominated by noise
+MIN_COMPARE_TIME = 0.1
+
+
+def get_benchmarks():
+    """ Get all model types to benchmark
+
+    :return: dict of benchmark name to (model type as used in TRANSLATORS, translator entry)
+             where the names of optimised model types have -opt appended e.g. ``cvode-opt``.
+    """
+    benchmarks = {model_type: (model_type, translator) for model_type, translator in TRANSLATORS.items()}
+    benchmarks.update({model_type + '-opt': (model_type, translator)
+                       for model_type, translator in TRANSLATORS_OPT.items()})
+    return benchmarks
+
+
+def get_model_files(models):
+    """ Get the cellml files given directly or in the given folders, sorted by name """
+    model_files = []
+    for model in models:
+        if os.path.isdir(model):
+            model_files.extend(os.path.join(model, f) for f in os.listdir(model) if f.endswith('.cellml'))
+        elif os.path.isfile(model):
+            model_files.append(model)
+        else:
+            raise CodegenError('Could not find cellml file or folder %s ' % model)
+    return sorted(model_files, key=os.path.basename)
+
+
+def _peak_rss():
+    """ Get the peak resident set size of this process in bytes, or None if it can't be determined """
+    if resource is None:  # pragma: no linux cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes on linux
+
+
+def benchmark_model(model_file, benchmarks, use_analytic_jacobian=False):
+    """ Benchmark loading a model and generating code for each of the given model types
+
+    Intended to be run in a fresh process, so that the peak memory use is that of this model only and so that no
+    results are re-used from (sympy) caches. Compiled templates are not re-used from earlier runs either.
+
+    :param model_file: the cellml file to benchmark.
+    :param benchmarks: list of benchmark names, as returned by :meth:`get_benchmarks`.
+    :param use_analytic_jacobian: generate cvode models with analytic jacobian.
+    :return: dict with the time taken to load the model (in seconds), the peak memory use (in bytes) and for each
+             model type the time taken to convert the model (set up the translator) and to generate code.
+             Errors are stored instead of raised.
+    """
+    set_template_cache_dir(None)
+    all_benchmarks = get_benchmarks()
+    model_name = os.path.splitext(os.path.basename(model_file))[0]
+    result = {'load': {}, 'model_types': {}, 'peak_rss': None}
+    models = {}
+    for benchmark in benchmarks:
+        model_type, (translator_class, class_postfix, _, _, _) = all_benchmarks[benchmark]
+        skip_conversions = model_type in SKIP_CONVERSION_TYPES
+        load = 'without_conversions' if skip_conversions else 'with_conversions'
+        timings = {}
+        try:
+            if load not in models:
+                start = time.perf_counter()
+                models[load] = load_model_with_conversions(model_file, quiet=True, skip_conversions=skip_conversions)
+                result['load'][load] = time.perf_counter() - start
+
+            ext = EXTENSION_LOOKUP_FROM_CONVERSION_TYPE.get(translator_class, translator_class.DEFAULT_EXTENSIONS)
+            kwargs = {'class_name': 'Cell' + model_name + class_postfix, 'header_ext': ext[0],
+                      'cvode_data_clamp': model_type == 'cvode-data-clamp',
+                      'use_analytic_jacobian': use_analytic_jacobian}
+            start = time.perf_counter()
+            with translator_class(models[load], model_name, **kwargs) as chaste_model:
+                timings['convert'] = time.perf_counter() - start
+                start = time.perf_counter()
+                chaste_model.generate_chaste_code()
+                timings['generate'] = time.perf_counter() - start
+        except Exception as e:
+            timings['error'] = '%s: %s' % (type(e).__name__, e)
+            LOGGER.debug(traceback.format_exc())
+        result['model_types'][benchmark] = timings
+    result['peak_rss'] = _peak_rss()
+    return result
+
+
+def run_benchmarks(model_files, benchmarks, use_analytic_jacobian=False):
+    """ Benchmark each model in its own process
+
+    :return: dict with version information and for each model the results of :meth:`benchmark_model`
+    """
+    results = {'chaste_codegen_version': cg.__version__,
+               'cellmlmanip_version': cellmlmanip.__version__,
+               'sympy_version': sympy.__version__,
+               'python_version': platform.python_version(),
+               'platform': platform.platform(),
+               'use_analytic_jacobian': use_analytic_jacobian,
+               'models': {}}
+    # A fresh (spawned) process for each model, so that each model starts with cold caches and its own peak memory
+    context = multiprocessing.get_context('spawn')
+    for i, model_file in enumerate(model_files):
+        model_name = os.path.splitext(os.path.basename(model_file))[0]
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(benchmark_model, model_file, benchmarks, use_analytic_jacobian).result()
+        results['models'][model_name] = result
+        total = sum(result['load'].values()) + \
+            sum(t.get('convert', 0) + t.get('generate', 0) for t in result['model_types'].values())
+        errors = [b for b, t in result['model_types'].items() if 'error' in t]
+        LOGGER.info('[%d/%d] Benchmarked %s in %.2fs%s', i + 1, len(model_files), model_name, total,
+                    ' (failed: %s)' % ', '.join(errors) if errors else '')
+    return results
+
+
+def _flatten(results):
+    """ Get a dict of (model, phase) to time taken, for all timings in benchmark results """
+    timings = {}
+    for model_name, result in results['models'].items():
+        for load, duration in result['load'].items():
+            timings[(model_name, 'load_' + load)] = duration
+        for benchmark, model_type_timings in result['model_types'].items():
+            for phase in ('convert', 'generate'):
+                if phase in model_type_timings:
+                    timings[(model_name, benchmark + '/' + phase)] = model_type_timings[phase]
+    return timings
+
+
+def compare_results(results, baseline, threshold):
+    """ Compare benchmark results with a baseline
+
+    :param results: benchmark results, as returned by :meth:`run_benchmarks`.
+    :param baseline: benchmark results to compare with.
+    :param threshold: the ratio of new to baseline time above which something is considered a slowdown.
+    :return: list of (model, phase, baseline time, new time) for each slowdown, sorted by ratio (largest first).
+             Phases that took less than MIN_COMPARE_TIME in both runs are ignored.
+    """
+    assert threshold > 0, 'Expecting a positive threshold'
+    new_timings, baseline_timings = _flatten(results), _flatten(baseline)
+    slowdowns = []
+    for key, new_time in new_timings.items():
+        baseline_time = baseline_timings.get(key)
+        if baseline_time is not None and max(baseline_time, new_time) >= MIN_COMPARE_TIME and \
+                new_time > threshold * baseline_time:
+            slowdowns.append(key + (baseline_time, new_time))
+    return sorted(slowdowns, key=lambda s: s[3] / max(s[2], 1e-9), reverse=True)
+
+
+def process_command_line():
+    benchmarks = get_benchmarks()
+    parser = argparse.ArgumentParser(description='Benchmark chaste code generation for cellml models, measuring the '
+                                     'time taken to load, convert and generate code for each model type and the peak '
+                                     'memory use.')
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s {version}'.format(version=cg.__version__))
+    parser.add_argument('models', nargs='*', default=[DEFAULT_MODELS],
+                        help='cellml files or folders containing cellml files to benchmark [default: the cellml '
+                        'models used in the chaste_codegen tests]')
+    parser.add_argument('--model-types', nargs='+', choices=list(benchmarks), default=list(benchmarks),
+                        metavar='MODEL_TYPE', help='the model types to benchmark, append -opt for optimised model '
+                        'types e.g. cvode-opt [default: all model types]')
+    parser.add_argument('-j', '--use-analytic-jacobian', action='store_true', default=False,
+                        help='use a symbolic Jacobian for cvode model types')
+    parser.add_argument('-o', '--output', default=None, metavar='FILE',
+                        help='write the benchmark results as json to FILE, for use as baseline in later runs')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='compare the results with the json results of an earlier run, reporting slowdowns')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='with --compare, report phases taking more than THRESHOLD times as long as in the '
+                        'baseline [default: %(default)s]')
+    args = parser.parse_args()
+
+    model_files = get_model_files(args.models)
+    if len(model_files) == 0:
+        raise CodegenError('No cellml files found in %s ' % ' '.join(args.models))
+    if args.threshold <= 0:
+        raise CodegenError('--threshold needs to be positive!')
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(model_files, args.model_types, use_analytic_jacobian=args.use_analytic_jacobian)
+    if args.output is not None:
+        write_file(args.output, json.dumps(results, indent=4) + '\n')
+        LOGGER.info('Benchmark results written to %s', args.output)
+
+    if baseline is not None:
+        slowdowns = compare_results(results, baseline, args.threshold)
+        for model_name, phase, baseline_time, new_time in slowdowns:
+            LOGGER.warning('%s %s: %.2fs -> %.2fs (%.2fx slower)', model_name, phase, baseline_time, new_time,
+                           new_time / max(baseline_time, 1e-9))
+        if len(slowdowns) > 0:
+            raise CodegenError('%d benchmarks were more than %sx slower than the baseline' %
+                               (len(slowdowns), args.threshold))
+        LOGGER.info('No benchmarks were more than %sx slower than the baseline', args.threshold)
+
+
+def chaste_codegen_bench():
+    try:
+        process_command_line()
+    except CodegenError as e:
+        LOGGER.error(e, exc_info=False)
+        return 1
+    return 0
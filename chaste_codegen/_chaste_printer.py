@@ -1,5 +1,10 @@
+from collections import OrderedDict
+from functools import lru_cache
+
 from cellmlmanip.printer import Printer
 from sympy import (
+    Basic,
+    Expr,
     Mul,
     Not,
     Piecewise,
@@ -7,14 +12,77 @@ from sympy import (
     Rational,
     S,
 )
+from sympy.codegen.rewriting import optimize
 from sympy.core.mul import _keep_coeff
 from sympy.printing import cxxcode
 from sympy.printing.precedence import precedence
+from sympy.printing.printer import Printer as SympyPrinter
+
+from chaste_codegen._config import LOGGER
 
 
 C_MAX_INT = 2147483647
 C_MIN_INT = -2147483647
 
+# The maximum number of entries in a PrintCache
+PRINT_CACHE_SIZE = 100000
+
+# Markers to distinguish cache entries for optimized expressions and printed sub-expressions from printed expressions
+_OPTIMIZED, _SUB_EXPRESSION = object(), object()
+
+
+@lru_cache(maxsize=PRINT_CACHE_SIZE)
+def _format_float(value):
+    """ Print a float in C++, as an int if it is an integer between min & max int in c++."""
+    if value.is_integer() and C_MIN_INT < value < C_MAX_INT:
+        return cxxcode(int(value), standard='C++11')
+    return cxxcode(value, standard='C++11')
+
+
+class PrintCache:
+    """
+    A cache of printed expressions, which evicts the least recently used entries once it is full.
+
+    A cache can be shared by several :class:`ChastePrinter` objects, e.g. by the printers of different translators for
+    the same model. Printed expressions are stored by expression and printer configuration (see ``cache_key`` in
+    :class:`ChastePrinter`), so that printers only share printed expressions if they are configured the same way.
+    """
+
+    def __init__(self, max_size=PRINT_CACHE_SIZE):
+        assert max_size > 0, 'Expecting a positive max_size'
+        self.max_size = max_size
+        self.hits, self.misses = 0, 0
+        self._entries = OrderedDict()
+        self._config_ids = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """ Get the entry for ``key``, calling ``compute()`` to calculate it if it is not in the cache. """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = self._entries[key] = compute()
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def config_id(self, config):
+        """ A small id for the (hashable) printer configuration ``config``, the same for equal configurations.
+            Cache keys using the id rather than a large configuration are cheap to hash. """
+        return self._config_ids.setdefault(config, len(self._config_ids))
+
+    def log_statistics(self, name):
+        """ Log the number of hits and misses so far (at debug level). """
+        lookups = self.hits + self.misses
+        LOGGER.debug('%s print cache: %d hits, %d misses (%.1f%% hit rate), %d entries' %
+                     (name, self.hits, self.misses, 100.0 * self.hits / max(lookups, 1), len(self)))
+
 
 class ChastePrinter(Printer):
     """
@@ -31,6 +99,13 @@ class ChastePrinter(Printer):
         A function that converts derivatives to strings.
     ``lookup_table_function``
         A function that prints lookup table expressions or returns None if the expression is not in the lookup table.
+    ``cache``
+        An optional :class:`PrintCache` to store printed expressions (and their sub-expressions) in.
+    ``cache_key``
+        A function returning the printer configuration: everything other than the expression itself that the printed
+        output depends on, e.g. how variables are printed and the state of the lookup tables. Used with ``cache``.
+        Cached entries record the lookup table expressions used in printing them, which are passed to
+        ``lookup_table_function`` again when an entry is taken from the cache.
 
     """
     _function_names = {
@@ -94,18 +169,75 @@ class ChastePrinter(Printer):
         'pi': 'M_PI',
     }
 
-    def __init__(self, symbol_function=None, derivative_function=None, lookup_table_function=lambda e: None):
+    def __init__(self, symbol_function=None, derivative_function=None, lookup_table_function=lambda e: None,
+                 cache=None, cache_key=lambda: None):
         super().__init__(symbol_function, derivative_function)
         self.lookup_table_function = lookup_table_function
+        self.cache = cache
+        self.cache_key = cache_key
+        # Cache key for the sub-expressions of the expression being printed, None when not caching
+        self._sub_expression_key = None
+        # Lookup table expressions used in printing the cache entry being computed, None when not caching
+        self._lookup_exprs = None
+
+    def doprint(self, expr):
+        """Returns printer's representation for expr (as a string), using the cache if there is one."""
+        if self.cache is None or not isinstance(expr, Basic):
+            return super().doprint(expr)
+        outer_key = self._sub_expression_key
+        config = self.cache_key()
+        self._sub_expression_key = (config, _SUB_EXPRESSION)
+        try:
+            return self._get_cached((expr, config), lambda: self._doprint_uncached(expr))
+        finally:
+            self._sub_expression_key = outer_key
+
+    def _get_cached(self, key, compute):
+        """Gets the printed expression for key from the cache, calling compute() to print it if it is not cached.
+
+        Entries are stored with the lookup table expressions used in printing them. These are passed to
+        lookup_table_function again when an entry is taken from the cache, so that their use is recorded (e.g. by the
+        lookup tables of another translator sharing the cache).
+        """
+        outer_lookup_exprs, self._lookup_exprs = self._lookup_exprs, []
+
+        def compute_entry():
+            printed = compute()
+            return printed, tuple(self._lookup_exprs)
+        try:
+            printed, lookup_exprs = self.cache.get(key, compute_entry)
+            if lookup_exprs and not self._lookup_exprs:  # taken from the cache
+                for expr in lookup_exprs:
+                    self.lookup_table_function(expr)
+        finally:
+            self._lookup_exprs = outer_lookup_exprs
+        if outer_lookup_exprs is not None:
+            outer_lookup_exprs.extend(lookup_exprs)
+        return printed
+
+    def _doprint_uncached(self, expr):
+        """Optimizes and prints expr, as the base class does, caching the (configuration independent) optimization."""
+        if isinstance(expr, Expr):
+            expr = self.cache.get((expr, _OPTIMIZED), lambda: optimize(expr, self._optims))
+        return SympyPrinter.doprint(self, expr)
 
     def _print(self, expr, **kwargs):
         """Internal dispatcher.
 
         Here we intercept lookup table expressions if we have lookup tables.
         Otherwise the base class method is used.
+        When caching, sub-expressions that have been printed before are taken from the cache.
         """
+        if self._sub_expression_key is not None and not kwargs and isinstance(expr, Basic) and expr.args:
+            return self._get_cached((expr, ) + self._sub_expression_key, lambda: self._print_uncached(expr))
+        return self._print_uncached(expr, **kwargs)
+
+    def _print_uncached(self, expr, **kwargs):
+        """Prints expr, or its lookup table entry if it is in a lookup table."""
         printed_expr = self.lookup_table_function(expr)
         if printed_expr:
+            if self._lookup_exprs is not None:
+                self._lookup_exprs.append(expr)
             return printed_expr
         return super()._print(expr, **kwargs)
 
@@ -149,11 +281,7 @@ class ChastePrinter(Printer):
 
     def _print_float(self, expr):
         """ Handles ``float``s. """
-        # print integers as int if they are between min & max int in c++
-        if expr.is_integer() and C_MIN_INT < expr < C_MAX_INT:
-            return cxxcode(int(expr), standard='C++11')
-        else:
-            return cxxcode(float(expr), standard='C++11')
+        return _format_float(float(expr))
 
     def _print_int(self, expr):
         """ Handles ``ints``s. """
@@ -2,49 +2,110 @@
 #                    For running as an executable                    #
 ######################################################################
 import argparse
+import io
+import json
+import logging
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 
 import chaste_codegen as cg
-from chaste_codegen import LOGGER, CodegenError, load_model_with_conversions
-from chaste_codegen._lookup_tables import DEFAULT_LOOKUP_PARAMETERS
-from chaste_codegen._script_utils import write_file
+from chaste_codegen import DEFAULT_CACHE_DIR, LOGGER, CodegenError
+from chaste_codegen._config import (
+    CSE_ENGINES,
+    DEFAULT_LOOKUP_PARAMETERS,
+    LOOKUP_TABLE_INTERPOLATIONS,
+    PIECEWISE_FOLDS,
+    get_cache_subdir,
+)
+from chaste_codegen._script_utils import (
+    file_hash,
+    read_manifest,
+    write_file,
+    write_manifest,
+)
+from chaste_codegen._timings import (
+    add_phases,
+    is_recording,
+    profile,
+    record_timings,
+    timed,
+)
 
 
 # Link names to classes for converting code
 # The fields in the order dict as as follows:
 # (<command_line_tag> (<class name>, <default class postfix>, <default file postfix>, <can be used with modifiers>))
+# TRANSLATOR_NAMES (and TRANSLATOR_NAMES_OPT) give the classes by name, so that they are only imported (from
+# chaste_codegen) when generating code, see get_translator_class. TRANSLATORS and TRANSLATORS_OPT give the classes
+# themselves, and are created on first use.
 
 # pass --<command_line_tag> to select this model type
 
-TRANSLATORS = dict(
-    [('normal', (cg.NormalChasteModel, 'FromCellML', '', True, '')),
-     ('cvode', (cg.CvodeChasteModel, 'FromCellMLCvode', 'Cvode', True, '')),
-     ('cvode-data-clamp', (cg.CvodeChasteModel, 'FromCellMLCvodeDataClamp', 'CvodeDataClamp', True, '')),
-     ('backward-euler', (cg.BackwardEulerModel, 'FromCellMLBackwardEuler', 'BackwardEuler', False, '')),
-     ('rush-larsen', (cg.RushLarsenModel, 'FromCellMLRushLarsen', 'RushLarsen', False, '')),
-     ('grl1', (cg.GeneralisedRushLarsenFirstOrderModel, 'FromCellMLGRL1', 'GRL1', False, '')),
-     ('grl2', (cg.GeneralisedRushLarsenSecondOrderModel, 'FromCellMLGRL2', 'GRL2', False, '')),
-     ('rush-larsen-labview', (cg.RushLarsenLabview, '', '', False,
+TRANSLATOR_NAMES = dict(
+    [('normal', ('NormalChasteModel', 'FromCellML', '', True, '')),
+     ('cvode', ('CvodeChasteModel', 'FromCellMLCvode', 'Cvode', True, '')),
+     ('cvode-data-clamp', ('CvodeChasteModel', 'FromCellMLCvodeDataClamp', 'CvodeDataClamp', True, '')),
+     ('backward-euler', ('BackwardEulerModel', 'FromCellMLBackwardEuler', 'BackwardEuler', False, '')),
+     ('rush-larsen', ('RushLarsenModel', 'FromCellMLRushLarsen', 'RushLarsen', False, '')),
+     ('grl1', ('GeneralisedRushLarsenFirstOrderModel', 'FromCellMLGRL1', 'GRL1', False, '')),
+     ('grl2', ('GeneralisedRushLarsenSecondOrderModel', 'FromCellMLGRL2', 'GRL2', False, '')),
+     ('rush-larsen-labview', ('RushLarsenLabview', '', '', False,
                               ' in mastrcriptRT with added injection current(i_inj)')),
-     ('rush-larsen-c', (cg.RushLarsenC, '', '', False, ' in C with added injection current(i_inj)'))])
+     ('rush-larsen-c', ('RushLarsenC', '', '', False, ' in C with added injection current(i_inj)'))])
 
-TRANSLATORS_OPT = dict(
-    [('normal', (cg.OptChasteModel, 'FromCellMLOpt', 'Opt', True, '')),
-     ('cvode', (cg.OptCvodeChasteModel, 'FromCellMLCvodeOpt', 'CvodeOpt', True, '')),
-     ('cvode-data-clamp', (cg.OptCvodeChasteModel, 'FromCellMLCvodeDataClampOpt', 'CvodeDataClampOpt', True, '')),
-     ('backward-euler', (cg.BackwardEulerOptModel, 'FromCellMLBackwardEulerOpt', 'BackwardEulerOpt', False, '')),
-     ('rush-larsen', (cg.RushLarsenOptModel, 'FromCellMLRushLarsenOpt', 'RushLarsenOpt', False, '')),
-     ('grl1', (cg.GeneralisedRushLarsenFirstOrderModelOpt, 'FromCellMLGRL1Opt', 'GRL1', False, '')),
-     ('grl2', (cg.GeneralisedRushLarsenSecondOrderModelOpt, 'FromCellMLGRL2Opt', 'GRL2', False, ''))])
+TRANSLATOR_NAMES_OPT = dict(
+    [('normal', ('OptChasteModel', 'FromCellMLOpt', 'Opt', True, '')),
+     ('cvode', ('OptCvodeChasteModel', 'FromCellMLCvodeOpt', 'CvodeOpt', True, '')),
+     ('cvode-data-clamp', ('OptCvodeChasteModel', 'FromCellMLCvodeDataClampOpt', 'CvodeDataClampOpt', True, '')),
+     ('backward-euler', ('BackwardEulerOptModel', 'FromCellMLBackwardEulerOpt', 'BackwardEulerOpt', False, '')),
+     ('rush-larsen', ('RushLarsenOptModel', 'FromCellMLRushLarsenOpt', 'RushLarsenOpt', False, '')),
+     ('grl1', ('GeneralisedRushLarsenFirstOrderModelOpt', 'FromCellMLGRL1Opt', 'GRL1', False, '')),
+     ('grl2', ('GeneralisedRushLarsenSecondOrderModelOpt', 'FromCellMLGRL2Opt', 'GRL2', False, ''))])
 
-TRANSLATORS_WITH_MODIFIERS = tuple('--' + t for t in TRANSLATORS if TRANSLATORS[t][3])
+TRANSLATORS_WITH_MODIFIERS = tuple('--' + t for t in TRANSLATOR_NAMES if TRANSLATOR_NAMES[t][3])
 
 
 # Store extensions we can use and how to use them, based on extension of given outfile
 EXTENSION_LOOKUP_FROM_OUTFILE = {'.cellml': ['.hpp', '.cpp'], '': ['.hpp', '.cpp'], '.cpp': ['.hpp', '.cpp'],
                                  '.hpp': ['.hpp', '.cpp'], '.c': ['.h', '.c'], '.h': ['.h', '.c']}
 
-EXTENSION_LOOKUP_FROM_CONVERSION_TYPE = {cg.RushLarsenC: ['.h', '.c'], cg.RushLarsenLabview: [None, '.txt']}
+EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME = {'RushLarsenC': ['.h', '.c'], 'RushLarsenLabview': [None, '.txt']}
+
+# Extension of the manifest files written with --incremental
+MANIFEST_EXT = '.manifest.json'
+
+# Arguments that don't affect the generated code, and so aren't stored in manifests
+# (the model type arguments are also left out, as the translator class is stored)
+MANIFEST_IGNORED_ARGS = ('cellml_file', 'quiet', 'show_outputs', 'incremental', 'batch', 'jobs', 'translator_jobs',
+                         'timings', 'profile', 'cache_dir', 'no_cache')
+
+# Arguments that don't affect the analysis of a model by a translator, only how the results are printed (or where to),
+# and so aren't part of the key the analysis results are cached under
+ANALYSIS_IGNORED_ARGS = MANIFEST_IGNORED_ARGS + ('class_name', 'cls_name', 'outfile', 'output_dir', 'cellml_base',
+                                                 'header_ext', 'dynamically_loadable', 'use_model_factory',
+                                                 'lazy_lookup_tables', 'opt')
+
+
+def get_translator_class(translator_name):
+    """ Get the translator class with the given name, as used in TRANSLATOR_NAMES, importing it if necessary """
+    return getattr(cg, translator_name)
+
+
+def __getattr__(name):
+    """ Create the tables linking to the translator classes (which imports them) on first use """
+    if name in ('TRANSLATORS', 'TRANSLATORS_OPT'):
+        names = TRANSLATOR_NAMES if name == 'TRANSLATORS' else TRANSLATOR_NAMES_OPT
+        value = {model_type: (get_translator_class(translator[0]),) + translator[1:]
+                 for model_type, translator in names.items()}
+    elif name == 'EXTENSION_LOOKUP_FROM_CONVERSION_TYPE':
+        value = {get_translator_class(translator_name): ext
+                 for translator_name, ext in EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME.items()}
+    else:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    globals()[name] = value
+    return value
 
 
 def print_default_lookup_params():
@@ -68,13 +129,14 @@ def process_command_line():
 
     parser.add_argument('--version', action='version',
                         version='%(prog)s {version}'.format(version=cg.__version__))
-    parser.add_argument('cellml_file', metavar='cellml_file', help='The cellml file to convert to chaste code')
+    parser.add_argument('cellml_file', metavar='cellml_file', help='The cellml file to convert to chaste code '
+                        '(or with --batch: a folder of cellml files or a text file listing cellml files)')
 
     group = parser.add_argument_group('ModelTypes', 'The different types of solver approach for which code can be '
                                       'generated; if no model type is set, "normal" models are generated')
 
-    for k in TRANSLATORS:
-        group.add_argument('--' + k, help='Generate ' + k + ' model type' + TRANSLATORS[k][4], action='store_true')
+    for k in TRANSLATOR_NAMES:
+        group.add_argument('--' + k, help='Generate ' + k + ' model type' + TRANSLATOR_NAMES[k][4], action='store_true')
 
     group = parser.add_argument_group('Transformations', 'These options control which transformations '
                                       '(typically optimisations) are applied in the generated code')
@@ -82,6 +144,30 @@ def process_command_line():
                        action='store_true', help='use a symbolic Jacobian calculated by SymPy '
                        '(--use-analytic-jacobian only works in combination with --cvode'
                        ' and is ignored for other model types)')
+    group.add_argument('--diagonal-jacobian', dest='diagonal_jacobian', default=False, action='store_true',
+                       help='only calculate the diagonal of the symbolic Jacobian, which is all the generalised '
+                       'Rush-Larsen model types use, rather than the full Jacobian. This is faster for large models, '
+                       'but the common terms are chosen differently, so the generated code differs '
+                       '(--diagonal-jacobian only works in combination with --grl1 or --grl2 and is ignored for other '
+                       'model types)')
+    group.add_argument('--chain-rule-jacobian', dest='chain_rule_jacobian', default=False, action='store_true',
+                       help='calculate the symbolic Jacobian by differentiating each equation once and combining the '
+                       'results with the chain rule, rather than differentiating the derivatives with all '
+                       'intermediate variables substituted in. The intermediate variables are kept in the generated '
+                       'code, which is faster to generate and smaller for large models, but differs from the default '
+                       '(--chain-rule-jacobian only works in combination with --backward-euler, --grl1, --grl2 or '
+                       '--cvode with -j and is ignored for other model types)')
+    group.add_argument('--cse', default='sympy', choices=CSE_ENGINES,
+                       help="how common subexpressions are found, in the symbolic Jacobian and when folding piecewise "
+                       "expressions: 'sympy' uses sympy's cse, 'hash' only extracts repeated subexpressions, found in "
+                       "a single pass over the expressions, which is faster for large models, but the generated code "
+                       "differs from the default")
+    group.add_argument('--piecewise-fold', default='sympy', choices=PIECEWISE_FOLDS,
+                       help="how piecewise expressions are lifted out of the expressions they are used in, when "
+                       "partially evaluating equations: 'sympy' uses sympy's piecewise_fold, 'lift' combines the "
+                       "pieces in a single pass over the expressions, without simplifying the conditions, which is "
+                       "faster for models with many piecewise expressions (e.g. singularity fixes), but the generated "
+                       "code differs from the default")
 
     group = parser.add_argument_group('Generated code options')
     group.add_argument('-o', dest='outfile', metavar='OUTFILE', default=None,
@@ -98,6 +184,13 @@ def process_command_line():
                        help="quiet operation, don't print informational messages to screen")
     group.add_argument('--skip-singularity-fixes', action='store_true', default=False,
                        help="skip singularity fixes in Goldman-Hodgkin-Katz (GHK) equations.")
+    group.add_argument('--incremental', action='store_true', default=False,
+                       help="only generate code if the cellml file, options or chaste_codegen version changed since "
+                       "the last run and only write files whose contents changed. A manifest file is written next to "
+                       "the generated code to keep track of this.")
+    group.add_argument('--translator-jobs', type=int, default=1, metavar='N',
+                       help='the number of worker processes used to generate code for the selected model types in '
+                       'parallel. Each worker works on its own copy of the model. [default: 1]')
 
     group = parser.add_argument_group('Chaste options', description='Options specific to Chaste code output')
     group.add_argument('-y', '--dll', '--dynamically-loadable', dest='dynamically_loadable',
@@ -117,19 +210,88 @@ def process_command_line():
                             '(optional). --lookup-table can be added multiple times to indicate multiple lookup tables'
                             '. Please note: Can only be used in combination with --opt. If the arguments are omitted, '
                             'following defaults will be used: %s.' % print_default_lookup_params())
+    group.add_argument('--lookup-table-interpolation', choices=LOOKUP_TABLE_INTERPOLATIONS, default='linear',
+                       help='how to interpolate values from lookup tables: linear, or cubic (Catmull-Rom) which is '
+                       'more accurate for a given step size. Please note: Can only be used in combination with --opt. '
+                       '[default: %(default)s]')
+    group.add_argument('--lookup-table-tolerance', type=float, default=None, metavar='TOL',
+                       help='choose the step size of each lookup table automatically, as the largest step (a power '
+                       'of 2 times the given step) for which all expressions in the table can be interpolated with an '
+                       'error below TOL (relative, or absolute for values below 1). Please note: Can only be used in '
+                       'combination with --opt.')
+    group.add_argument('--lazy-lookup-tables', action='store_true', default=False,
+                       help='only interpolate the lookup table columns a method reads, when they are read, instead of '
+                       'interpolating the whole table row at the start of each method that uses the table. Please '
+                       'note: Can only be used in combination with --opt.')
+    group.add_argument('--lookup-table-2d', action='store_true', default=False,
+                       help='put expensive expressions that depend on exactly 2 of the lookup table variables (e.g. '
+                       'membrane_voltage and cytosolic_calcium_concentration) in 2-D lookup tables using bilinear '
+                       'interpolation, with the ranges and steps of the 2 --lookup-table entries (steps are increased '
+                       'if the table would get too large). Without this option such expressions are only reported. '
+                       'Please note: Can only be used in combination with --opt.')
     group.add_argument('--use-model-factory', action='store_true', default=False,
                        help='Make use of ModelFactoy method to allow creating models by name. '
                        'Requires ModelFactory.hpp/cpp found in the ApPredict project.')
 
+    group = parser.add_argument_group('Batch options', description='Options for converting many models in one go')
+    group.add_argument('--batch', action='store_true', default=False,
+                       help='convert all models given by cellml_file, which is either a folder containing .cellml '
+                       'files or a text file listing one cellml file per line. Conversion continues past models '
+                       'that fail to convert and a summary is given at the end.')
+    group.add_argument('--jobs', type=int, default=None, metavar='N',
+                       help='the number of worker processes to use with --batch [default: number of CPUs]')
+
+    group = parser.add_argument_group('Cache options', description='Options for caching loaded and converted models')
+    group.add_argument('--cache-dir', action='store', default=DEFAULT_CACHE_DIR,
+                       help='directory to cache converted models and the results of analysing them in, so that '
+                       'converting the same model again is faster. Compiled templates and the index of the '
+                       'ontology are stored next to it, in folders called templates and ontology '
+                       '[default: $XDG_CACHE_HOME/chaste_codegen/models or ~/.cache/chaste_codegen/models]')
+    group.add_argument('--no-cache', action='store_true', default=False,
+                       help="don't use or update the caches of converted models, compiled templates and the ontology "
+                       "index")
+
+    group = parser.add_argument_group('Profiling options', description='Options for finding out where time is spent')
+    group.add_argument('--timings', default=None, metavar='FILE',
+                       help='write a json report with the wall time, number of calls and peak memory use of each '
+                       'phase of code generation to FILE. Tracing memory use slows down code generation.')
+    group.add_argument('--profile', default=None, metavar='DIR',
+                       help='run cProfile and write the stats for loading the model and for each model type to a '
+                       '.pstats file in DIR, for use with pstats or e.g. snakeviz')
+
     # process options
     args = parser.parse_args()
 
-    if not os.path.isfile(args.cellml_file):
+    if args.batch:
+        if not os.path.exists(args.cellml_file):
+            raise CodegenError("Could not find batch folder or file %s " % args.cellml_file)
+        if args.outfile is not None:
+            raise CodegenError("-o cannot be used with --batch!")
+        if args.cls_name is not None:
+            raise CodegenError("-c cannot be used with --batch!")
+        if args.jobs is not None and args.jobs < 1:
+            raise CodegenError("--jobs needs to be at least 1!")
+        if args.translator_jobs != 1:
+            raise CodegenError("--translator-jobs cannot be used with --batch, use --jobs instead!")
+        if args.timings is not None or args.profile is not None:
+            raise CodegenError("--timings and --profile cannot be used with --batch!")
+    elif not os.path.isfile(args.cellml_file):
         raise CodegenError("Could not find cellml file %s " % args.cellml_file)
     if args.outfile is not None and args.output_dir is not None:
         raise CodegenError("-o and --output-dir cannot be used together!")
+    if args.translator_jobs < 1:
+        raise CodegenError("--translator-jobs needs to be at least 1!")
     if args.lookup_table and not args.opt:
         raise CodegenError("Can only use lookup tables in combination with --opt")
+    if (args.lookup_table_interpolation != 'linear' or args.lookup_table_tolerance is not None) and not args.opt:
+        raise CodegenError("Can only use --lookup-table-interpolation and --lookup-table-tolerance in combination "
+                           "with --opt")
+    if args.lazy_lookup_tables and not args.opt:
+        raise CodegenError("Can only use --lazy-lookup-tables in combination with --opt")
+    if args.lookup_table_2d and not args.opt:
+        raise CodegenError("Can only use --lookup-table-2d in combination with --opt")
+    if args.lookup_table_tolerance is not None and args.lookup_table_tolerance <= 0:
+        raise CodegenError("--lookup-table-tolerance needs to be positive!")
 
     # make sure --lookup-table entries are 1 string and 3 floats
     if args.lookup_table is None:
@@ -155,18 +317,19 @@ def process_command_line():
                     raise CodegenError(lut_params_mgs)
 
     # if no model type is set assume normal
-    args.normal = args.normal or not any([getattr(args, model_type.replace('-', '_')) for model_type in TRANSLATORS])
+    args.normal = args.normal or not any([getattr(args, model_type.replace('-', '_'))
+                                          for model_type in TRANSLATOR_NAMES])
 
     # create list of translators to apply
     translators = []
-    for model_type in TRANSLATORS:
+    for model_type in TRANSLATOR_NAMES:
         use_translator_class = getattr(args, model_type.replace('-', '_'))
         if use_translator_class:
             # if -o or dynamically_loadable is selected with opt, only convert opt model type
             if not args.opt or (not args.outfile and not args.dynamically_loadable):
-                translators.append(TRANSLATORS[model_type])
-            if args.opt and model_type in TRANSLATORS_OPT:
-                translators.append(TRANSLATORS_OPT[model_type])
+                translators.append(TRANSLATOR_NAMES[model_type])
+            if args.opt and model_type in TRANSLATOR_NAMES_OPT:
+                translators.append(TRANSLATOR_NAMES_OPT[model_type])
 
     # An outfile cannot be set with multiple translations
     if args.outfile and len(translators) > 1:
@@ -176,25 +339,46 @@ def process_command_line():
     if args.dynamically_loadable and len(translators) > 1:
         raise CodegenError("Only one model type may be specified if creating a dynamic library!")
 
-    if not args.show_outputs:
-        # Load model once, not once per translator, but only if we're actually generating code
-        model = load_model_with_conversions(args.cellml_file, use_modifiers=args.modifiers, quiet=args.quiet,
-                                            skip_singularity_fixes=args.skip_singularity_fixes,
-                                            skip_conversions=skip_conversion(args))
-
     if len(translators) > 1 and skip_conversion(args):
         raise CodegenError(('--rush-larsen-labview and --rush-larsen-c '
                             'cannot be used in combination with other model convertion types'))
 
+    if args.batch:
+        convert_batch(args, translators)
+    elif args.timings is not None:
+        with record_timings() as timings:
+            try:
+                convert_model(args, args.cellml_file, translators)
+            finally:
+                timings.write_json(args.timings)
+                LOGGER.info('Timings written to %s' % args.timings)
+    else:
+        convert_model(args, args.cellml_file, translators)
+
+
+def convert_model(args, cellml_file, translators):
+    """ Generate code for cellml_file with each of the given translators
+
+    :param args: the processed command line arguments.
+    :param cellml_file: the cellml file to convert.
+    :param translators: list of entries from TRANSLATOR_NAMES / TRANSLATOR_NAMES_OPT to apply.
+    """
+    model = None
+    if not args.show_outputs and not args.incremental:
+        # Load model once, not once per translator, but only if we're actually generating code
+        model = load_cellml_model(args, cellml_file)
+
+    # list of (translator class, file name, keyword arguments, files to write, manifest file, manifest, profile file)
+    to_generate = []
     for translator in translators:
         # Make sure modifiers are only passed to models which can generate them
         args.use_modifiers = args.modifiers and translator[3]
 
-        translator_class = translator[0]
+        translator_name = translator[0]
         outfile_path, model_name_from_file, outfile_base, ext = \
-            get_outfile_parts(args.outfile, args.output_dir, args.cellml_file, translator_class)
+            get_outfile_parts(args.outfile, args.output_dir, cellml_file, translator_name)
 
-        ext = ext if ext else translator_class.DEFAULT_EXTENSIONS
+        ext = ext if ext else get_translator_class(translator_name).DEFAULT_EXTENSIONS
 
         if args.cls_name is not None:
             args.class_name = args.cls_name
@@ -215,12 +399,244 @@ def process_command_line():
         if args.show_outputs:
             for file in get_files:
                 print(file)
-        else:
-            with translator_class(model, outfile_base, header_ext=ext[0], **vars(args)) as chaste_model:
-                chaste_model.generate_chaste_code()
+            continue
+
+        manifest_file, manifest = None, None
+        if args.incremental:
+            manifest_file = os.path.join(outfile_path, outfile_base + MANIFEST_EXT)
+            manifest = get_manifest(args, cellml_file, translator_name)
+            if is_up_to_date(manifest_file, manifest, get_files):
+                if not args.quiet:
+                    LOGGER.info('%s is up to date' % os.path.join(outfile_path, outfile_base))
+                continue
+
+        kwargs = dict(vars(args), header_ext=ext[0])
+        profile_file = os.path.join(args.profile, outfile_base + '.pstats') if args.profile is not None else None
+        to_generate.append((get_translator_class(translator_name), outfile_base, kwargs, get_files, manifest_file,
+                            manifest, profile_file))
+
+    if len(to_generate) == 0:
+        return
+
+    if model is None:
+        # With --incremental, the model is only loaded if code needs to be generated
+        model = load_cellml_model(args, cellml_file)
+
+    from chaste_codegen._model_cache import can_pickle_models
+    if args.translator_jobs > 1 and len(to_generate) > 1 and can_pickle_models():
+        generated_code = generate_code_in_parallel(model, to_generate, args.translator_jobs)
+    else:
+        generated_code = (generate_code(model, translator_class, file_name, kwargs, profile_file)
+                          for translator_class, file_name, kwargs, _, _, _, profile_file in to_generate)
+
+    for (_, _, _, get_files, manifest_file, manifest, _), code in zip(to_generate, generated_code):
+        for file, file_code in zip(get_files, code):
+            write_file(file, file_code, only_if_changed=args.incremental)
+
+        if args.incremental:
+            manifest['files'] = {os.path.basename(file): file_hash(file) for file in get_files}
+            write_manifest(manifest_file, manifest)
+
+
+@contextmanager
+def use_caches(cache_dir, no_cache):
+    """ Store compiled templates and the ontology index next to the model cache in cache_dir within the context, or
+    with no_cache don't read or store them """
+    from chaste_codegen._load_template import template_cache_dir
+    from chaste_codegen._rdf import ontology_index_dir
+    with template_cache_dir(None if no_cache else get_cache_subdir(cache_dir, 'templates')), \
+            ontology_index_dir(None if no_cache else get_cache_subdir(cache_dir, 'ontology')):
+        yield
+
+
+def load_cellml_model(args, cellml_file):
+    """ Load cellml_file with the conversions needed for the given command line arguments """
+    profile_file = None
+    if args.profile is not None:
+        profile_file = os.path.join(args.profile, os.path.splitext(os.path.basename(cellml_file))[0] + '.load.pstats')
+    from chaste_codegen._model_cache import ModelCache
+    with profile(profile_file), use_caches(args.cache_dir, args.no_cache):
+        return cg.load_model_with_conversions(cellml_file, use_modifiers=args.modifiers, quiet=args.quiet,
+                                              skip_singularity_fixes=args.skip_singularity_fixes,
+                                              skip_conversions=skip_conversion(args),
+                                              cache=None if args.no_cache else ModelCache(args.cache_dir))
+
+
+def generate_code(model, translator_class, file_name, kwargs, profile_file=None):
+    """ Generate code for a model with the given translator
+
+    :param profile_file: optional file to write cProfile stats to.
+    :return: list with the generated code for each output file
+    """
+    from chaste_codegen._cse import cse_engine
+    from chaste_codegen._partial_eval import piecewise_fold_engine
+    if not kwargs.get('no_cache', False) and getattr(model, 'cache_key', None) is not None:
+        from chaste_codegen._model_cache import ModelCache
+        analysis_cache = ModelCache(kwargs['cache_dir'])
+        options = {name: value for name, value in kwargs.items() if name not in ANALYSIS_IGNORED_ARGS}
+        kwargs = dict(kwargs, analysis_cache=analysis_cache,
+                      analysis_key=analysis_cache.get_analysis_key(model.cache_key, translator_class.__name__,
+                                                                   **options))
+    with profile(profile_file), timed(translator_class.__name__), cse_engine(kwargs.get('cse', 'sympy')), \
+            piecewise_fold_engine(kwargs.get('piecewise_fold', 'sympy')), \
+            use_caches(kwargs.get('cache_dir', DEFAULT_CACHE_DIR), kwargs.get('no_cache', False)):
+        with timed('__init__'):
+            chaste_model = translator_class(model, file_name, **kwargs)
+        with chaste_model:
+            chaste_model.generate_chaste_code()
+            return chaste_model.generated_code
+
+
+def _generate_code_worker(model_data, translator_class, file_name, kwargs, profile_file, record):
+    """ Generate code in a worker process, for a model pickled with :meth:`dump_model`
+
+    :param record: record timings, to be added to the timings of the main process.
+    :return: (list with the generated code for each output file, list of recorded phases or None)
+    """
+    from chaste_codegen._model_cache import load_model
+    if kwargs['quiet']:
+        LOGGER.setLevel(logging.ERROR)
+    model, _ = load_model(io.BytesIO(model_data))
+    if not record:
+        return generate_code(model, translator_class, file_name, kwargs, profile_file), None
+    with record_timings() as timings:
+        code = generate_code(model, translator_class, file_name, kwargs, profile_file)
+    return code, timings.report()['phases']
+
+
+def generate_code_in_parallel(model, to_generate, jobs):
+    """ Generate code for each of the translators in to_generate, spread over a pool of worker processes
+
+    Each worker unpickles its own copy of the model, so that translators modifying the model (e.g. for data clamp)
+    don't affect each other.
+
+    :return: list with the generated code for each translator, in the same order as to_generate
+    """
+    from chaste_codegen._model_cache import dump_model
+    model_data = io.BytesIO()
+    dump_model(model, model_data)
+    model_data = model_data.getvalue()
+    with ProcessPoolExecutor(max_workers=min(jobs, len(to_generate))) as executor:
+        futures = [executor.submit(_generate_code_worker, model_data, translator_class, file_name, kwargs,
+                                   profile_file, is_recording())
+                   for translator_class, file_name, kwargs, _, _, _, profile_file in to_generate]
+        generated_code = []
+        for future in futures:
+            code, phases = future.result()
+            if phases is not None:
+                add_phases(phases)
+            generated_code.append(code)
+        return generated_code
+
+
+def get_manifest(args, cellml_file, translator_name):
+    """ Get the manifest describing how code is generated for cellml_file with the given translator and options
+
+    The list of generated files (and their hashes) is added once the code has been generated.
+
+    :param args: the processed command line arguments.
+    :param cellml_file: the cellml file to convert.
+    :param translator_name: the name of the translator class used to generate code.
+    :return: a dict that can be written with :meth:`write_manifest`
+    """
+    options = {name: value for name, value in vars(args).items()
+               if name not in MANIFEST_IGNORED_ARGS and name.replace('_', '-') not in TRANSLATOR_NAMES}
+    # Round trip through json, so that the manifest can be compared with the one written previously
+    return json.loads(json.dumps({'chaste_codegen_version': cg.__version__,
+                                  'cellml_file': os.path.basename(cellml_file),
+                                  'cellml_file_hash': file_hash(cellml_file),
+                                  'translator': translator_name,
+                                  'options': options}))
+
+
+def is_up_to_date(manifest_file, manifest, files):
+    """ Check whether the files generated previously are up to date
+
+    :param manifest_file: the manifest written when the files were last generated.
+    :param manifest: the manifest for the current run, as returned by :meth:`get_manifest`.
+    :param files: the files that would be generated.
+    :return: True if the manifest matches and none of the files are missing or have been changed since
+    """
+    previous = read_manifest(manifest_file)
+    if previous is None or {k: v for k, v in previous.items() if k != 'files'} != manifest:
+        return False
+    file_hashes = previous.get('files', {})
+    return all(os.path.basename(file) in file_hashes and os.path.isfile(file) and
+               file_hash(file) == file_hashes[os.path.basename(file)] for file in files)
+
+
+def get_batch_cellml_files(batch):
+    """ Get the cellml files to convert in batch mode
+
+    :param batch: either a folder, in which case all .cellml files in it are returned,
+                  or a text file listing one cellml file per line.
+                  Relative paths are relative to the location of the text file
+                  and empty lines and lines starting with # are ignored.
+    :return: sorted list of cellml files.
+    """
+    if os.path.isdir(batch):
+        cellml_files = [os.path.join(batch, f) for f in os.listdir(batch) if f.endswith('.cellml')]
+    else:
+        with open(batch, 'r') as manifest:
+            cellml_files = [os.path.join(os.path.dirname(batch), line.strip()) for line in manifest
+                            if line.strip() != '' and not line.strip().startswith('#')]
+    return sorted(cellml_files)
+
 
-                for file, code in zip(get_files, chaste_model.generated_code):
-                    write_file(file, code)
+def _convert_batch_model(args, cellml_file, translators):
+    """ Convert a single model for a batch run, intended to be run in a worker process
+
+    :return: (cellml_file, time taken in seconds, error message or None if conversion was successful)
+    """
+    start = time.perf_counter()
+    try:
+        convert_model(args, cellml_file, translators)
+        error = None
+    except CodegenError as e:
+        error = str(e)
+    return cellml_file, time.perf_counter() - start, error
+
+
+def convert_batch(args, translators):
+    """ Convert all models given by args.cellml_file, spread over a pool of args.jobs worker processes
+
+    Progress is reported per model as conversions finish. Models that fail to convert are skipped and reported at
+    the end by raising a :class:`CodegenError`.
+    """
+    cellml_files = get_batch_cellml_files(args.cellml_file)
+    if len(cellml_files) == 0:
+        raise CodegenError("No cellml files found in %s " % args.cellml_file)
+
+    if args.show_outputs:
+        for cellml_file in cellml_files:
+            convert_model(args, cellml_file, translators)
+        return
+
+    if args.quiet:
+        LOGGER.setLevel(logging.ERROR)
+
+    start = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(_convert_batch_model, args, cellml_file, translators): cellml_file
+                   for cellml_file in cellml_files}
+        for i, future in enumerate(as_completed(futures)):
+            try:
+                cellml_file, duration, error = future.result()
+            except Exception as e:  # e.g. an unexpected error in sympy, keep going with the other models
+                cellml_file, duration, error = futures[future], 0.0, '%s: %s' % (type(e).__name__, e)
+            if error is None:
+                LOGGER.info('[%d/%d] Converted %s in %.2fs', i + 1, len(cellml_files), cellml_file, duration)
+            else:
+                failed.append((cellml_file, error))
+                LOGGER.error('[%d/%d] Failed to convert %s in %.2fs:\n    %s', i + 1, len(cellml_files),
+                             cellml_file, duration, error)
+
+    LOGGER.info('Converted %d of %d models in %.2fs', len(cellml_files) - len(failed), len(cellml_files),
+                time.perf_counter() - start)
+    if len(failed) > 0:
+        raise CodegenError('%d of %d models failed to convert:\n    %s' %
+                           (len(failed), len(cellml_files), '\n    '.join(sorted(f for f, _ in failed))))
 
 
 def get_outfile_parts(outfile, output_dir, cellml_file, translator):
@@ -237,8 +653,9 @@ def get_outfile_parts(outfile, output_dir, cellml_file, translator):
     model_name_from_file = model_file_base_parts[0]
     outfile_base = out_file_base_parts[0]
     outfile_extension = out_file_base_parts[1] if len(out_file_base_parts) > 1 else ''
-    if translator in EXTENSION_LOOKUP_FROM_CONVERSION_TYPE:
-        ext = EXTENSION_LOOKUP_FROM_CONVERSION_TYPE[translator]
+    translator_name = getattr(translator, '__name__', translator)  # the translator class or its name
+    if translator_name in EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME:
+        ext = EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME[translator_name]
     else:
         ext = EXTENSION_LOOKUP_FROM_OUTFILE[outfile_extension]
     return outfile_path, model_name_from_file, outfile_base, ext
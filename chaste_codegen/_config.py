@@ -27,6 +27,37 @@ TEMPLATE_SUBDIR = os.path.join('templates')
 # Directory for any other data
 DATA_DIR = os.path.join(MODULE_DIR, 'data')
 
+# Default location of the cache of loaded models, following the XDG base directory conventions
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                                 'chaste_codegen', 'models')
+
+
+def get_cache_subdir(cache_dir, name):
+    """ Get the folder to store the cache called name (e.g. 'ontology') in, next to the model cache in cache_dir """
+    return os.path.join(os.path.dirname(os.path.abspath(cache_dir)), name)
+
+
+# Default location of the cache of compiled templates
+DEFAULT_TEMPLATE_CACHE_DIR = get_cache_subdir(DEFAULT_CACHE_DIR, 'templates')
+
+# tuple of ([<metadata tag>, mTableMins, mTableMaxs, mTableSteps], )
+DEFAULT_LOOKUP_PARAMETERS = (['membrane_voltage', -250.0, 550.0, 0.001], )
+
+# The ways in which values can be interpolated from the lookup tables:
+# - linear: linear interpolation between the 2 surrounding table entries
+# - cubic: cubic (Catmull-Rom) interpolation using the 4 surrounding table entries
+LOOKUP_TABLE_INTERPOLATIONS = ('linear', 'cubic')
+
+# The ways common subexpressions can be found, see chaste_codegen._cse:
+# - hash: hash-consing, only extracting repeated subexpressions
+# - sympy: sympy's cse
+CSE_ENGINES = ('hash', 'sympy')
+
+# The ways piecewise expressions can be folded, see chaste_codegen._partial_eval.fold_piecewises:
+# - sympy: sympy's piecewise_fold
+# - lift: lift_piecewises, combining the pieces in a single pass
+PIECEWISE_FOLDS = ('sympy', 'lift')
+
 # Configure logging
 logging.basicConfig()
 LOGGER = logging.getLogger('chaste_codegen')
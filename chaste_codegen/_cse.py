@@ -0,0 +1,111 @@
+"""
+Common subexpression elimination (cse) by hash-consing.
+
+sympy's :func:`sympy.cse` looks for common subsets of the arguments of sums and products, which makes it super-linear
+in the size of the expressions and slow for large jacobians. :func:`cse` only extracts repeated (structurally equal)
+subexpressions, which are found using the expressions' hashes in a single post-order pass over the expression trees,
+so that the time taken is linear in the size of the expressions.
+
+By default sympy's cse is used, so that the generated code doesn't change. Which engine is used is set with
+:func:`cse_engine`, e.g.::
+
+    with cse_engine('hash'):
+        chaste_model = NormalChasteModel(model, 'model')
+"""
+from contextlib import contextmanager
+
+import sympy
+from sympy import Derivative, Expr, numbered_symbols
+from sympy.matrices import MatrixBase
+
+from chaste_codegen._config import CSE_ENGINES
+
+
+# The engine currently used by cse
+_engine = 'sympy'
+
+# The minimum cost (number of operations) of a repeated subexpression for it to be extracted
+DEFAULT_MIN_COST = 1
+
+
+@contextmanager
+def cse_engine(engine):
+    """ Use the given engine (one of CSE_ENGINES) for :func:`cse` within the context """
+    global _engine
+    assert engine in CSE_ENGINES, 'Expecting engine to be one of %s' % str(CSE_ENGINES)
+    previous, _engine = _engine, engine
+    try:
+        yield
+    finally:
+        _engine = previous
+
+
+def _is_leaf(expr):
+    """ Leaves are not searched or extracted: atoms and derivatives (which are printed as variables) """
+    return expr.is_Atom or isinstance(expr, Derivative)
+
+
+def _find_repeated(exprs, min_cost):
+    """ Find the subexpressions of exprs (with at least cost min_cost) used more than once, in a post-order pass """
+    cost, repeated = {}, set()
+    for root in exprs:
+        stack = [(root, False)]
+        while stack:
+            expr, args_visited = stack.pop()
+            if args_visited:
+                cost[expr] = 1 + sum(cost[arg] for arg in expr.args)
+            elif _is_leaf(expr):
+                cost[expr] = 0
+            elif expr in cost:  # visited before, the subexpressions of expr are only counted once
+                if isinstance(expr, Expr) and cost[expr] >= min_cost:
+                    repeated.add(expr)
+            else:
+                cost[expr] = 0  # marks expr as visited until its cost is known
+                stack.append((expr, True))
+                stack.extend((arg, False) for arg in reversed(expr.args))
+    return repeated
+
+
+def cse(exprs, symbols=None, min_cost=DEFAULT_MIN_COST, order='canonical'):
+    """ Perform common subexpression elimination on an expression, a list of expressions or a matrix.
+
+    :param exprs: the expression(s) to reduce
+    :param symbols: an iterator yielding the symbols for the common subexpressions, defaults to x0, x1, ...
+    :param min_cost: the minimum cost (number of operations) of a repeated subexpression for it to be extracted.
+                     Not used by sympy's cse.
+    :param order: the order of the arguments of sums and products used by sympy's cse, see :func:`sympy.cse`.
+                  The hash-consing cse keeps the expressions as they are.
+    :return: (replacements, reduced expressions) as per :func:`sympy.cse`: the list of replacements is of the form
+             [(x0, <expression>), ..] where each expression can use the previous replacements.
+    """
+    if symbols is None:
+        symbols = numbered_symbols('x')
+    if _engine == 'sympy':
+        return sympy.cse(exprs, symbols=symbols, order=order)
+
+    matrix = exprs if isinstance(exprs, MatrixBase) else None
+    if matrix is not None:
+        exprs = list(matrix)
+    elif not isinstance(exprs, (list, tuple)):
+        exprs = [exprs]
+
+    repeated = _find_repeated(exprs, min_cost)
+    replacements, rebuilt = [], {}
+
+    def rebuild(expr):
+        if _is_leaf(expr):
+            return expr
+        if expr not in rebuilt:
+            args = [rebuild(arg) for arg in expr.args]
+            new_expr = expr.func(*args) if any(a is not b for a, b in zip(args, expr.args)) else expr
+            if expr in repeated:
+                symbol = next(symbols)
+                replacements.append((symbol, new_expr))
+                new_expr = symbol
+            rebuilt[expr] = new_expr
+        return rebuilt[expr]
+
+    reduced = [rebuild(expr) for expr in exprs]
+    if matrix is not None:
+        reduced = [matrix.__class__(matrix.rows, matrix.cols, reduced)]
+    return replacements, reduced
@@ -0,0 +1,127 @@
+import weakref
+
+
+# Dependency graphs, per model and list of equations, shared by the translators for the same model
+_DEPENDENCY_GRAPHS = weakref.WeakKeyDictionary()
+
+
+class Bitset(int):
+    """ A set of indices stored as the bits of an int, which can be indexed like a list of bools,
+    e.g. by the templates: ``bitset[i]`` is True if bit i is set. """
+
+    def __getitem__(self, index):
+        return bool(self >> index & 1)
+
+
+class DependencyGraph:
+    """
+    The dependencies between a list of equations, for answering which equations are needed to calculate a set of
+    variables (or derivatives) without repeatedly searching the equations.
+
+    Each equation depends on the equations defining the variables and derivatives on its rhs. The set of equations
+    each equation (transitively) depends on is stored as a bitset (an int, where bit i is equation i in
+    ``equations``), so that the equations needed for any set of variables are found with a few bitwise ors.
+
+    ``equations``
+        A list of equations, without cyclic dependencies.
+    ``find_variables_and_derivatives``
+        A function returning the variables and derivatives used in a list of expressions,
+        e.g. :meth:`cellmlmanip.model.Model.find_variables_and_derivatives`.
+    """
+
+    def __init__(self, equations, find_variables_and_derivatives):
+        self.equations = tuple(equations)
+        # The variables and derivatives used on the rhs of each equation
+        self.dependencies = [find_variables_and_derivatives((eq.rhs, )) for eq in self.equations]
+        self._free_symbols = {}
+
+        # bitset of the equations defining each lhs
+        self._defining = {}
+        for i, eq in enumerate(self.equations):
+            self._defining[eq.lhs] = self._defining.get(eq.lhs, 0) | (1 << i)
+
+        # For each equation the indices of the equations using its lhs
+        self.dependants = [[] for _ in self.equations]
+        num_dependencies = [0] * len(self.equations)
+        for i, dependencies in enumerate(self.dependencies):
+            for j in self._indices(self._dependencies_mask(dependencies)):
+                self.dependants[j].append(i)
+                num_dependencies[i] += 1
+
+        # Topological order (Kahn's algorithm), keeping the original order where possible
+        self.topological_order = [i for i, n in enumerate(num_dependencies) if n == 0]
+        for i in self.topological_order:  # the list grows while iterating over it
+            for j in self.dependants[i]:
+                num_dependencies[j] -= 1
+                if num_dependencies[j] == 0:
+                    self.topological_order.append(j)
+        assert len(self.topological_order) == len(self.equations), 'Expecting equations without cyclic dependencies'
+
+        # bitset of the equations each equation (transitively) depends on, including itself
+        self._reachable = [0] * len(self.equations)
+        for i in self.topological_order:
+            reachable = 1 << i
+            for j in self._indices(self._dependencies_mask(self.dependencies[i])):
+                reachable |= self._reachable[j]
+            self._reachable[i] = reachable
+
+    def _dependencies_mask(self, variables):
+        """ Get the bitset of the equations defining any of the given variables """
+        mask = 0
+        for var in variables:
+            mask |= self._defining.get(var, 0)
+        return mask
+
+    @staticmethod
+    def _indices(mask):
+        """ Get the indices of the set bits in mask, in increasing order """
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit.bit_length() - 1
+            mask ^= low_bit
+
+    def reachable_mask(self, variables):
+        """ Get the bitset of the equations needed to calculate the given variables and derivatives """
+        mask = 0
+        for i in self._indices(self._dependencies_mask(variables)):
+            mask |= self._reachable[i]
+        return mask
+
+    def dependants_masks(self, masks):
+        """ Propagate bitsets from equations to the equations they depend on.
+
+        :param masks: a bitset (int) for each equation, e.g. of the derivatives using the equation directly.
+        :return: list with for each equation the union of its own bitset and the bitsets of all equations
+                 (transitively) depending on it.
+        """
+        assert len(masks) == len(self.equations), 'Expecting a bitset for each equation'
+        masks = list(masks)
+        for i in reversed(self.topological_order):  # dependants come later in the topological order
+            for j in self.dependants[i]:
+                masks[i] |= masks[j]
+        return masks
+
+    def equations_for(self, variables):
+        """ Get the set of equations needed to calculate the given variables and derivatives """
+        return set(self.equations[i] for i in self._indices(self.reachable_mask(variables)))
+
+    def free_symbols(self, equations):
+        """ Get the free symbols used on the rhs of the given equations """
+        symbols = set()
+        for eq in equations:
+            if eq not in self._free_symbols:
+                self._free_symbols[eq] = eq.rhs.free_symbols
+            symbols.update(self._free_symbols[eq])
+        return symbols
+
+
+def get_dependency_graph(model, equations):
+    """ Get the :class:`DependencyGraph` for the given equations of the given model.
+
+    Graphs are shared by all translators for the model that use the same equations.
+    """
+    equations = tuple(equations)
+    graphs = _DEPENDENCY_GRAPHS.setdefault(model, {})
+    if equations not in graphs:
+        graphs[equations] = DependencyGraph(equations, model.find_variables_and_derivatives)
+    return graphs[equations]
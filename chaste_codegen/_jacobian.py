@@ -1,7 +1,19 @@
 from cellmlmanip.printer import Printer
-from sympy import Matrix, cse
+from sympy import (
+    Derivative,
+    Dummy,
+    Matrix,
+    diag,
+    numbered_symbols,
+    zeros,
+)
 
+from chaste_codegen._cse import cse
+from chaste_codegen._dependency_graph import DependencyGraph
+from chaste_codegen._timings import timed
 
+
+@timed('get_jacobian')
 def get_jacobian(state_vars, derivative_equations):
     """Calculate the analytic jacobian
 
@@ -17,17 +29,136 @@ def get_jacobian(state_vars, derivative_equations):
     jacobian_equations, jacobian_matrix = [], Matrix([])
     if len(state_vars) > 0:
         jacobian_equations, jacobian_matrix = [], []
-        state_var_matrix = Matrix(state_vars)
         # sort by state var
         derivative_equations.sort(key=lambda d: state_vars.index(d.lhs.args[0]))
         # we're only interested in the rhs
         derivative_eqs = [eq.rhs for eq in derivative_equations]
-        derivative_eq_matrix = Matrix(derivative_eqs)
-        jacobian_matrix = derivative_eq_matrix.jacobian(state_var_matrix)
-        jacobian_equations, jacobian_matrix = cse(jacobian_matrix, order='none')
+        # Only differentiate with respect to the state vars each derivative depends on, the rest is 0
+        state_var_indices = {state_var: j for j, state_var in enumerate(state_vars)}
+        jacobian_matrix = zeros(len(derivative_eqs), len(state_vars))
+        for i, rhs in enumerate(derivative_eqs):
+            for state_var in rhs.free_symbols:
+                j = state_var_indices.get(state_var)
+                if j is not None:
+                    jacobian_matrix[i, j] = rhs.diff(state_var)
+        with timed('cse'):
+            jacobian_equations, jacobian_matrix = cse(jacobian_matrix, order='none')
     return jacobian_equations, Matrix(jacobian_matrix)
 
 
+@timed('get_jacobian_diagonal')
+def get_jacobian_diagonal(state_vars, derivative_equations):
+    """Calculate the diagonal of the analytic jacobian, i.e. the derivative of each derivative equation with respect to
+    its own state variable, as needed by the generalised Rush-Larsen methods.
+
+    :param state_vars: set of state variables
+    :param derivative_equations: set of equations defining derivatives
+    :return: Common expressions, jacobian matrix with only the diagonal entries filled in.
+             The list of common expressions is of the form [('var_x1', <expression>), ..]
+             The jacobian Matrix is an sympy.Matrix
+    """
+    assert all(map(lambda eq: len(eq.lhs.args) > 0 and eq.lhs.args[0] in state_vars, derivative_equations)), \
+        ("Expecting derivative equations to be reduced to the minimal set defining the state vars: the lhs is a state "
+         "var for every eq")
+    jacobian_equations, jacobian_matrix = [], Matrix([])
+    if len(state_vars) > 0:
+        # sort by state var
+        derivative_equations.sort(key=lambda d: state_vars.index(d.lhs.args[0]))
+        diagonal = [eq.rhs.diff(eq.lhs.args[0]) for eq in derivative_equations]
+        with timed('cse'):
+            jacobian_equations, diagonal = cse(diagonal, order='none')
+        jacobian_matrix = diag(*diagonal)
+    return jacobian_equations, Matrix(jacobian_matrix)
+
+
+def _used_symbols(exprs):
+    """ Get the symbols and derivatives used in exprs """
+    return set().union(*(expr.atoms(Derivative) | expr.free_symbols for expr in exprs))
+
+
+def _get_used_equations(equations, exprs):
+    """ Get the equations (in the given order) needed to calculate exprs, as a list of (lhs, rhs) tuples """
+    used, used_equations = _used_symbols(exprs), []
+    for lhs, rhs in reversed(equations):
+        if lhs in used:
+            used_equations.append((lhs, rhs))
+            used.update(_used_symbols((rhs, )))
+    return used_equations[::-1]
+
+
+@timed('get_jacobian_chain_rule')
+def get_jacobian_chain_rule(state_vars, derivative_equations, diagonal=False):
+    """Calculate the analytic jacobian by differentiating each equation once and combining the results with the chain
+    rule, following the dependencies between the equations, rather than differentiating the fully substituted
+    derivatives. The intermediate variables (and their derivatives) are kept as common expressions, so the size of
+    the result grows with the number of equations rather than the size of the substituted expressions.
+
+    :param state_vars: list of state variables, in the order of the rows and columns of the jacobian
+    :param derivative_equations: equations defining the derivatives of the state vars and the variables they use
+                                 (not partially evaluated)
+    :param diagonal: only keep the diagonal entries of the jacobian (and the common expressions they use)
+    :return: Common expressions, jacobian matrix as per get_jacobian.
+             The common expressions include the equations for the intermediate variables used.
+    """
+    rows = {eq.lhs.args[0]: eq.lhs for eq in derivative_equations
+            if isinstance(eq.lhs, Derivative) and eq.lhs.args[0] in state_vars}
+    assert all(state_var in rows for state_var in state_vars), \
+        'Expecting derivative equations to define the derivatives of all state vars'
+    if len(state_vars) == 0:
+        return [], Matrix([])
+
+    graph = DependencyGraph(derivative_equations, _used_symbols)
+    state_var_indices = {state_var: j for j, state_var in enumerate(state_vars)}
+    symbols = numbered_symbols('x')
+    # For each variable (or derivative) the non-zero partial derivatives, by column
+    gradients = {state_var: {j: 1} for state_var, j in state_var_indices.items()}
+    constants, equations = {}, []
+    needed = graph.reachable_mask(rows.values())
+    for i in graph.topological_order:
+        if not needed >> i & 1:
+            continue
+        eq = graph.equations[i]
+        rhs = eq.rhs.xreplace(constants)
+        if rhs.is_Number:  # substitute in constants, rather than adding equations for them
+            constants[eq.lhs] = rhs
+            continue
+        equations.append((eq.lhs, rhs))
+        inputs = [v for v in graph.dependencies[i] if v in gradients]
+        if len(inputs) == 0:
+            continue  # doesn't depend on the state vars
+
+        # Differentiate with respect to the derivatives used as if they were variables
+        placeholders = {d: Dummy() for d in rhs.atoms(Derivative)}
+        restore = {placeholder: d for d, placeholder in placeholders.items()}
+        rhs = rhs.xreplace(placeholders)
+        gradient = {}
+        for v in inputs:
+            partial_derivative = rhs.diff(placeholders.get(v, v)).xreplace(restore)
+            if partial_derivative != 0:
+                for j, v_gradient in gradients[v].items():
+                    gradient[j] = gradient.get(j, 0) + partial_derivative * v_gradient
+
+        columns = [j for j in sorted(gradient) if gradient[j] != 0]
+        common, reduced = cse([gradient[j] for j in columns], symbols=symbols, order='none')
+        equations.extend(common)
+        gradients[eq.lhs] = {}
+        # The partial derivatives of variables used by other equations get their own name
+        is_used = len(graph.dependants[i]) > 0
+        for j, expr in zip(columns, reduced):
+            if is_used and not expr.is_Atom:
+                symbol = next(symbols)
+                equations.append((symbol, expr))
+                expr = symbol
+            gradients[eq.lhs][j] = expr
+
+    jacobian_matrix = zeros(len(state_vars), len(state_vars))
+    for i, state_var in enumerate(state_vars):
+        for j, expr in gradients.get(rows[state_var], {}).items():  # empty if independent of the state vars
+            if not diagonal or i == j:
+                jacobian_matrix[i, j] = expr
+    return _get_used_equations(equations, jacobian_matrix), jacobian_matrix
+
+
 def format_jacobian(jacobian_equations, jacobian_matrix, printer, print_rhs,
                     swap_inner_outer_index=True, skip_0_entries=True):
     """Format the jacobian for outputting
@@ -1,5 +1,4 @@
 from enum import Enum
-from functools import lru_cache
 
 from cellmlmanip.model import Variable
 from sympy import (
@@ -10,6 +9,8 @@ from sympy import (
     Mul,
     Piecewise,
     Pow,
+    Symbol,
+    Wild,
     log,
 )
 from sympy.codegen.cfunctions import log2, log10
@@ -27,36 +28,49 @@ class KINDS(Enum):
     NONLINEAR = 3
 
 
-@lru_cache(maxsize=128)
-def _check_expr(expr, state_var, membrane_voltage_var, state_vars):
-    """Check the kind of expression given (NONE, LINEAR or NONLINEAR)
+# Function representing GetIntracellularAreaStimulus(time)
+_AREA_STIMULUS = Function('GetIntracellularAreaStimulus', real=True)
+
+
+def _kind(expr, state_var, analysis):
+    """Get the kind of an expression already in analysis with respect to state_var (see :func:`_analyse_expr`)"""
+    kinds = analysis[expr][2]
+    return kinds[state_var] if state_var in kinds else kinds[None]
+
+
+def _max_kind(operands, state_var, analysis):
+    """Get the highest kind of the operands: NONLINEAR if any operand is, otherwise LINEAR if any operand is"""
+    result = KINDS.NONE
+    for op in operands:
+        res = _kind(op, state_var, analysis)
+        if res == KINDS.NONLINEAR:
+            return KINDS.NONLINEAR
+        elif res == KINDS.LINEAR:
+            result = res
+    return result
+
+
+def _node_kind(expr, state_var, membrane_voltage_var, state_vars, analysis):
+    """Check the kind of expression given (NONE, LINEAR or NONLINEAR), from the kinds of its operands
 
     Determines whether it has a linear dependence on the dependent variable.
     We also require it to not depend on any other state variable, except V.
 
-    :param expr: the expression to check
+    :param expr: the expression to check, with its operands already in analysis
     :param state_var: the (dependant) state variable we're currently checking against for linearity
+                      or None for any state variable expr does not depend on
     :param membrane_voltage_var: the variable representing Voltage
     :param state_vars: the state variables in the model the expression comes from
+    :param analysis: the analysis of the (sub-)expressions so far (see :func:`_analyse_expr`)
     :return: the kind of expr (NONE, LINEAR or NONLINEAR)
     """
-    @lru_cache(maxsize=128)
-    def max_kind(state_var, operands):
-        result = KINDS.NONE
-        for op in operands:
-            res = _check_expr(op, state_var, membrane_voltage_var, state_vars)
-            if res == KINDS.NONLINEAR:
-                return KINDS.NONLINEAR
-            elif res == KINDS.LINEAR:
-                result = res
-        return result
+    expr_state_vars, has_symbols, _ = analysis[expr]
     result = None
     operands = expr.args
     # No need to recurse as we're doing this with partially evaluated derivative equations!
     if expr is state_var:
         result = KINDS.LINEAR
-    elif expr is membrane_voltage_var or len(expr.free_symbols) == 0 or\
-            isinstance(expr, Function('GetIntracellularAreaStimulus', real=True)):
+    elif expr is membrane_voltage_var or not has_symbols or isinstance(expr, _AREA_STIMULUS):
         # constant, V or GetIntracellularAreaStimulus(time)
         result = KINDS.NONE
     elif expr in state_vars:
@@ -67,13 +81,13 @@ def _check_expr(expr, state_var, membrane_voltage_var, state_vars):
         # non-linear  Otherwise, all the pieces must be the same
         # (and that's what we are) or we're non-linear.
         for cond in expr.args:
-            if _check_expr(cond[1], state_var, membrane_voltage_var, state_vars) != KINDS.NONE:
+            if _kind(cond[1], state_var, analysis) != KINDS.NONE:
                 result = KINDS.NONLINEAR
                 break
         else:
             # Conditions all OK
             for e in expr.args:
-                res = _check_expr(e[0], state_var, membrane_voltage_var, state_vars)
+                res = _kind(e[0], state_var, analysis)
                 if result is not None and res != result:
                     # We have a difference
                     result = KINDS.NONLINEAR
@@ -84,7 +98,7 @@ def _check_expr(expr, state_var, membrane_voltage_var, state_vars):
         result = KINDS.NONE
         lin = 0
         for op in operands:
-            res = _check_expr(op, state_var, membrane_voltage_var, state_vars)
+            res = _kind(op, state_var, analysis)
             if res == KINDS.LINEAR:
                 lin += 1
             elif res == KINDS.NONLINEAR:
@@ -97,25 +111,47 @@ def _check_expr(expr, state_var, membrane_voltage_var, state_vars):
     elif isinstance(expr, Add) or isinstance(expr, BooleanFunction) or\
             isinstance(expr, Relational):
         # linear if any operand linear, and non-linear
-        result = max_kind(state_var, operands)
+        result = _max_kind(operands, state_var, analysis)
     elif isinstance(expr, Pow):
-        if state_var not in expr.free_symbols:
-            result = max_kind(state_var, operands)
+        if state_var not in expr_state_vars:
+            result = _max_kind(operands, state_var, analysis)
         elif len(expr.args) == 2 and expr.args[1] == -1:  # x/y divide is represented as x * pow(y, -1)
             # Linear iff only numerator linear
-            result = _check_expr(expr.args[0], state_var, membrane_voltage_var, state_vars)
+            result = _kind(expr.args[0], state_var, analysis)
         else:
             result = KINDS.NONLINEAR
     elif isinstance(expr, (log, log10, log2)) or\
             isinstance(expr, (cg.RealFunction, TrigonometricFunction, HyperbolicFunction, InverseTrigonometricFunction,
                               InverseHyperbolicFunction)):
-        if state_var not in expr.free_symbols:
-            result = _check_expr(expr.args[0], state_var, membrane_voltage_var, state_vars)
+        if state_var not in expr_state_vars:
+            result = _kind(expr.args[0], state_var, analysis)
         else:
             result = KINDS.NONLINEAR
     return result
 
 
+def _analyse_expr(expr, membrane_voltage_var, state_vars, analysis):
+    """Analyse the linearity of expr and all its sub-expressions in a single bottom-up pass
+
+    Each distinct (sub-)expression is analysed once and stored in analysis as a tuple of the state variables it
+    depends on, whether it has any free symbols, and a dict of its kind with respect to each of those state variables.
+    Its kind with respect to any state variable it does not depend on is the same for all of them, and stored under
+    the key None. Sharing analysis between expressions means every node in the expression DAG is visited only once.
+    """
+    if expr in analysis:
+        return
+    for op in expr.args:
+        _analyse_expr(op, membrane_voltage_var, state_vars, analysis)
+    expr_state_vars = frozenset().union(*(analysis[op][0] for op in expr.args))
+    if expr in state_vars:
+        expr_state_vars |= {expr}
+    has_symbols = isinstance(expr, Symbol) or any(analysis[op][1] for op in expr.args)
+    kinds = {}
+    analysis[expr] = (expr_state_vars, has_symbols, kinds)
+    for state_var in (None, *expr_state_vars):
+        kinds[state_var] = _node_kind(expr, state_var, membrane_voltage_var, state_vars, analysis)
+
+
 def get_non_linear_state_vars(derivative_equations, membrane_voltage_var, state_vars):
     """Returns the state vars whose derivative expressions are non linear"""
 
@@ -126,10 +162,14 @@ def get_non_linear_state_vars(derivative_equations, membrane_voltage_var, state_
     assert len(state_vars) > 0 and len(derivative_equations) > 0, ("Expecting state_vars and derivative_equations "
                                                                    "not to be empty")
 
-    return set([eq.lhs.args[0] for eq in derivative_equations
-                if isinstance(eq.lhs, Derivative) and
-                eq.lhs.args[0] != membrane_voltage_var and
-                _check_expr(eq.rhs, eq.lhs.args[0], membrane_voltage_var, tuple(state_vars)) != KINDS.LINEAR])
+    state_vars, analysis = frozenset(state_vars), {}
+    non_linear_state_vars = set()
+    for eq in derivative_equations:
+        if isinstance(eq.lhs, Derivative) and eq.lhs.args[0] != membrane_voltage_var:
+            _analyse_expr(eq.rhs, membrane_voltage_var, state_vars, analysis)
+            if _kind(eq.rhs, eq.lhs.args[0], analysis) != KINDS.LINEAR:
+                non_linear_state_vars.add(eq.lhs.args[0])
+    return non_linear_state_vars
 
 
 def subst_deriv_eqs_non_linear_vars(y_derivatives, non_linear_state_vars, membrane_voltage_var, state_vars,
@@ -172,3 +212,32 @@ def subst_deriv_eqs_non_linear_vars(y_derivatives, non_linear_state_vars, membra
             non_lin_sym.add(eq.lhs)
             subs_dict[eq.lhs] = eq.rhs.xreplace(subs_dict)
     return linear_derivs_eqs
+
+
+def get_linear_coefficients(expr, var):
+    """Rearranges expr into the form g + h*var, where g and h don't depend on var
+
+    Gives the same g and h as ``expr.expand().match(g + h * var)`` (with g and h Wilds excluding var), but reads them
+    off the terms of the expanded expression, rather than pattern matching which is very slow for large expressions.
+    Pattern matching is only used if the expanded expression has a term that isn't of the form c or c*var.
+
+    :param expr: the expression to rearrange (not a Piecewise)
+    :param var: the variable expr should be linear in
+    :return: (g, h) or None if expr can't be rearranged in that form
+    """
+    expanded = expr.expand()
+    g_terms, h_terms = [], []
+    for term in Add.make_args(expanded):
+        if var not in term.free_symbols:
+            g_terms.append(term)
+            continue
+        factors = Mul.make_args(term)
+        if factors.count(var) != 1 or any(f is not var and var in f.free_symbols for f in factors):
+            break  # term is not of the form c*var
+        h_terms.append(Mul(*(f for f in factors if f is not var)))
+    else:
+        return Add(*g_terms), Add(*h_terms)
+
+    g, h = Wild('g', exclude=[var]), Wild('h', exclude=[var])
+    match = expanded.match(g + h * var)
+    return (match[g], match[h]) if match is not None else None
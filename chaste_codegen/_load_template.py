@@ -4,6 +4,7 @@
 import logging
 import os
 import posixpath
+from contextlib import contextmanager
 
 import jinja2
 
@@ -13,6 +14,45 @@ import chaste_codegen as cg
 # Shared Jinja environment
 _environment = None
 
+# Folder to store compiled templates in, or None to compile templates in every process
+_template_cache_dir = cg.DEFAULT_TEMPLATE_CACHE_DIR
+
+
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    Stores compiled templates on disk, so that templates are only compiled again if they change.
+    Compiled templates that can't be stored (e.g. in a read-only folder) are ignored.
+    """
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            cg.LOGGER.debug('Could not store compiled template in %s: %s', self.directory, e)
+
+
+def set_template_cache_dir(cache_dir):
+    """
+    Sets the folder compiled templates are stored in, or disables storing compiled templates if ``cache_dir`` is None.
+    """
+    global _environment, _template_cache_dir
+    if cache_dir != _template_cache_dir:
+        _template_cache_dir = cache_dir
+        _environment = None
+
+
+@contextmanager
+def template_cache_dir(cache_dir):
+    """
+    Stores compiled templates in ``cache_dir`` (or doesn't store them if it is None) within the context.
+    """
+    previous = _template_cache_dir
+    set_template_cache_dir(cache_dir)
+    try:
+        yield
+    finally:
+        set_template_cache_dir(previous)
+
 
 def _jinja_environment():
     """
@@ -20,6 +60,14 @@ def _jinja_environment():
     """
     global _environment
     if _environment is None:
+        bytecode_cache = None
+        if _template_cache_dir is not None:
+            try:
+                os.makedirs(_template_cache_dir, exist_ok=True)
+                bytecode_cache = _BytecodeCache(_template_cache_dir)
+            except OSError as e:
+                cg.LOGGER.debug('Could not create template cache %s: %s', _template_cache_dir, e)
+
         _environment = jinja2.Environment(
             # Automatic loading of templates stored in the module
             # This also enables template inheritance
@@ -31,6 +79,9 @@ def _jinja_environment():
             # Don't replace undefined template variables by an empty string
             # but raise a jinja2.UndefinedError instead.
             undefined=jinja2.StrictUndefined,
+
+            # Re-use templates compiled in earlier runs
+            bytecode_cache=bytecode_cache,
         )
     return _environment
 
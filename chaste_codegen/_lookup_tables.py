@@ -1,5 +1,10 @@
-from cellmlmanip.model import Quantity, Variable
+import math
+import weakref
+from itertools import combinations
+
+from cellmlmanip.model import Quantity
 from sympy import (
+    Dummy,
     Piecewise,
     Pow,
     Symbol,
@@ -22,6 +27,7 @@ from sympy import (
     csc,
     csch,
     exp,
+    lambdify,
     ln,
     log,
     sec,
@@ -30,47 +36,163 @@ from sympy import (
     sinh,
     tan,
     tanh,
+    true,
 )
 
 from chaste_codegen import LOGGER
+from chaste_codegen._config import DEFAULT_LOOKUP_PARAMETERS, LOOKUP_TABLE_INTERPOLATIONS
 from chaste_codegen._math_functions import (
     acos_,
     cos_,
     exp_,
     sin_,
+    subs_math_func_placeholders,
 )
 from chaste_codegen._rdf import OXMETA
+from chaste_codegen._timings import timed
 
 
 # The expensive functions the lookup table analysis searches for
 _EXPENSIVE_FUNCTIONS = (exp, log, ln, sin, cos, tan, sec, csc, cot, sinh, cosh, tanh, sech, csch, coth, asin, acos,
                         atan, asinh, acosh, atanh, asec, acsc, acot, asech, acsch, acoth, exp_, acos_, cos_, sin_)
 
+# Per model, the annotations of the expressions analysed for lookup tables (see `_annotate`),
+# shared by the translators for the same model
+_ANNOTATIONS = weakref.WeakKeyDictionary()
+
+# The largest step size the automatic step size selection will try is mTableSteps * 2 ** MAX_STEP_DOUBLINGS
+MAX_STEP_DOUBLINGS = 12
+
+# Fractions of a table step at which the interpolation error is checked when selecting step sizes
+# (for smooth functions the error of linear interpolation is largest halfway between table entries)
+_ERROR_CHECK_FACTORS = {'linear': (0.5, ), 'cubic': (0.25, 0.5, 0.75)}
+
+# The largest number of entries (rows times columns) per expression in a 2-D lookup table,
+# the steps of larger 2-D tables are increased (doubled) until the table is small enough
+MAX_2D_TABLE_SIZE = 10 ** 6
+
+
+def _annotate(expr, annotations):
+    """ Get whether expr contains an expensive function and the variables (but not quantities) it uses.
+        The annotations of expr and all its sub-expressions are worked out once, bottom-up, and stored in annotations.
+    """
+    annotation = annotations.get(expr)
+    if annotation is None:
+        has_expensive = isinstance(expr, _EXPENSIVE_FUNCTIONS)
+        used_vars = {expr} if isinstance(expr, Symbol) and not isinstance(expr, Quantity) else set()
+        for arg in expr.args:
+            arg_has_expensive, arg_used_vars = _annotate(arg, annotations)
+            has_expensive = has_expensive or arg_has_expensive
+            used_vars.update(arg_used_vars)
+        annotation = annotations[expr] = (has_expensive, frozenset(used_vars))
+    return annotation
+
+
+def interpolate(table_values, index, factor, interpolation='linear'):
+    """ Interpolate a value from a lookup table, in the same way as the generated code does.
+
+    :param table_values: function giving the table value for an index (which can be -1 or beyond the table size).
+    :param index: the index of the table entry at or below the value looked up.
+    :param factor: how far the value looked up is between the table entry at index and index + 1 (in [0, 1]).
+    :param interpolation: one of LOOKUP_TABLE_INTERPOLATIONS.
+    """
+    if interpolation == 'cubic':
+        y0, y1, y2, y3 = (table_values(index + i) for i in (-1, 0, 1, 2))
+        return y1 + 0.5 * factor * (y2 - y0 + factor * (2.0 * y0 - 5.0 * y1 + 4.0 * y2 - y3
+                                                        + factor * (3.0 * (y1 - y2) + y3 - y0)))
+    y1, y2 = table_values(index), table_values(index + 1)
+    return y1 + (y2 - y1) * factor
+
+
+def _evaluate(func, value):
+    """ Evaluate func(value), returning nan if it can't be evaluated e.g. due to division by 0."""
+    try:
+        return float(func(value))
+    except (ArithmeticError, ValueError, TypeError):
+        return math.nan
+
+
+def _pieces(conditions, value):
+    """ Evaluate the conditions of the pieces of piecewise expressions at value, or None if that's not possible."""
+    try:
+        return conditions(value)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+
+
+def _interpolation_error_ok(funcs, table_min, table_max, step, interpolation, tolerance):
+    """ Checks whether interpolating funcs from tables with the given step size is within tolerance everywhere.
+
+    :param funcs: list of (function, conditions) where conditions is a function evaluating the conditions of any
+                  piecewise expressions in the function, or None.
 
-# tuple of ([<metadata tag>, mTableMins, mTableMaxs, mTableSteps], )
-DEFAULT_LOOKUP_PARAMETERS = (['membrane_voltage', -250.0, 550.0, 0.001], )
+    The error is checked at a number of points between each pair of table entries. Errors are relative, or absolute
+    for values smaller than 1. Points where the value (or table values used) can't be evaluated are ignored, as are
+    points at which the function is in a different piece than at the table values used, since interpolation can't
+    represent a discontinuity at any step size.
+    """
+    size = 1 + int((table_max - table_min) / step + 0.5)
+    used = (-1, 0, 1, 2) if interpolation == 'cubic' else (0, 1)
+    for func, conditions in funcs:
+        table = {}
+
+        def table_values(i):
+            if i not in table:
+                table[i] = _evaluate(func, table_min + i * step)
+            return table[i]
+
+        for i in range(size - 1):
+            for factor in _ERROR_CHECK_FACTORS[interpolation]:
+                value = table_min + (i + factor) * step
+                exact = _evaluate(func, value)
+                interpolated = interpolate(table_values, i, factor, interpolation)
+                if math.isfinite(exact) and math.isfinite(interpolated) and \
+                        abs(interpolated - exact) > tolerance * max(1.0, abs(exact)):
+                    pieces = None if conditions is None else _pieces(conditions, value)
+                    if pieces is None or \
+                            all(_pieces(conditions, table_min + (i + j) * step) == pieces for j in used):
+                        return False
+    return True
 
 
 class LookupTables:
     """ Holds information about lookuptables and methods to analyse the model for lookup tables.
     """
 
-    def __init__(self, model, lookup_params=DEFAULT_LOOKUP_PARAMETERS):
+    def __init__(self, model, lookup_params=DEFAULT_LOOKUP_PARAMETERS, interpolation='linear', tolerance=None,
+                 two_dimensional=False):
         """ Initialise a LookUpTables instance
         :param model: A :class:`cellmlmanip.Model` object.
         :param lookup_params: Optional collection of lists: [[<metadata tag>, mTableMins, mTableMaxs, mTableSteps]]
+        :param interpolation: Optional how to interpolate values from the table, one of LOOKUP_TABLE_INTERPOLATIONS.
+        :param tolerance: Optional error tolerance for interpolated values. If given, the step size of each table is
+                          increased (by doubling mTableSteps) as far as possible while keeping the interpolation error
+                          of all expressions in the table within tolerance.
+        :param two_dimensional: Optional, if True expensive expressions depending on exactly 2 of the lookup variables
+                                (e.g. on membrane_voltage and cytosolic_calcium_concentration) are put in 2-D tables,
+                                using bilinear interpolation. Otherwise such expressions are only reported.
         """
+        assert interpolation in LOOKUP_TABLE_INTERPOLATIONS, \
+            'Expecting interpolation to be one of %s' % str(LOOKUP_TABLE_INTERPOLATIONS)
+        assert tolerance is None or tolerance > 0, 'Expecting tolerance to be positive'
         self._lookup_parameters = tuple({'metadata_tag': param[0],
                                          'mTableMins': param[1],
                                          'mTableMaxs': param[2],
                                          'mTableSteps': param[3],
+                                         'interpolation': interpolation,
                                          'table_used_in_methods': set(),
                                          'var': None,
                                          'lookup_epxrs': []} for param in lookup_params)
+        self._tolerance = tolerance
         self._model = model
+        self._annotations = _ANNOTATIONS.setdefault(model, {})
         self._lookup_variables = set()
         self._lookup_table_expr = dict()
         self._lookup_params_processed, self._lookup_params_printed = False, False
+        self._two_dimensional = two_dimensional
+        self._lookup_parameters_2d = []
+        # expressions suitable for a 2-D table, with the number of expensive functions they depend on both variables
+        self._lookup_table_2d_candidates = dict()
 
         self._method_printed = None
 
@@ -83,6 +205,12 @@ class LookupTables:
                 LOGGER.warning('A lookup table was specified for ' + param['metadata_tag'] +
                                ' but it is not tagged in the model, skipping!')
 
+        # pairs of lookup variables that expressions in 2-D tables can depend on
+        self._lookup_variable_pairs = {frozenset((a['var'], b['var'])): (a, b)
+                                       for a, b in combinations(self._lookup_parameters, 2)
+                                       if a['var'] is not None and b['var'] is not None and a['var'] is not b['var']}
+
+    @timed('calc_lookup_tables')
     def calc_lookup_tables(self, equations):
         """ Calculates and stores the lookup table expressions for equations.
             *Please Note:* cannot been called after `_process_lookup_parameters` has been calledt
@@ -98,9 +226,9 @@ class LookupTables:
         """ Analyse whether an expression contains lookup table suitable (sub-_ expressions. """
         in_piecewise = in_piecewise or isinstance(expr, Piecewise)
         # Used variables are either Variable or Symbol but not Quantity
-        used_vars = set(filter(lambda v: not isinstance(v, Quantity), expr.atoms(Variable, Symbol)))
-        if not expr.has(*_EXPENSIVE_FUNCTIONS) or len(used_vars) == 0:
-            return False, used_vars, in_piecewise  # other leaf
+        has_expensive, used_vars = _annotate(expr, self._annotations)
+        if not has_expensive or len(used_vars) == 0:
+            return False, set(used_vars), in_piecewise  # other leaf
         elif expr in self._lookup_table_expr:  # expr already set for lookup table, no need to analyse
             lut_expr, in_pw = self._lookup_table_expr[expr]
             return True, lut_expr, in_piecewise or in_pw
@@ -115,6 +243,10 @@ class LookupTables:
                 expensive_func = expensive_func or exp_func
                 vars_used_in_lut.update(vars_used)
 
+            if expensive_func and self._is_2d_candidate(expr, vars_used_in_lut, args_func_vars) and \
+                    self._two_dimensional:
+                return True, vars_used_in_lut, in_piecewise
+
             if expensive_func and len(vars_used_in_lut) > 1:
                 # there are arguments suitable for lookup table, but with different lookup table vars
                 # so set each appropriate child as lookup table var if appropriate, but not this expr
@@ -123,12 +255,29 @@ class LookupTables:
                 return False, vars_used_in_lut, in_piecewise
             return expensive_func, vars_used_in_lut, in_piecewise
 
+    def _is_2d_candidate(self, expr, vars_used, args_func_vars):
+        """ Checks (and records) whether an expensive expression is suitable for a 2-D lookup table.
+            This is the case if it only uses a pair of lookup variables and either is an expensive function itself,
+            or has an argument which is suitable for a 2-D table. """
+        pair = frozenset(vars_used)
+        if pair not in self._lookup_variable_pairs or \
+                not (isinstance(expr, _EXPENSIVE_FUNCTIONS) or
+                     any(ex in self._lookup_table_2d_candidates for _, _, ex, _ in args_func_vars)):
+            return False
+        # Only record the largest candidates, the arguments are part of this expression's table entry
+        for _, _, ex, _ in args_func_vars:
+            self._lookup_table_2d_candidates.pop(ex, None)
+        self._lookup_table_2d_candidates[expr] = \
+            len([f for f in expr.atoms(*_EXPENSIVE_FUNCTIONS) if pair <= f.free_symbols])
+        return True
+
     def _set_lookup_table_if_appropriate(self, exp_func, vars_used, expr, in_pw):
         """ Store an expression to the lookup table if it's suitable. """
         # Expressions are suitable for lut if:
         # - they have an expensive function
         # - they're not already set as suitable
         # - they only contain 1 variable and this variable is one of the lookup variables
+        #   or, if 2-D tables are used, they contain exactly 2 lookup variables
 
         # Prevent putting expressions of the form 1 / A since the expressions might cause a singularity in the table
         # since expressions being analised might the bottom of a GHK equation os similar
@@ -136,7 +285,8 @@ class LookupTables:
             expr = expr.args[0]
 
         if exp_func and expr not in self._lookup_table_expr and \
-                len(vars_used) == 1 and next(iter(vars_used)) in self._lookup_variables:
+                (len(vars_used) == 1 and next(iter(vars_used)) in self._lookup_variables or
+                 self._two_dimensional and frozenset(vars_used) in self._lookup_variable_pairs):
             self._lookup_table_expr[expr] = [vars_used, in_pw]
         elif expr in self._lookup_table_expr:  # Store whether the experssion appears in a Piecewise
             self._lookup_table_expr[expr][1] = self._lookup_table_expr[expr][1] or in_pw
@@ -147,12 +297,92 @@ class LookupTables:
         if not self._lookup_params_processed:
             # Stick in a list of all expressions for the variable for easy access in the template
             for param in self._lookup_parameters:
-                param['lookup_epxrs'] = [(k, v[1]) for k, v in self._lookup_table_expr.items() if param['var'] in v[0]]
+                param['lookup_epxrs'] = [(k, v[1]) for k, v in self._lookup_table_expr.items()
+                                         if v[0] == {param['var']}]
 
             # Filter out the parameter set for which we didn't find any complicated expressions
             self._lookup_parameters = list(filter(lambda p: len(p['lookup_epxrs']) > 0, self._lookup_parameters))
+            if self._tolerance is not None:
+                for param in self._lookup_parameters:
+                    param['mTableSteps'] = self._select_step(param)
+            self._process_lookup_parameters_2d()
             self._lookup_params_processed = True
 
+    def _process_lookup_parameters_2d(self):
+        """ Set up the 2-D tables (if enabled) and report expressions suitable for 2-D tables.
+
+            The ranges and steps of 2-D tables are those of their keying variables, so that they can be changed when
+            running the model. Keying variables without a 1-D table are added after those with a 1-D table. """
+        keys = list(self._lookup_parameters)
+        for pair, (a, b) in self._lookup_variable_pairs.items():
+            candidates = [c for c in self._lookup_table_2d_candidates
+                          if c.free_symbols & self._lookup_variables == pair]
+            saved = sum(self._lookup_table_2d_candidates[c] for c in candidates)
+            tags = (a['metadata_tag'], b['metadata_tag'])
+            if not self._two_dimensional:
+                if len(candidates) > 0:
+                    LOGGER.info('%d expressions depend on both %s and %s, a 2-D lookup table would save %d expensive '
+                                'function calls per evaluation (use --lookup-table-2d)' %
+                                ((len(candidates), ) + tags + (saved, )))
+                continue
+            lookup_epxrs = [(k, v[1]) for k, v in self._lookup_table_expr.items() if v[0] == pair]
+            if len(lookup_epxrs) == 0:
+                continue
+
+            new_keys = [key for key in (a, b) if not any(key is k for k in keys)]
+            keys.extend(new_keys)
+            param = {'metadata_tags': tags, 'vars': (a['var'], b['var']),
+                     'key_indices': tuple(next(i for i, k in enumerate(keys) if k is key) for key in (a, b)),
+                     'new_keys': new_keys,
+                     'mTableMins': (a['mTableMins'], b['mTableMins']),
+                     'mTableMaxs': (a['mTableMaxs'], b['mTableMaxs']),
+                     'mTableSteps': [a['mTableSteps'], b['mTableSteps']],
+                     'max_table_size': MAX_2D_TABLE_SIZE, 'table_used_in_methods': set(), 'lookup_epxrs': lookup_epxrs}
+            sizes = self._table_sizes_2d(param)
+            while sizes[0] * sizes[1] > MAX_2D_TABLE_SIZE:
+                param['mTableSteps'][0 if sizes[0] >= sizes[1] else 1] *= 2
+                sizes = self._table_sizes_2d(param)
+            param['mTableSteps'] = tuple(param['mTableSteps'])
+            param['mTableSizes'] = sizes
+            if param['mTableSteps'] != (a['mTableSteps'], b['mTableSteps']):
+                LOGGER.warning('Increased the steps of the 2-D lookup table for %s and %s to %s and %s to limit its '
+                               'size' % (tags + param['mTableSteps']))
+            LOGGER.info('Using a %d x %d 2-D lookup table for %s and %s with %d expressions (%.1f MB), saving %d '
+                        'expensive function calls per evaluation' %
+                        (sizes + tags + (len(lookup_epxrs), 8e-6 * sizes[0] * sizes[1] * len(lookup_epxrs), saved)))
+            self._lookup_parameters_2d.append(param)
+
+    @staticmethod
+    def _table_sizes_2d(param):
+        """ The number of rows and columns of a 2-D table, including an extra row and column beyond the maximum
+            so that values at the maximum can be interpolated. """
+        return tuple(2 + int((param['mTableMaxs'][i] - param['mTableMins'][i]) / param['mTableSteps'][i] + 0.5)
+                     for i in range(2))
+
+    @timed('select_lookup_table_step')
+    def _select_step(self, param):
+        """ Select the largest step size (mTableSteps * 2^n) for which all expressions in the table can be
+            interpolated within the tolerance, by sampling the expressions. """
+        funcs, var = [], Dummy()
+        for expr, _ in param['lookup_epxrs']:
+            # lambdify can't print cellmlmanip Variables or Quantities, so replace them by a Dummy and numbers
+            subs = {q: float(q) for q in expr.atoms(Quantity)}
+            subs[param['var']] = var
+            expr = subs_math_func_placeholders(expr).xreplace(subs)
+            conditions = tuple(cond for pw in expr.atoms(Piecewise) for _, cond in pw.args if cond is not true)
+            funcs.append((lambdify([var], expr, modules='math'),
+                          lambdify([var], conditions, modules='math') if conditions else None))
+
+        table_range = param['mTableMaxs'] - param['mTableMins']
+        for doublings in range(MAX_STEP_DOUBLINGS, 0, -1):
+            step = param['mTableSteps'] * 2 ** doublings
+            if step <= table_range and \
+                    _interpolation_error_ok(funcs, param['mTableMins'], param['mTableMaxs'], step,
+                                            param['interpolation'], self._tolerance):
+                LOGGER.info('Using step size %s for the %s lookup table' % (step, param['metadata_tag']))
+                return step
+        return param['mTableSteps']
+
     def print_lut_expr(self, expr):
         """ prints an individual lookup expression e.g. `lt_row_0[0].
             *Please Note:* cannot be called after `print_lookup_parameters` has been called.
@@ -169,6 +399,12 @@ class LookupTables:
         self._process_lookup_parameters()
         if self._method_printed and expr in self._lookup_table_expr:
             variables = expr.free_symbols & self._lookup_variables
+            if len(variables) == 2:
+                for i, param in enumerate(self._lookup_parameters_2d):
+                    if variables == set(param['vars']):
+                        param['table_used_in_methods'].add(self._method_printed)
+                        return '_lt_2d_{}_row[{}]'.\
+                            format(i, param['lookup_epxrs'].index((expr, self._lookup_table_expr[expr][1])))
             assert len(variables) == 1, "Lookup table expressions should have exactly 1 (lookup) variable"
             var = tuple(variables)[0]
 
@@ -196,12 +432,41 @@ class LookupTables:
                 # For lookup table expressions we store a tuple of (expr, "is this licated in a Piecewise")
                 param['lookup_epxrs'] = list(map(lambda e: [printer.doprint(e[0]), e[1]], param['lookup_epxrs']))
                 param['var'] = printer.doprint(param['var'])
+            for param in self._lookup_parameters_2d:
+                param['lookup_epxrs'] = list(map(lambda e: [printer.doprint(e[0]), e[1]], param['lookup_epxrs']))
+                param['vars'] = tuple(map(printer.doprint, param['vars']))
 
             # reinstate lookup tables
             printer.lookup_table_function = old_lookup_table_func
             self._lookup_params_printed = True
         return self._lookup_parameters
 
+    def print_lookup_parameters_2d(self, printer):
+        """ Formats the 2-D tables for printing to chaste code, see `print_lookup_parameters`.
+            :param printer: A :class:`sympy.printing.printer.Printer` object to print the lookup table with.
+            :return: a list of dicts with the 2-D tables (which is empty unless 2-D tables are used) with keys:
+                     metadata_tags, vars, mTableMins, mTableMaxs, mTableSteps, mTableSizes (each a pair of
+                     values for the 2 variables), key_indices (the indices of the keying variables), new_keys (the
+                     keying variables without a 1-D table first used by this table), max_table_size, lookup_epxrs and
+                     table_used_in_methods."""
+        self.print_lookup_parameters(printer)
+        return self._lookup_parameters_2d
+
+    def print_cache_key(self):
+        """ A key for the expressions in the tables, which (together with `printing_state`) determine how
+            `print_lut_expr` prints expressions. Lookup tables with the same key print expressions the same way.
+            *Please Note:* no more calls to `calc_lookup_tables` can be made after this. """
+        self._process_lookup_parameters()
+        return (tuple((param['var'], tuple(expr for expr, _ in param['lookup_epxrs']))
+                      for param in self._lookup_parameters),
+                tuple((param['vars'], tuple(expr for expr, _ in param['lookup_epxrs']))
+                      for param in self._lookup_parameters_2d))
+
+    def printing_state(self):
+        """ The state that determines how `print_lut_expr` prints expressions: the method being printed and whether
+            the table itself has been printed."""
+        return self._method_printed, self._lookup_params_printed
+
     def method_being_printed(self, method_name):
         """ Method to associate a string with a set of lookup table expressions are being used.
             This method is intended to facilitate the template correctly initialising the required lookup table.
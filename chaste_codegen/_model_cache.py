@@ -0,0 +1,430 @@
+"""
+Persistent on-disk cache of models loaded by :meth:`load_model_with_conversions`.
+
+Converted models are pickled, keyed by a hash of the CellML file contents, the versions of chaste_codegen and its main
+dependencies and the options used to load the model. Loading a model from the cache skips parsing, singularity fixes
+and conversions, which dominate the time taken to load large models.
+
+The results of the expensive analyses done by translators (e.g. jacobians and linearity checks) are stored in the
+same cache, keyed by the model's key, the translator and the options affecting the analysis. So generating code for a
+model again with only e.g. a different class name re-uses the analysis.
+"""
+import functools
+import hashlib
+import io
+import logging
+import os
+import pickle
+import re
+import sys
+import tempfile
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import cellmlmanip
+import pint
+import sympy
+from cellmlmanip.model import Quantity, Variable
+from cellmlmanip.units import UnitStore
+from sympy import Dummy, Function
+from sympy.core.function import UndefinedFunction
+
+from chaste_codegen import (
+    DEFAULT_CACHE_DIR,
+    LOGGER,
+    MODULE_DIR,
+    __version__,
+)
+from chaste_codegen._timings import timed
+
+
+# Default maximum total size of the cached models in bytes
+DEFAULT_MAX_CACHE_SIZE = 512 * 1024 * 1024
+
+# Increase if the layout of cache entries changes, to invalidate existing entries
+_CACHE_FORMAT = 1
+
+_CACHE_EXT = '.pickle'
+_STORE_ID = re.compile(r'^store(\d+)_')
+
+
+def _rebuild_dummy(cls, name, dummy_index):
+    """ Re-creates a pickled :class:`cellmlmanip.model.Variable` or :class:`cellmlmanip.model.Quantity`.
+
+    The name and dummy index are set on creation, so that the (sympy) hash is correct before the object is added to any
+    dict or set while unpickling. :class:`_ModelUnpickler` shifts the dummy indices, see
+    :meth:`_ModelUnpickler.rebuild_dummy`.
+    """
+    return Dummy.__new__(cls, name, dummy_index=dummy_index, real=True)
+
+
+def _rebuild_function(name, assumptions):
+    """ Re-creates a pickled undefined sympy function e.g. ``Function('GetIntracellularAreaStimulus', real=True)``."""
+    return Function(name, **assumptions)
+
+
+class _ModelPickler(pickle.Pickler):
+    """ Pickler for :class:`cellmlmanip.Model` objects.
+
+    Sympy drops the instance attributes of Dummy subclasses and can't pickle undefined functions, so these are handled
+    via :meth:`reducer_override`. The model's :class:`pint.UnitRegistry` can't be pickled, so the registry and its units
+    are stored by reference (see :meth:`persistent_id`) and the registry is rebuilt from its unit definitions.
+    """
+
+    def __init__(self, file, registry):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._registry = registry
+        self.dummy_indices = set()
+
+    def persistent_id(self, obj):
+        if obj is self._registry:
+            return ('registry', )
+        elif obj is self._registry.Unit:
+            return ('unit_class', )
+        elif obj is self._registry.Quantity:
+            return ('quantity_class', )
+        elif isinstance(obj, self._registry.Unit):
+            return ('unit', obj._units)
+        elif isinstance(obj, self._registry.Quantity):
+            return ('quantity', obj.magnitude, obj._units)
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (Variable, Quantity)):
+            self.dummy_indices.add(obj.dummy_index)
+            return _rebuild_dummy, (type(obj), obj.name, obj.dummy_index), dict(obj.__dict__)
+        elif isinstance(obj, UndefinedFunction):
+            return _rebuild_function, (obj.__name__, dict(obj._kwargs))
+        return NotImplemented
+
+
+class _ModelUnpickler(pickle.Unpickler):
+    """ Unpickler for models pickled with :class:`_ModelPickler`, resolving references to the rebuilt registry.
+
+    Restored variables are given new dummy indices, so that they are distinct from any variables already loaded (e.g.
+    by loading the same model twice), as sympy's cache would otherwise mix up equal variables from different models.
+    Indices are shifted by ``dummy_index_offset``, which keeps the order of variables (and so the generated code) the
+    same.
+    """
+
+    def __init__(self, file, registry, dummy_index_offset):
+        super().__init__(file)
+        self._registry = registry
+        self._dummy_index_offset = dummy_index_offset
+
+    def find_class(self, module, name):
+        if module == __name__ and name == _rebuild_dummy.__name__:
+            return self.rebuild_dummy
+        return super().find_class(module, name)
+
+    def rebuild_dummy(self, cls, name, dummy_index):
+        return _rebuild_dummy(cls, name, dummy_index + self._dummy_index_offset)
+
+    def persistent_load(self, pid):
+        if pid[0] == 'registry':
+            return self._registry
+        elif pid[0] == 'unit_class':
+            return self._registry.Unit
+        elif pid[0] == 'quantity_class':
+            return self._registry.Quantity
+        elif pid[0] == 'unit':
+            return self._registry.Unit(pid[1])
+        elif pid[0] == 'quantity':
+            return self._registry.Quantity(pid[1], pid[2])
+        raise pickle.UnpicklingError('Unsupported persistent id: %s' % str(pid))
+
+
+class _AnalysisPickler(pickle.Pickler):
+    """ Pickler for the results of a translator's analysis of a model, see :meth:`dump_analysis_result`.
+
+    The model's variables are stored by name (see :meth:`persistent_id`), so that the results refer to the variables of
+    the model they are loaded for. Quantities can't be stored by name, so results containing them can't be pickled.
+    """
+
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Variable):
+            return ('variable', obj.name)
+        elif isinstance(obj, Quantity):
+            raise pickle.PicklingError('Cannot pickle quantity %s' % obj)
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, UndefinedFunction):
+            return _rebuild_function, (obj.__name__, dict(obj._kwargs))
+        return NotImplemented
+
+
+class _AnalysisUnpickler(pickle.Unpickler):
+    """ Unpickler for analysis results pickled with :class:`_AnalysisPickler`, resolving variables in model """
+
+    def __init__(self, file, model):
+        super().__init__(file)
+        self._model = model
+
+    def persistent_load(self, pid):
+        if pid[0] == 'variable':
+            return self._model.get_variable_by_name(pid[1])
+        raise pickle.UnpicklingError('Unsupported persistent id: %s' % str(pid))
+
+
+def dump_analysis_result(result):
+    """ Pickle the result of an analysis of a model by a translator (any picklable object, which can contain sympy
+    expressions using the model's variables).
+
+    :return: the pickled result (bytes).
+    """
+    data = io.BytesIO()
+    _AnalysisPickler(data).dump(result)
+    return data.getvalue()
+
+
+def load_analysis_result(data, model):
+    """ Load an analysis result pickled with :meth:`dump_analysis_result`, for the model it was pickled for. """
+    return _AnalysisUnpickler(io.BytesIO(data), model).load()
+
+
+class _LogRecorder(logging.Handler):
+    """ Records log messages, so they can be replayed when a model is loaded from the cache. """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+
+@functools.lru_cache(maxsize=None)
+def can_pickle_models():
+    """ Check the private sympy and cellmlmanip internals :meth:`load_model` relies on work as expected: the counters
+    numbering sympy Dummy objects (such as variables) and unit stores, and creating Dummy objects with a given index.
+
+    If they don't (e.g. after a change in sympy or cellmlmanip), models can't be restored correctly, so they aren't
+    cached (or passed to worker processes) and are loaded from the CellML file instead.
+    """
+    try:
+        if not all(isinstance(getattr(cls, name, None), int)
+                   for cls, name in ((Dummy, '_count'), (Dummy, '_base_dummy_index'), (UnitStore, '_next_id'))):
+            return False
+        count = Dummy._count
+        if Dummy().dummy_index != Dummy._base_dummy_index + count or Dummy._count != count + 1:
+            return False
+        dummy_index = Dummy._base_dummy_index + Dummy._count + 1000
+        dummy = _rebuild_dummy(Variable, 'x', dummy_index)
+        if dummy.dummy_index != dummy_index or dummy != _rebuild_dummy(Variable, 'x', dummy_index):
+            return False
+        next_id = UnitStore._next_id
+        store = UnitStore()
+        return UnitStore._next_id == next_id + 1 and _STORE_ID.match(store._prefix + 'unit') is not None and \
+            isinstance(store._registry._units, Mapping)
+    except Exception as e:
+        LOGGER.debug('Models can not be pickled: %s', e)
+        return False
+
+
+def dump_model(model, file, log_records=()):
+    """ Pickle a (converted) :class:`cellmlmanip.Model` to the open binary file ``file``.
+
+    :param model: the model to pickle.
+    :param file: a file object opened for writing in binary mode.
+    :param log_records: optional list of (level, message) tuples logged while loading the model.
+    """
+    registry = model.units._registry
+    # Units defined by unit stores are prefixed with the store id, everything else comes from cellmlmanip's defaults
+    unit_definitions = [definition for name, definition in registry._units.items() if _STORE_ID.match(name)]
+    data = io.BytesIO()
+    pickler = _ModelPickler(data, registry)
+    pickler.dump(model)
+    dummy_indices = (min(pickler.dummy_indices), max(pickler.dummy_indices)) if pickler.dummy_indices else (0, 0)
+    pickle.dump((unit_definitions, list(log_records), dummy_indices), file, protocol=pickle.HIGHEST_PROTOCOL)
+    file.write(data.getvalue())
+
+
+def load_model(file):
+    """ Load a model pickled with :meth:`dump_model` from the open binary file ``file``.
+
+    Only works if :meth:`can_pickle_models`.
+
+    :return: tuple (model, log_records).
+    """
+    assert can_pickle_models(), 'Expecting the sympy and cellmlmanip internals used to restore models to work'
+    unit_definitions, log_records, (min_dummy_index, max_dummy_index) = pickle.load(file)
+    # Make sure new unit stores don't re-use the id (and so the names) of restored unit stores
+    store_ids = [int(_STORE_ID.match(definition.name).group(1)) for definition in unit_definitions]
+    UnitStore._next_id = max([UnitStore._next_id] + [i + 1 for i in store_ids])
+    registry = UnitStore()._registry
+    for definition in unit_definitions:
+        registry.define(definition)
+    # Reserve a range of new dummy indices for the restored variables
+    dummy_index_offset = Dummy._base_dummy_index + Dummy._count - min_dummy_index
+    Dummy._count += max_dummy_index - min_dummy_index + 1
+    return _ModelUnpickler(file, registry, dummy_index_offset).load(), log_records
+
+
+class ModelCache(object):
+    """ A size bounded on-disk cache of converted models and the results of translators' analysis of them.
+
+    When the total size of the cache exceeds ``max_size`` bytes, the least recently used entries are removed.
+
+    :param cache_dir: the folder to store cached models in, created if it does not exist.
+    :param max_size: the maximum total size of the cached models in bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get_key(self, model_file, **options):
+        """ Get the cache key for a model file loaded with the given (keyword) options.
+
+        The key is a hash of the file contents, the options, the versions of chaste_codegen, python, cellmlmanip,
+        sympy and pint and the contents of the oxmeta ontology (which is used in conversions).
+        """
+        key = hashlib.sha256()
+        with open(model_file, 'rb') as f:
+            key.update(f.read())
+        with open(os.path.join(MODULE_DIR, 'ontologies', 'oxford-metadata.ttl'), 'rb') as f:
+            key.update(f.read())
+        key.update(repr((_CACHE_FORMAT, __version__, sys.version_info[:2], cellmlmanip.__version__, sympy.__version__,
+                         pint.__version__, sorted(options.items()))).encode())
+        return key.hexdigest()
+
+    def get_analysis_key(self, model_key, translator, **options):
+        """ Get the cache key for the analysis of the model cached under model_key by the translator (class name) with
+        the given (keyword) options. Options which only affect how the results are printed (e.g. the class name in
+        the generated code) should be left out, so that the analysis is re-used when these change.
+        """
+        key = hashlib.sha256()
+        key.update(repr((model_key, translator, sorted(options.items()))).encode())
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + _CACHE_EXT)
+
+    @timed('load_from_cache')
+    def load(self, key):
+        """ Load the model stored under key, replaying any messages logged when the model was first loaded.
+
+        :return: the model or None if the model is not in the cache (or the cached file can't be read, or models can't
+                 be restored, see :meth:`can_pickle_models`).
+        """
+        path = self._path(key)
+        if not can_pickle_models() or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                model, log_records = load_model(f)
+        except Exception as e:
+            LOGGER.warning('Ignoring unreadable cached model %s: %s', path, e)
+            self._remove(path)
+            return None
+        os.utime(path)  # mark as recently used
+        LOGGER.debug('Loaded cached model %s', path)
+        for level, message in log_records:
+            LOGGER.log(level, message)
+        return model
+
+    @timed('store_in_cache')
+    def store(self, key, model, log_records=()):
+        """ Store a model in the cache, then remove the least recently used models if the cache is too big. """
+        if not can_pickle_models():
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file and move in place, so that parallel runs never see half-written files
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    dump_model(model, f, log_records)
+            except Exception:
+                self._remove(tmp_path)
+                raise
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            LOGGER.warning('Could not store model in cache %s: %s', self.cache_dir, e)
+            return
+        self._evict()
+
+    @timed('load_analysis_from_cache')
+    def load_analysis(self, key):
+        """ Load the analysis results stored under key.
+
+        :return: dict of the pickled results by name (see :meth:`dump_analysis_result`), empty if there is no entry
+                 for key (or the cached file can't be read).
+        """
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                analysis = pickle.load(f)
+        except Exception as e:
+            LOGGER.warning('Ignoring unreadable cached analysis %s: %s', path, e)
+            self._remove(path)
+            return {}
+        os.utime(path)  # mark as recently used
+        LOGGER.debug('Loaded cached analysis %s', path)
+        return analysis
+
+    @timed('store_analysis_in_cache')
+    def store_analysis(self, key, analysis):
+        """ Store analysis results, a dict of pickled results by name, then remove the least recently used entries if
+        the cache is too big. """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(analysis, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self._remove(tmp_path)
+                raise
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            LOGGER.warning('Could not store analysis in cache %s: %s', self.cache_dir, e)
+            return
+        self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # already removed e.g. by a parallel run
+
+    def _evict(self):
+        """ Remove least recently used entries until the cache is within max_size. """
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(_CACHE_EXT):
+                path = os.path.join(self.cache_dir, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @contextmanager
+    def record_log(self):
+        """ Context manager recording messages logged by chaste_codegen, to store along with a model.
+
+        For example::
+
+            with cache.record_log() as log_records:
+                model = ...
+            cache.store(key, model, log_records)
+        """
+        recorder = _LogRecorder()
+        LOGGER.addHandler(recorder)
+        try:
+            yield recorder.records
+        finally:
+            LOGGER.removeHandler(recorder)
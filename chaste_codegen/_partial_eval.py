@@ -1,13 +1,21 @@
+from contextlib import contextmanager
+from itertools import product
+
 from cellmlmanip.model import Variable
 from sympy import (
+    And,
     Derivative,
     Eq,
     Float,
     Piecewise,
-    cse,
     piecewise_fold,
 )
 from sympy.core import Symbol
+from sympy.logic.boolalg import Boolean, false, true
+
+from chaste_codegen._config import PIECEWISE_FOLDS
+from chaste_codegen._cse import cse
+from chaste_codegen._timings import timed
 
 
 def get_usage_count(equations):
@@ -25,11 +33,111 @@ def get_usage_count(equations):
     return usage_count
 
 
+# The way piecewise expressions are currently folded by fold_piecewises
+_piecewise_fold = 'sympy'
+
+# The maximum number of pieces a piecewise lifted out of an expression by lift_piecewises can have
+DEFAULT_MAX_PIECES = 64
+
+
+@contextmanager
+def piecewise_fold_engine(engine):
+    """ Fold piecewise expressions in the given way (one of PIECEWISE_FOLDS) in :func:`fold_piecewises` """
+    global _piecewise_fold
+    assert engine in PIECEWISE_FOLDS, 'Expecting engine to be one of %s' % str(PIECEWISE_FOLDS)
+    previous, _piecewise_fold = _piecewise_fold, engine
+    try:
+        yield
+    finally:
+        _piecewise_fold = previous
+
+
+def _unique_pieces(pieces):
+    """ Remove pieces which can't be reached: with a false condition, a condition of an earlier piece, or after a piece
+    with condition true. """
+    unique_pieces, conditions = [], set()
+    for expr, condition in pieces:
+        if condition is not false and condition not in conditions:
+            conditions.add(condition)
+            unique_pieces.append((expr, condition))
+        if condition is true:
+            break
+    return unique_pieces
+
+
+def _make_piecewise(pieces):
+    """ Make a piecewise from (expression, condition) pairs, without sympy's (potentially slow) simplification """
+    pieces = _unique_pieces(pieces)
+    if len(pieces) == 1 and pieces[0][1] is true:
+        return pieces[0][0]
+    return Piecewise(*pieces, evaluate=False)
+
+
+def lift_piecewises(expr, max_pieces=DEFAULT_MAX_PIECES):
+    """Fold a sympy expression so that piecewise expressions are lifted to the top, like sympy's piecewise_fold,
+    in a single (post-order) pass over the expression.
+
+    The pieces of piecewise arguments of sums, products, powers and functions are combined into one piecewise, where
+    piecewise arguments with the same conditions (such as the singularity fixes for the same variable) are combined
+    piece by piece rather than forming every combination. Unreachable pieces (e.g. with the same condition as an
+    earlier piece) are dropped, and the conditions are not simplified any further.
+
+    :param expr: the expression to fold.
+    :param max_pieces: the maximum number of pieces of a combined piecewise. Piecewise arguments of an expression that
+                       would need more pieces are left where they are.
+    :return: the folded expression, equivalent to expr.
+    """
+    folded = {}
+
+    def fold(expr):
+        if expr.is_Atom or isinstance(expr, (Derivative, Boolean)):
+            return expr
+        if expr not in folded:
+            if isinstance(expr, Piecewise):
+                pieces = []
+                for piece_expr, condition in expr.args:
+                    piece_expr = fold(piece_expr)
+                    if isinstance(piece_expr, Piecewise):  # conditions of nested piecewise apply within condition
+                        pieces.extend((e, And(condition, c)) for e, c in piece_expr.args)
+                    else:
+                        pieces.append((piece_expr, condition))
+                folded[expr] = _make_piecewise(pieces)
+            else:
+                args = [fold(arg) for arg in expr.args]
+                # piecewise arguments with the same conditions choose the same piece
+                groups = {}
+                for i, arg in enumerate(args):
+                    if isinstance(arg, Piecewise):
+                        groups.setdefault(tuple(c for _, c in arg.args), []).append(i)
+                num_pieces = 1
+                for conditions in groups:
+                    num_pieces *= len(conditions)
+                if len(groups) == 0 or num_pieces > max_pieces:
+                    changed = any(arg is not expr_arg for arg, expr_arg in zip(args, expr.args))
+                    folded[expr] = expr.func(*args) if changed else expr
+                else:
+                    pieces = []
+                    for choice in product(*(range(len(conditions)) for conditions in groups)):
+                        piece_args = list(args)
+                        for (conditions, indices), j in zip(groups.items(), choice):
+                            for i in indices:
+                                piece_args[i] = args[i].args[j].expr
+                        condition = And(*(conditions[j] for conditions, j in zip(groups, choice)))
+                        pieces.append((expr.func(*piece_args), condition))
+                    folded[expr] = _make_piecewise(pieces)
+        return folded[expr]
+
+    return fold(expr)
+
+
 def fold_piecewises(expr):
     """Performs a piecewise_fold on the sympy expression, using a work-around to prevent errors with complex nesting.
+    With :func:`piecewise_fold_engine` set to 'lift', :func:`lift_piecewises` is used instead.
     :param: expr the expression to piecewise_fold.
     :return: (equivalent to) piecewise_fold(expr)
     """
+    if _piecewise_fold == 'lift':
+        return lift_piecewises(expr)
     # Since piecewise_fold hangs with some complicated nestings, due to simplification we use the following workaround:
     # First extract common terms, perform piecewise_fold, re-insert the common terms
     # see: https://github.com/sympy/sympy/issues/20850
@@ -40,6 +148,7 @@ def fold_piecewises(expr):
     return expr
 
 
+@timed('partial_eval')
 def partial_eval(equations, required_lhs, keep_multiple_usages=True):
     """Partially evaluate the list of equations given.
 
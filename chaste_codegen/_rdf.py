@@ -1,17 +1,32 @@
 """
 RDF handling routines, including parsing the 'oxmeta' ontology.
 """
+import hashlib
+import json
 import os
+import tempfile
+from contextlib import contextmanager
 
 import rdflib
 from cellmlmanip.model import Model
 from cellmlmanip.rdf import create_rdf_node
 
-from chaste_codegen import MODULE_DIR, CodegenError
+from chaste_codegen import (
+    DEFAULT_CACHE_DIR,
+    LOGGER,
+    MODULE_DIR,
+    CodegenError,
+)
+from chaste_codegen._config import get_cache_subdir
 
 
-_ONTOLOGY = None  # The 'oxmeta' ontology graph
-_MULTI_USES_ALLOWED_TAGS = None
+_ONTOLOGY_INDEX = None  # Index of the 'oxmeta' ontology, see _load_ontology_index
+
+# Folder to store the precomputed index of the 'oxmeta' ontology in, or None to build the index in every process
+_ontology_index_dir = get_cache_subdir(DEFAULT_CACHE_DIR, 'ontology')
+
+# Increase if the layout of the index changes, to invalidate existing index files
+_ONTOLOGY_INDEX_FORMAT = 1
 
 PYCMLMETA = 'https://chaste.comlab.ox.ac.uk/cellml/ns/pycml#'
 OXMETA = 'https://chaste.comlab.ox.ac.uk/cellml/ns/oxford-metadata#'
@@ -21,14 +36,78 @@ PRED_IS = create_rdf_node((BQBIOL, 'is'))
 PRED_IS_VERSION_OF = create_rdf_node((BQBIOL, 'isVersionOf'))
 
 
-def _load_ontoloty():
-    global _ONTOLOGY
+def _build_ontology_index(ttl_file):
+    """ Parse the ontology and index the terms of each RDF class (transitively) and the MultipleUsesAllowed terms.
+
+    :return: dict with 'types' a dict of class to the list of terms connected to it by a path of ``rdf:type``
+             predicates (including the class itself) and 'multiple_uses_allowed' a list of terms of type
+             ``oxmeta:MultipleUsesAllowed``. All terms are given as strings.
+    """
+    ontology = rdflib.Graph()
+    ontology.parse(ttl_file, format='turtle')
+    return {'types': {str(term): sorted(str(t) for t in ontology.transitive_subjects(rdflib.RDF.type, term))
+                      for term in set(ontology.objects(None, rdflib.RDF.type))},
+            'multiple_uses_allowed': sorted(str(term) for term in ontology.subjects(
+                rdflib.RDF.type, create_rdf_node((OXMETA, 'MultipleUsesAllowed'))))}
+
+
+@contextmanager
+def ontology_index_dir(index_dir):
+    """ Store the index of the 'oxmeta' ontology in (and load it from) index_dir within the context.
+    If index_dir is None the index is built when needed, without reading or storing it.
+    """
+    global _ontology_index_dir
+    previous, _ontology_index_dir = _ontology_index_dir, index_dir
+    try:
+        yield
+    finally:
+        _ontology_index_dir = previous
+
+
+def _load_ontology_index():
+    """ Load the index of the 'oxmeta' ontology, see :meth:`_build_ontology_index`.
 
-    if _ONTOLOGY is None:
-        # Load oxmeta ontology
-        _ONTOLOGY = rdflib.Graph()
+    The index is stored in the folder set with :func:`ontology_index_dir` keyed by a hash of the ontology, so that the
+    ontology only needs to be parsed when it changes. If the index can't be stored it is built in every process.
+    """
+    global _ONTOLOGY_INDEX
+
+    if _ONTOLOGY_INDEX is None:
         ttl_file = os.path.join(MODULE_DIR, 'ontologies', 'oxford-metadata.ttl')
-        _ONTOLOGY.parse(ttl_file, format='turtle')
+        key = hashlib.sha256()
+        with open(ttl_file, 'rb') as f:
+            key.update(f.read())
+        key.update(repr(_ONTOLOGY_INDEX_FORMAT).encode())
+        index_dir = _ontology_index_dir
+        index_file = None
+        if index_dir is not None:
+            index_file = os.path.join(index_dir, 'oxford-metadata-' + key.hexdigest() + '.json')
+
+        index = None
+        if index_file is not None and os.path.isfile(index_file):
+            try:
+                with open(index_file, 'r') as f:
+                    index = json.load(f)
+            except Exception as e:
+                LOGGER.debug('Ignoring unreadable ontology index %s: %s', index_file, e)
+        if index is None:
+            index = _build_ontology_index(ttl_file)
+            if index_file is not None:
+                try:
+                    os.makedirs(index_dir, exist_ok=True)
+                    # Write to a temporary file and move in place, so that parallel runs never see half-written files
+                    fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(index, f)
+                    os.replace(tmp_path, index_file)
+                except OSError as e:
+                    LOGGER.debug('Could not store ontology index in %s: %s', index_dir, e)
+
+        _ONTOLOGY_INDEX = {'types': {rdflib.URIRef(term): tuple(map(rdflib.URIRef, terms))
+                                     for term, terms in index['types'].items()},
+                           'multiple_uses_allowed': set(term.replace(OXMETA, '')
+                                                        for term in index['multiple_uses_allowed'])}
+    return _ONTOLOGY_INDEX
 
 
 def get_variables_transitively(model, term):
@@ -57,12 +136,10 @@ def get_variables_transitively(model, term):
     assert isinstance(term, tuple), "Expecting term to be a namespace tuple"
     assert isinstance(model, Model), "Expecting model to be a cellmlmanip Model"
 
-    _load_ontoloty()
-
     term = create_rdf_node(term)
 
     cmeta_ids = set()
-    for annotation in _ONTOLOGY.transitive_subjects(rdflib.RDF.type, term):
+    for annotation in _load_ontology_index()['types'].get(term, (term, )):
         cmeta_ids.update(model.rdf.subjects(PRED_IS, annotation))
         cmeta_ids.update(model.rdf.subjects(PRED_IS_VERSION_OF, annotation))
 
@@ -78,11 +155,4 @@ def get_variables_transitively(model, term):
 
 
 def get_MultipleUsesAllowed_tags():
-    global _MULTI_USES_ALLOWED_TAGS
-    if _MULTI_USES_ALLOWED_TAGS is None:
-        _load_ontoloty()
-        _MULTI_USES_ALLOWED_TAGS = set(str(term).replace(OXMETA, '')
-                                       for term in _ONTOLOGY.subjects(rdflib.RDF.type,
-                                                                      create_rdf_node((OXMETA, 'MultipleUsesAllowed'))))
-
-    return _MULTI_USES_ALLOWED_TAGS
+    return _load_ontology_index()['multiple_uses_allowed']
@@ -1,16 +1,33 @@
+import hashlib
+import json
 import os
+import re
 
 
-def write_file(file_name, file_contents):
+# Matches the generation date in the header comments of generated code, which changes every time code is generated
+GENERATION_DATE_REGEX = re.compile(r'^(//!? on )\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', re.MULTILINE)
+
+
+def write_file(file_name, file_contents, only_if_changed=False):
     """ Write a file into the given file name
 
     :param file_name: file name including path
     :param file_contents: a str with the contents of the file to be written
+    :param only_if_changed: if True, an existing file is left untouched when its contents only differ from
+                            file_contents in the generation date. This keeps its modification time, so that it doesn't
+                            need to be compiled again.
+    :return: True if the file was written, False if it was left unchanged
     """
 
     assert isinstance(file_name, str) and len(file_name) > 0, "Expecting a file path as string"
     assert isinstance(file_contents, str), "Contents should be a string"
 
+    if only_if_changed and os.path.isfile(file_name):
+        with open(file_name, 'r') as file:
+            existing_contents = file.read()
+        if GENERATION_DATE_REGEX.sub(r'\1', existing_contents) == GENERATION_DATE_REGEX.sub(r'\1', file_contents):
+            return False
+
     # Make sure the folder we are writing in exists
     path = os.path.dirname(file_name)
     if path != '':
@@ -20,3 +37,36 @@ def write_file(file_name, file_contents):
     file = open(file_name, 'w')
     file.write(file_contents)
     file.close()
+    return True
+
+
+def file_hash(file_name):
+    """ Get the sha256 hash of a file's contents
+
+    :param file_name: file name including path
+    :return: the hash as a hexadecimal str
+    """
+    with open(file_name, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def read_manifest(file_name):
+    """ Read a manifest written by :meth:`write_manifest`
+
+    :param file_name: file name including path
+    :return: the manifest (a dict) or None if the manifest does not exist or can't be read
+    """
+    try:
+        with open(file_name, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(file_name, manifest):
+    """ Write a manifest, describing how a set of files was generated, as json
+
+    :param file_name: file name including path
+    :param manifest: a dict that can be converted to json
+    """
+    write_file(file_name, json.dumps(manifest, indent=4, sort_keys=True) + '\n')
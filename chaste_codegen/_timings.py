@@ -0,0 +1,173 @@
+"""
+Timing and profiling of the phases of code generation.
+
+Phases are marked in the code using :class:`timed`, as a context manager or decorator. Timings are only recorded
+while :meth:`record_timings` is active, otherwise :class:`timed` does nothing.
+
+For example::
+
+    with record_timings() as timings:
+        model = load_model_with_conversions('model.cellml')
+        with NormalChasteModel(model, 'model') as chaste_model:
+            chaste_model.generate_chaste_code()
+    timings.write_json('timings.json')
+
+Phases are named after the phases they are nested in, e.g. ``NormalChasteModel/__init__/_pre_print_hook``.
+"""
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import ContextDecorator, contextmanager
+
+from chaste_codegen._script_utils import write_file
+
+
+# The Timings object recording phases, if any
+_recorder = None
+
+
+class Timings(object):
+    """ Records the wall time, number of calls and peak memory use of (nested) named phases.
+
+    :param trace_memory: record peak memory use using :mod:`tracemalloc`. This slows down code generation.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self._stack = []  # [name, start time, peak memory] for each active phase
+        self._start, self._end = None, None
+
+    def _peak_memory(self):
+        return tracemalloc.get_traced_memory()[1]
+
+    def start(self, name):
+        """ Start a phase, nested in the currently active phase. """
+        if self.trace_memory and self._stack:
+            # The peak is reset for the new phase, so store the peak so far for the enclosing phase
+            self._stack[-1][2] = max(self._stack[-1][2], self._peak_memory())
+            tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), 0])
+
+    def stop(self):
+        """ Stop the currently active phase and record it. """
+        name, start, peak_memory = self._stack[-1]
+        wall_time = time.perf_counter() - start
+        path = '/'.join(phase[0] for phase in self._stack)
+        self._stack.pop()
+
+        phase = self.phases.setdefault(path, {'calls': 0, 'wall_time': 0.0, 'peak_memory': None})
+        phase['calls'] += 1
+        phase['wall_time'] += wall_time
+        if self.trace_memory:
+            peak_memory = max(peak_memory, self._peak_memory())
+            phase['peak_memory'] = max(phase['peak_memory'] or 0, peak_memory)
+            if self._stack:
+                self._stack[-1][2] = max(self._stack[-1][2], peak_memory)
+
+    def add(self, phases):
+        """ Add phases recorded elsewhere (e.g. in another process), nested in the currently active phase.
+
+        :param phases: list of phases as given by :meth:`report`.
+        """
+        for phase in phases:
+            path = '/'.join([active[0] for active in self._stack] + [phase['name']])
+            recorded = self.phases.setdefault(path, {'calls': 0, 'wall_time': 0.0, 'peak_memory': None})
+            recorded['calls'] += phase['calls']
+            recorded['wall_time'] += phase['wall_time']
+            if phase['peak_memory'] is not None:
+                recorded['peak_memory'] = max(recorded['peak_memory'] or 0, phase['peak_memory'])
+
+    def report(self):
+        """ Get the recorded timings
+
+        :return: a dict with the total wall time and a list of phases, in the order in which they were first
+                 completed. Each phase is given as a dict with keys name, calls, wall_time (in seconds) and
+                 peak_memory (in bytes allocated by python, or None if memory wasn't traced).
+        """
+        return {'python_version': '%d.%d.%d' % sys.version_info[:3],
+                'total_wall_time': ((self._end or time.perf_counter()) - self._start) if self._start else 0.0,
+                'phases': [dict(name=name, **phase) for name, phase in self.phases.items()]}
+
+    def write_json(self, file_name):
+        """ Write the report (see :meth:`report`) to file_name as json. """
+        write_file(file_name, json.dumps(self.report(), indent=4) + '\n')
+
+
+class timed(ContextDecorator):
+    """ Marks a named phase to record in the active :class:`Timings`, can be used as context manager or decorator:
+
+    ``with timed('render'):`` or ``@timed('partial_eval')``
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _recorder is not None:
+            _recorder.start(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if _recorder is not None:
+            _recorder.stop()
+        return False
+
+
+@contextmanager
+def record_timings(trace_memory=True):
+    """ Context manager recording the phases marked with :class:`timed`.
+
+    :param trace_memory: record peak memory use (slows down code generation).
+    :return: the :class:`Timings` recorded.
+    """
+    global _recorder
+    previous_recorder = _recorder  # e.g. inherited from the parent in a forked worker process
+    timings = Timings(trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    timings._start = time.perf_counter()
+    _recorder = timings
+    try:
+        yield timings
+    finally:
+        _recorder = previous_recorder
+        timings._end = time.perf_counter()
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def is_recording():
+    """ Returns True if timings are being recorded """
+    return _recorder is not None
+
+
+def add_phases(phases):
+    """ Add phases recorded in another process (see :meth:`Timings.report`) to the timings being recorded, if any """
+    if _recorder is not None:
+        _recorder.add(phases)
+
+
+@contextmanager
+def profile(file_name):
+    """ Context manager running :mod:`cProfile` and dumping the stats to file_name, for use with :mod:`pstats`.
+
+    :param file_name: the file to write the stats to. If None, nothing is profiled.
+    """
+    if file_name is None:
+        yield None
+        return
+    path = os.path.dirname(file_name)
+    if path != '':
+        os.makedirs(path, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(file_name)
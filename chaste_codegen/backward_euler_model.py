@@ -1,16 +1,16 @@
 from functools import partial
 
-from sympy import (
-    Derivative,
-    Piecewise,
-    Wild,
-    piecewise_fold,
-)
+from sympy import Derivative, Piecewise, piecewise_fold
 
-from chaste_codegen._jacobian import format_jacobian, get_jacobian
-from chaste_codegen._linearity_check import get_non_linear_state_vars, subst_deriv_eqs_non_linear_vars
+from chaste_codegen._jacobian import format_jacobian, get_jacobian, get_jacobian_chain_rule
+from chaste_codegen._linearity_check import (
+    get_linear_coefficients,
+    get_non_linear_state_vars,
+    subst_deriv_eqs_non_linear_vars,
+)
 from chaste_codegen._partial_eval import partial_eval
 from chaste_codegen._rdf import OXMETA, get_MultipleUsesAllowed_tags
+from chaste_codegen._timings import timed
 from chaste_codegen.chaste_model import ChasteModel, get_variable_name
 from chaste_codegen.model_with_conversions import get_equations_for
 
@@ -19,6 +19,8 @@ class BackwardEulerModel(ChasteModel):
     """ Holds template and information specific for the Backwards Euler model type"""
 
     def __init__(self, model, file_name, **kwargs):
+        # store if the jacobian should be calculated with the chain rule, see get_jacobian_chain_rule
+        self._chain_rule_jacobian = kwargs.get('chain_rule_jacobian', False)
         super().__init__(model, file_name, **kwargs)
         self._templates = ['backward_euler_model.hpp', 'backward_euler_model.cpp']
         self._vars_for_template['base_class'] = 'AbstractBackwardEulerCardiacCell'
@@ -41,22 +43,31 @@ class BackwardEulerModel(ChasteModel):
     def _pre_print_hook(self):
         """ Retreives out linear and non-linear derivatives and the relevant jacobian for it."""
         super()._pre_print_hook()
+        self._non_linear_state_vars, self._jacobian_equations, self._jacobian_matrix = \
+            self._cached_analysis('non_linear_jacobian', self._get_non_linear_jacobian)
+
+        # Pick the formatted equations that are for non-linear derivatives
+        self._non_linear_eqs = self._get_non_linear_eqs()
+
+        self._linear_deriv_eqs, self._linear_equations, self._vars_in_one_step = \
+            self._cached_analysis('linear_derivs', self._rearrange_linear_derivs)
+
+    def _get_non_linear_jacobian(self):
+        """Get the non-linear state vars and the jacobian for their derivatives"""
         # get deriv eqs and substitute in all variables other than state vars
         derivative_equations = \
             partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False)
-        self._non_linear_state_vars = \
+        non_linear_state_vars = \
             sorted(get_non_linear_state_vars(derivative_equations, self._model.membrane_voltage_var,
                    self._model.state_vars), key=lambda s: get_variable_name(s, s in self._in_interface))
-        # Pick the formatted equations that are for non-linear derivatives
-
-        self._non_linear_eqs = self._get_non_linear_eqs()
-
-        self._jacobian_equations, self._jacobian_matrix = \
-            get_jacobian(self._non_linear_state_vars,
-                         [d for d in derivative_equations if d.lhs.args[0] in self._non_linear_state_vars])
-
-        self._linear_deriv_eqs, self._linear_equations, self._vars_in_one_step = \
-            self._rearrange_linear_derivs()
+        if self._chain_rule_jacobian:
+            jacobian_equations, jacobian_matrix = \
+                get_jacobian_chain_rule(non_linear_state_vars, self._derivative_equations)
+        else:
+            jacobian_equations, jacobian_matrix = \
+                get_jacobian(non_linear_state_vars,
+                             [d for d in derivative_equations if d.lhs.args[0] in non_linear_state_vars])
+        return non_linear_state_vars, jacobian_equations, jacobian_matrix
 
     def _get_non_linear_eqs(self):
         """Get derivative eqs for non linear state vars"""
@@ -65,6 +76,7 @@ class BackwardEulerModel(ChasteModel):
         non_linear_deriv_eqs = tuple(e.lhs for e in self._model.get_equations_for(non_linear_derivs))
         return tuple(eq for eq in self._derivative_equations if eq.lhs in non_linear_deriv_eqs)
 
+    @timed('_rearrange_linear_derivs')
     def _rearrange_linear_derivs(self):
         """Formats the rearranged linear derivative expressions
 
@@ -95,12 +107,7 @@ class BackwardEulerModel(ChasteModel):
                 gh = (piecewise_branch(0), piecewise_branch(1))
 
             else:
-                h = Wild('h', exclude=[var])
-                g = Wild('g', exclude=[var])
-                match = expr.expand().match(g + h * var)
-                gh = (None, None)
-                if match is not None:
-                    gh = (match[g], match[h])
+                gh = get_linear_coefficients(expr, var) or (None, None)
             return gh
 
         # Substitute non-linear bits into derivative equations, so that we can pattern match
@@ -136,7 +143,6 @@ class BackwardEulerModel(ChasteModel):
         formatted_state_vars, use_verify_state_variables = super()._format_state_variables()
 
         jacobian_symbols = set()
-        non_linear_eq_symbols = set()
 
         # get symbols in jacobian
         for eq in self._jacobian_equations:
@@ -145,8 +151,7 @@ class BackwardEulerModel(ChasteModel):
             jacobian_symbols.update(eq.free_symbols)
 
         # store symbols used in non-linear equations
-        for eq in self._non_linear_eqs:
-            non_linear_eq_symbols.update(eq.rhs.free_symbols)
+        non_linear_eq_symbols = self._derivative_graph.free_symbols(self._non_linear_eqs)
 
         for sv in formatted_state_vars:
             sv['in_non_linear_eq'] = sv['sympy_var'] in non_linear_eq_symbols
@@ -1,14 +1,19 @@
 import time
+import weakref
 
 from sympy import Derivative, Float
 
 import chaste_codegen as cg
+from chaste_codegen._chaste_printer import PrintCache
+from chaste_codegen._dependency_graph import get_dependency_graph
+from chaste_codegen._model_cache import dump_analysis_result, load_analysis_result
 from chaste_codegen._rdf import (
     OXMETA,
     PYCMLMETA,
     get_MultipleUsesAllowed_tags,
     get_variables_transitively,
 )
+from chaste_codegen._timings import timed
 from chaste_codegen.model_with_conversions import (
     CYTOSOLIC_CALCIUM_CONCENTRATION_INDEX,
     MEMBRANE_VOLTAGE_INDEX,
@@ -19,6 +24,16 @@ from chaste_codegen.model_with_conversions import (
 
 TIME_STAMP = time.strftime('%Y-%m-%d %H:%M:%S')
 
+# Caches of printed expressions, shared by the translators for the same model
+_PRINT_CACHES = weakref.WeakKeyDictionary()
+
+
+def get_print_cache(model):
+    """Get the :class:`PrintCache` shared by all translators for the given model."""
+    if model not in _PRINT_CACHES:
+        _PRINT_CACHES[model] = PrintCache()
+    return _PRINT_CACHES[model]
+
 
 def get_variable_name(s, interface=False):
     """Get the correct variable name based on the variable and whether it should be in the chaste_interface."""
@@ -58,6 +73,9 @@ class ChasteModel(object):
         ``file_name``
             The name you want to give your generated files WITHOUT the .hpp and .cpp extension
             (e.g. aslanidi_model_2009 leads to aslanidi_model_2009.cpp and aslanidi_model_2009.hpp)
+        ``analysis_cache``, ``analysis_key``
+            Optional :class:`chaste_codegen._model_cache.ModelCache` and key to re-use (and store) the results of
+            expensive analyses (see :meth:`_cached_analysis`).
         """
 
         # Store default options
@@ -70,6 +88,10 @@ class ChasteModel(object):
 
         self._model = model
 
+        # Results of expensive analyses, loaded from the cache (pickled) when first needed and newly calculated
+        self._analysis_cache, self._analysis_key = kwargs.get('analysis_cache'), kwargs.get('analysis_key')
+        self._cached_analyses, self._new_analyses = None, {}
+
         # retrieve probabilities that don't stay in 0 ... 1 range and shouldn't be checked
         not_quite_probabilities = \
             set(get_variables_transitively(self._model, (OXMETA, 'not_a_probability_even_though_it_should_be')))
@@ -80,6 +102,7 @@ class ChasteModel(object):
 
         self._extended_ionic_vars = self._get_extended_ionic_vars()
         self._derivative_equations = self._get_derivative_equations()
+        self._derivative_graph = get_dependency_graph(self._model, self._derivative_equations)
 
         self._derivative_eqs_excl_voltage = self._get_derivative_eqs_excl_voltage()
         self._derivative_eqs_voltage = self._get_derivative_eqs_voltage()
@@ -110,7 +133,9 @@ class ChasteModel(object):
                                                             (OXMETA, 'Probability'))) - not_quite_probabilities
 
         # Printing
-        self._pre_print_hook()
+        with timed('_pre_print_hook'):
+            self._pre_print_hook()
+        self._print_cache = get_print_cache(self._model)
         self._add_printers()
         self._formatted_state_vars, self._use_verify_state_variables = self._format_state_variables()
 
@@ -126,6 +151,7 @@ class ChasteModel(object):
              'class_name': kwargs.get('class_name', 'ModelFromCellMl'),
              'header_ext': kwargs.get('header_ext', '.hpp'),
              'dynamically_loadable': kwargs.get('dynamically_loadable', False),
+             'lazy_lookup_tables': kwargs.get('lazy_lookup_tables', False),
              'use_model_factory': kwargs.get('use_model_factory', False),
              'cellml_base': kwargs.get('cellml_base', ''),
              'modifiers': self._format_modifiers(),
@@ -177,30 +203,13 @@ class ChasteModel(object):
 
     def _get_derivative_eqs_excl_voltage(self):
         """ Get equations defining the derivatives excluding V (self._model.membrane_voltage_var)"""
-        # stat with derivatives without voltage and add all equations used
-        eqs = set()
-        deriv_and_eqs = set(filter(lambda deriv: deriv.args[0] != self._model.membrane_voltage_var,
-                            self._model.y_derivatives))
-        num_derivatives = -1
-        while num_derivatives < len(deriv_and_eqs):
-            num_derivatives = len(deriv_and_eqs)
-            eqs = set(filter(lambda eq: eq.lhs in deriv_and_eqs, self._derivative_equations))
-            deriv_and_eqs.update(self._model.find_variables_and_derivatives([eq.rhs for eq in eqs]))
-        return eqs
+        return self._derivative_graph.equations_for(
+            [deriv for deriv in self._model.y_derivatives if deriv.args[0] != self._model.membrane_voltage_var])
 
     def _get_derivative_eqs_voltage(self):
         """ Get equations defining the derivatives for V only (self._model.membrane_voltage_var)"""
-        # start with derivatives for V only and add all equations used
-        eqs = set()
-        derivatives = set(filter(lambda deriv: deriv.args[0] == self._model.membrane_voltage_var,
-                          self._model.y_derivatives))
-        num_derivatives = -1
-        while num_derivatives < len(derivatives):
-            num_derivatives = len(derivatives)
-            eqs = set(filter(lambda eq: eq.lhs in derivatives, self._derivative_equations))
-            for eq in eqs:
-                derivatives.update(self._model.find_variables_and_derivatives((eq.rhs, )))
-        return eqs
+        return self._derivative_graph.equations_for(
+            [deriv for deriv in self._model.y_derivatives if deriv.args[0] == self._model.membrane_voltage_var])
 
     def _get_derived_quant(self):
         """ Get all derived quantities
@@ -219,6 +228,36 @@ class ChasteModel(object):
         """ Get the defining equations for derived quantities"""
         return get_equations_for(self._model, self._derived_quant)
 
+    def _cached_analysis(self, name, analyse):
+        """ Get the result of analyse(), an expensive analysis of the model by this translator.
+
+        If an analysis cache was given, a result stored under name by the same translator for the same model and
+        options is re-used. New results are stored in the cache by :meth:`generate_chaste_code`.
+        """
+        if self._analysis_cache is None:
+            return analyse()
+        if self._cached_analyses is None:
+            self._cached_analyses = self._analysis_cache.load_analysis(self._analysis_key)
+        if name in self._cached_analyses:
+            try:
+                return load_analysis_result(self._cached_analyses[name], self._model)
+            except Exception as e:
+                cg.LOGGER.warning('Ignoring unreadable cached analysis %s: %s', name, e)
+        result = analyse()
+        try:
+            # pickled straight away, as the objects in result can be changed later on
+            self._new_analyses[name] = dump_analysis_result(result)
+        except Exception as e:
+            cg.LOGGER.debug('Not caching analysis %s: %s', name, e)
+        return result
+
+    def _store_analyses(self):
+        """ Store the newly calculated analysis results in the analysis cache """
+        if len(self._new_analyses) > 0:
+            self._analysis_cache.store_analysis(self._analysis_key, dict(self._cached_analyses, **self._new_analyses))
+            self._cached_analyses.update(self._new_analyses)
+            self._new_analyses = {}
+
     def _pre_print_hook(self):
         """ The method provides a hook for subclasses to be able to add additional computation
             before printing of the output starts"""
@@ -236,24 +275,45 @@ class ChasteModel(object):
                              if variable not in self._model.modifiable_parameters
                              else self._print_modifiable_parameters(variable),
                              lambda deriv: get_variable_name(deriv),
-                             lookup_table_function)
+                             lookup_table_function, self._print_cache, self._print_cache_key)
+        self._set_print_cache_config()
 
         # Printer for printing variable in comments e.g. for ode system information
         self._name_printer = cg.ChastePrinter(lambda variable: get_variable_name(variable))
 
+    def _set_print_cache_config(self):
+        """ Works out the configuration of self._printer that stays the same while printing, see `_print_cache_key`.
+            Translators (for the same model) with the same configuration share printed expressions."""
+        config = (type(self)._print_modifiable_parameters, frozenset(self._in_interface),
+                  frozenset(self._model.modifiable_parameters), frozenset(self._modifiable_parameter_lookup.items()))
+        if hasattr(self, '_lookup_tables'):
+            config += (self._lookup_tables.print_cache_key(), )
+        self._print_cache_config = self._print_cache.config_id(config)
+
+    def _print_cache_key(self):
+        """ The configuration of self._printer, which determines how it prints expressions:
+            the configuration set by `_set_print_cache_config` and the state of the lookup tables (if there are any)."""
+        if hasattr(self, '_lookup_tables'):
+            return self._print_cache_config, self._lookup_tables.printing_state()
+        return (self._print_cache_config, )
+
     def _print_rhs_with_modifiers(self, modifier, eq, modifiers_with_defining_eqs=set()):
         """ Print modifiable parameters in the correct format for the model type"""
         # Make sure printer doesn't print variables as modifiers if they are state vars or eq lhs
         # as those are handled by _print_rhs_with_modifiers
-        modifier_printer = \
-            cg.ChastePrinter(lambda variable:
-                             self._format_modifier(variable) + '->Calc(' +
-                             self._printer.doprint(variable) + ', ' +
-                             self._printer.doprint(self._model.time_variable) + ')'
-                             if variable in self._modifiers and variable not in modifiers_with_defining_eqs
-                             else self._printer.doprint(variable),
-                             lambda deriv: self._printer.doprint(deriv),
-                             self._printer.lookup_table_function)
+        calc_modifiers = frozenset(m for m in self._modifiers if m not in modifiers_with_defining_eqs)
+        modifier_printer = self._printer
+        if len(calc_modifiers) > 0:
+            modifier_printer = \
+                cg.ChastePrinter(lambda variable:
+                                 self._format_modifier(variable) + '->Calc(' +
+                                 self._printer.doprint(variable) + ', ' +
+                                 self._printer.doprint(self._model.time_variable) + ')'
+                                 if variable in calc_modifiers
+                                 else self._printer.doprint(variable),
+                                 lambda deriv: self._printer.doprint(deriv),
+                                 self._printer.lookup_table_function, self._print_cache,
+                                 lambda: self._print_cache_key() + (type(self)._format_modifier, calc_modifiers))
         if modifier in self._modifiers:
             return self._format_modifier(modifier) + '->Calc(' + modifier_printer.doprint(eq) + ', ' + \
                 self._printer.doprint(self._model.time_variable) + ')'
@@ -309,29 +369,20 @@ class ChasteModel(object):
             return ''
 
         # Get all used variables for eqs for ionic variables to be able to indicate if a state var is used
-        ionic_var_variables = set()
-        for eq in self._extended_ionic_vars:
-            ionic_var_variables.update(eq.rhs.free_symbols)
+        ionic_var_variables = self._derivative_graph.free_symbols(self._extended_ionic_vars)
 
         # Get all used variables for y derivs to be able to indicate if a state var is used
-        y_deriv_variables = set()
-        for eq in self._derivative_equations:
-            y_deriv_variables.update(eq.rhs.free_symbols)
+        y_deriv_variables = self._derivative_graph.free_symbols(self._derivative_equations)
 
         # Get all used variables for y derivs to be able to indicate if a state var is used
-        voltage_deriv_variables = set()
-        for eq in self._derivative_eqs_voltage:
-            voltage_deriv_variables.update(eq.rhs.free_symbols)
+        voltage_deriv_variables = self._derivative_graph.free_symbols(self._derivative_eqs_voltage)
 
         # Get all used variables for derivatives_excl_voltage to be able to indicate if a state var is used
-        deriv_excl_voltage_variables = set()
-        for eq in self._derivative_eqs_excl_voltage:
-            deriv_excl_voltage_variables.update(eq.rhs.free_symbols)
+        deriv_excl_voltage_variables = self._derivative_graph.free_symbols(self._derivative_eqs_excl_voltage)
 
         # Get all used variables for eqs for derived quantities variables to be able to indicate if a state var is used
         derived_quant_variables = set(filter(lambda q: q in self._model.state_vars, self._derived_quant))
-        for eq in self._derived_quant_eqs:
-            derived_quant_variables.update(eq.rhs.free_symbols)
+        derived_quant_variables.update(self._derivative_graph.free_symbols(self._derived_quant_eqs))
 
         formatted_state_vars = \
             [{'var': self._printer.doprint(var[1]),
@@ -383,6 +434,7 @@ class ChasteModel(object):
     def _format_y_derivatives(self):
         """ Format y_derivatives for writing to chaste output"""
         self._in_interface.update(self._model.y_derivatives)
+        self._set_print_cache_config()
         return [self._printer.doprint(deriv) for deriv in self._model.y_derivatives]
 
     def _format_derivative_equations(self, derivative_equations):
@@ -452,11 +504,15 @@ class ChasteModel(object):
                         for eq in self._derived_quant_eqs]
         return formatted_eq
 
+    @timed('generate_chaste_code')
     def generate_chaste_code(self):
         """ Generates and stores chaste code"""
+        self._store_analyses()
         for templ in self._templates:
             template = cg.load_template(templ)
-            self.generated_code.append(template.render(self._vars_for_template))
+            with timed('render'):
+                self.generated_code.append(template.render(self._vars_for_template))
+        self._print_cache.log_statistics(type(self).__name__)
 
     def __exit__(self, type, value, traceback):
         """ Clean-up. Required to be able to use model in context (with).
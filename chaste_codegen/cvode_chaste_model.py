@@ -7,7 +7,7 @@ from sympy import (
     Matrix,
 )
 
-from chaste_codegen._jacobian import format_jacobian, get_jacobian
+from chaste_codegen._jacobian import format_jacobian, get_jacobian, get_jacobian_chain_rule
 from chaste_codegen._partial_eval import partial_eval
 from chaste_codegen._rdf import OXMETA, get_MultipleUsesAllowed_tags
 from chaste_codegen.chaste_model import ChasteModel
@@ -18,6 +18,8 @@ class CvodeChasteModel(ChasteModel):
     def __init__(self, model, file_name, **kwargs):
         self._use_data_clamp = kwargs.get('cvode_data_clamp', False)  # store if data clamp is needed
         self._use_analytic_jacobian = kwargs.get('use_analytic_jacobian', False)  # store if jacobians are needed
+        # store if the jacobian should be calculated with the chain rule, see get_jacobian_chain_rule
+        self._chain_rule_jacobian = kwargs.get('chain_rule_jacobian', False)
 
         super().__init__(model, file_name, **kwargs)
         self._templates = ['cvode_model.hpp', 'cvode_model.cpp']
@@ -37,10 +39,19 @@ class CvodeChasteModel(ChasteModel):
         self._vars_for_template['vector_decl'] = "N_Vector"  # indicate how to declare state vars and values
 
         if self._use_analytic_jacobian:
-            # get deriv eqs and substitute in all variables other than state vars
-            self._derivative_equations = \
-                partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False)
-            self._jacobian_equations, self._jacobian_matrix = get_jacobian(self._state_vars, self._derivative_equations)
+            if self._chain_rule_jacobian:
+                self._jacobian_equations, self._jacobian_matrix = \
+                    self._cached_analysis('jacobian', partial(get_jacobian_chain_rule, self._state_vars,
+                                                              self._derivative_equations))
+            else:
+                # get deriv eqs and substitute in all variables other than state vars
+                self._derivative_equations = \
+                    partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False)
+                if len(self._state_vars) > 0:  # sorted by state var, as get_jacobian does
+                    self._derivative_equations.sort(key=lambda d: self._state_vars.index(d.lhs.args[0]))
+                self._jacobian_equations, self._jacobian_matrix = \
+                    self._cached_analysis('jacobian',
+                                          partial(get_jacobian, self._state_vars, self._derivative_equations))
             self._formatted_state_vars = self._update_state_vars()
 
             self._vars_for_template['jacobian_equations'], self._vars_for_template['jacobian_entries'] = \
@@ -7,11 +7,16 @@ class OptCvodeChasteModel(CvodeChasteModel):
     """ Holds information specific for the Cvode Optimised model type. Builds on Cvode model type"""
 
     def __init__(self, model, file_name, **kwargs):
-        self._lookup_tables = LookupTables(model, lookup_params=kwargs.get('lookup_table', DEFAULT_LOOKUP_PARAMETERS))
+        self._lookup_tables = LookupTables(model, lookup_params=kwargs.get('lookup_table', DEFAULT_LOOKUP_PARAMETERS),
+                                           interpolation=kwargs.get('lookup_table_interpolation', 'linear'),
+                                           tolerance=kwargs.get('lookup_table_tolerance', None),
+                                           two_dimensional=kwargs.get('lookup_table_2d', False))
 
         super().__init__(model, file_name, **kwargs)
         self._vars_for_template['model_type'] += 'Opt'
         self._vars_for_template['lookup_parameters'] = self._lookup_tables.print_lookup_parameters(self._printer)
+        self._vars_for_template['lookup_parameters_2d'] = \
+            self._lookup_tables.print_lookup_parameters_2d(self._printer)
 
     def _get_stimulus(self):
         """ Get the partially evaluated stimulus currents in the model"""
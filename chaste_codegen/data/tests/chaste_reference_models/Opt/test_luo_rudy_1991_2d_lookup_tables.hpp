@@ -0,0 +1,86 @@
+#ifndef CELLTEST_LUO_RUDY_1991_CALCIUM_DEPENDENT_INACTIVATIONFROMCELLMLOPT_HPP_
+#define CELLTEST_LUO_RUDY_1991_CALCIUM_DEPENDENT_INACTIVATIONFROMCELLMLOPT_HPP_
+
+//! @file
+//!
+//! This source file was generated from CellML by chaste_codegen version 0.11.0
+//!
+//! Model: luo_rudy_1991
+//!
+//! Processed by chaste_codegen: https://github.com/ModellingWebLab/chaste-codegen
+//!     (translator: chaste_codegen, model type: NormalOpt)
+//! on 2026-10-18 12:32:20
+//!
+//! <autogenerated>
+
+#include "ChasteSerialization.hpp"
+#include <boost/serialization/base_object.hpp>
+#include "AbstractStimulusFunction.hpp"
+#include "AbstractCardiacCell.hpp"
+
+class Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt : public AbstractCardiacCell
+{
+    friend class boost::serialization::access;
+    template<class Archive>
+    void serialize(Archive & archive, const unsigned int version)
+    {
+        archive & boost::serialization::base_object<AbstractCardiacCell >(*this);
+        
+    }
+
+    //
+    // Settable parameters and readable variables
+    //
+
+
+private:
+const bool is_concentration[8] = {false, false, false, false, false, false, false, true};
+const bool is_probability[8] = {false, true, true, true, true, true, false, false};
+public:
+
+    boost::shared_ptr<RegularStimulus> UseCellMLDefaultStimulus();
+    double GetIntracellularCalciumConcentration();
+    Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt(boost::shared_ptr<AbstractIvpOdeSolver> pSolver, boost::shared_ptr<AbstractStimulusFunction> pIntracellularStimulus);
+    ~Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt();
+    void VerifyStateVariables();
+    AbstractLookupTableCollection* GetLookupTableCollection();
+    double GetIIonic(const std::vector<double>* pStateVariables=NULL);
+    void EvaluateYDerivatives(double var_chaste_interface__environment__time, const std::vector<double>& rY, std::vector<double>& rDY);
+
+    std::vector<double> ComputeDerivedQuantities(double var_chaste_interface__environment__time, const std::vector<double> & rY);
+};
+
+// Needs to be included last
+#include "SerializationExportWrapper.hpp"
+CHASTE_CLASS_EXPORT(Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt)
+
+namespace boost
+{
+    namespace serialization
+    {
+        template<class Archive>
+        inline void save_construct_data(
+            Archive & ar, const Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt * t, const unsigned int fileVersion)
+        {
+            const boost::shared_ptr<AbstractIvpOdeSolver> p_solver = t->GetSolver();
+            const boost::shared_ptr<AbstractStimulusFunction> p_stimulus = t->GetStimulusFunction();
+            ar << p_solver;
+            ar << p_stimulus;
+        }
+
+        template<class Archive>
+        inline void load_construct_data(
+            Archive & ar, Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt * t, const unsigned int fileVersion)
+        {
+            boost::shared_ptr<AbstractIvpOdeSolver> p_solver;
+            boost::shared_ptr<AbstractStimulusFunction> p_stimulus;
+            ar >> p_solver;
+            ar >> p_stimulus;
+            ::new(t)Celltest_luo_rudy_1991_calcium_dependent_inactivationFromCellMLOpt(p_solver, p_stimulus);
+        }
+
+    }
+
+}
+
+#endif // CELLTEST_LUO_RUDY_1991_CALCIUM_DEPENDENT_INACTIVATIONFROMCELLMLOPT_HPP_
\ No newline at end of file
@@ -1,31 +1,53 @@
+from collections import namedtuple
 from functools import partial
 
 from sympy import Derivative
 
-from chaste_codegen._jacobian import format_jacobian, get_jacobian
+from chaste_codegen._dependency_graph import Bitset, DependencyGraph
+from chaste_codegen._jacobian import (
+    format_jacobian,
+    get_jacobian,
+    get_jacobian_chain_rule,
+    get_jacobian_diagonal,
+)
 from chaste_codegen._partial_eval import partial_eval
+from chaste_codegen._timings import timed
 from chaste_codegen.chaste_model import ChasteModel
 
 
+# A (lhs, rhs) tuple as returned by get_jacobian, or a jacobian entry without a lhs, as a DependencyGraph equation
+_Equation = namedtuple('_Equation', ['lhs', 'rhs'])
+
+
 class GeneralisedRushLarsenFirstOrderModel(ChasteModel):
     """ Holds template and information specific for the GeneralisedRushLarsen model type"""
 
     def __init__(self, model, file_name, **kwargs):
+        # store whether only the diagonal of the jacobian (all the templates use) should be calculated
+        self._diagonal_jacobian = kwargs.get('diagonal_jacobian', False)
+        # store whether the jacobian should be calculated with the chain rule, see get_jacobian_chain_rule
+        self._chain_rule_jacobian = kwargs.get('chain_rule_jacobian', False)
         super().__init__(model, file_name, **kwargs)
         self._templates = ['generalised_rush_larsen_model.hpp', 'generalised_rush_larsen_model_1.cpp']
         self._vars_for_template['base_class'] = 'AbstractGeneralizedRushLarsenCardiacCell'
         self._vars_for_template['model_type'] = 'GeneralizedRushLarsenFirstOrder'
-        self._jacobian_equations, self._jacobian_matrix = self._get_jacobian()
+        self._jacobian_equations, self._jacobian_matrix = self._cached_analysis('jacobian', self._get_jacobian)
 
         self._vars_for_template['jacobian_equations'], self._vars_for_template['jacobian_entries'] = \
             self._print_jacobian()
 
         self._map_state_vars_and_eqs()
 
+    @timed('_get_jacobian')
     def _get_jacobian(self):
         """Retrieve jacobian matrix"""
+        if self._chain_rule_jacobian:
+            return get_jacobian_chain_rule(self._state_vars, self._derivative_equations,
+                                           diagonal=self._diagonal_jacobian)
         derivative_eqs_for_jacobian = \
             partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False)
+        if self._diagonal_jacobian:
+            return get_jacobian_diagonal(self._state_vars, derivative_eqs_for_jacobian)
         return get_jacobian(self._state_vars, derivative_eqs_for_jacobian)
 
     def _map_state_vars_and_eqs(self):
@@ -33,61 +55,69 @@ class GeneralisedRushLarsenFirstOrderModel(ChasteModel):
 
         Specifically updates self._formatted_state_vars and self._vars_for_template['jacobian_equations']
         and self._vars_for_template['jacobian_equations']
-        to add in_evaluate_y_derivative and in_evaluate_partial_derivative arrays
-        indicating whether they're used in the derivative or jacobian for the relevant state vars.
+        to add in_evaluate_y_derivative and in_evaluate_partial_derivative bitsets
+        indicating whether they're used in the derivative or jacobian for the relevant state vars:
+        bit i is set if used for the derivative (or diagonal jacobian entry) of self._model.y_derivatives[i].
         """
+        def used_symbols(exprs):
+            return set().union(*(expr.atoms(Derivative) | expr.free_symbols for expr in exprs))
 
-        def get_used_eqs_and_state_vars(eq_to_expand, equations):
-            """ Returns used equations and state vars for a given equation
+        def get_masks(equations, masks):
+            """ Propagate bitsets of the derivatives using each equation to the equations and state vars they use
 
-            :param eq_to_expand: list containing equations to recurse over and expand definitions for
-                       note: expecting equations in [(lhs, rhs)] form.
-            :param equations: set of equations to look for definitions in.
-            :return: set of equations and set of used state vars.
+            :param equations: list of equations with lhs and rhs.
+            :param masks: bitset for each equation, of the derivatives it is the starting point for.
+            :return: dict of bitsets by equation lhs, dict of bitsets by state var.
             """
-            used_state_vars = set()
-            for eq in eq_to_expand:
-                for v in eq[1].atoms(Derivative) | eq[1].free_symbols:
+            graph = DependencyGraph(equations, used_symbols)
+            masks = graph.dependants_masks(masks)
+            eq_masks, state_var_masks = {}, {}
+            for eq, dependencies, mask in zip(equations, graph.dependencies, masks):
+                eq_masks[eq.lhs] = eq_masks.get(eq.lhs, 0) | mask
+                for v in dependencies:
                     if v in self._model.state_vars:
-                        used_state_vars.add(v)
-                    elif v not in [e[0] for e in eq_to_expand]:
-                        eq_to_expand.extend(filter(lambda e: e[0] == v, equations))
-            return set(eq_to_expand), used_state_vars
+                        state_var_masks[v] = state_var_masks.get(v, 0) | mask
+            return eq_masks, state_var_masks
 
-        for i, deriv in enumerate(self._model.y_derivatives):
-            equations, used_state_vars = \
-                get_used_eqs_and_state_vars([(d.lhs, d.rhs) for d in self._derivative_equations if d.lhs == deriv],
-                                            set(map(lambda e: (e.lhs, e.rhs), self._derivative_equations)))
+        deriv_indices = {deriv: i for i, deriv in enumerate(self._model.y_derivatives)}
+        eq_masks, state_var_masks = \
+            get_masks(self._derivative_equations, [1 << deriv_indices[eq.lhs] if eq.lhs in deriv_indices else 0
+                                                   for eq in self._derivative_equations])
 
-            # get all the variables used in jacobian matrix entry and all variables used to define them
-            used_jacobian_vars, used_jacobian_state_vars = \
-                get_used_eqs_and_state_vars([(None, self._jacobian_matrix[i, i])], set(self._jacobian_equations))
+        # The diagonal jacobian entries are the starting points for the partial derivatives, without a lhs
+        jacobian_equations = [_Equation(lhs, rhs) for lhs, rhs in self._jacobian_equations]
+        jacobian_entries = [_Equation(None, self._jacobian_matrix[i, i]) for i in range(len(deriv_indices))]
+        jacobian_eq_masks, jacobian_state_var_masks = \
+            get_masks(jacobian_equations + jacobian_entries,
+                      [0] * len(jacobian_equations) + [1 << i for i in range(len(jacobian_entries))])
 
-            for sv in self._formatted_state_vars:
-                sv.setdefault('in_evaluate_y_derivative', []).append(sv['sympy_var'] in used_state_vars)
-                sv.setdefault('in_evaluate_partial_derivative', []).append(sv['sympy_var'] in used_jacobian_state_vars)
+        for sv in self._formatted_state_vars:
+            sv['in_evaluate_y_derivative'] = Bitset(state_var_masks.get(sv['sympy_var'], 0))
+            sv['in_evaluate_partial_derivative'] = Bitset(jacobian_state_var_masks.get(sv['sympy_var'], 0))
 
-            for eq in self._vars_for_template['y_derivative_equations']:
-                self.eq_in_evaluate_y_derivative(eq, equations)
+        for eq in self._vars_for_template['y_derivative_equations']:
+            self.eq_in_evaluate_y_derivative(eq, Bitset(eq_masks.get(eq['sympy_lhs'], 0)))
 
-            for je in self._vars_for_template['jacobian_equations']:
-                self.eq_in_evaluate_partial_derivative(je, used_jacobian_vars)
+        for je in self._vars_for_template['jacobian_equations']:
+            self.eq_in_evaluate_partial_derivative(je, Bitset(jacobian_eq_masks.get(je['sympy_lhs'], 0)))
 
-    def eq_in_evaluate_y_derivative(self, eq, used_equations):
-        """Indicate if the lhs of equation eq appears in used_equations
+    def eq_in_evaluate_y_derivative(self, eq, derivatives):
+        """Store the bitset of the derivatives the lhs of equation eq is used in
            specified here so derived model types can specify in detail what happens here"""
-        eq.setdefault('in_evaluate_y_derivative', []).append(eq['sympy_lhs'] in [eq[0] for eq in used_equations])
+        eq['in_evaluate_y_derivative'] = derivatives
 
-    def eq_in_evaluate_partial_derivative(self, eq, used_jacobian_vars):
-        """Indicate if the lhs of equation eq appears in used_jacobian_vars
+    def eq_in_evaluate_partial_derivative(self, eq, derivatives):
+        """Store the bitset of the (diagonal) jacobian entries the lhs of equation eq is used in
            specified here so derived model types can specify in detail what happens here"""
-        eq.setdefault('in_evaluate_partial_derivative', []).append(eq['sympy_lhs']
-                                                                   in [v[0] for v in used_jacobian_vars
-                                                                   if v[0] is not None])
+        eq['in_evaluate_partial_derivative'] = derivatives
 
     def _print_jacobian(self):
         modifiers_with_defining_eqs = set((eq[0] for eq in self._jacobian_equations)) | self._model.state_vars
-        return format_jacobian(self._jacobian_equations, self._jacobian_matrix, self._printer,
-                               partial(self._print_rhs_with_modifiers,
-                                       modifiers_with_defining_eqs=modifiers_with_defining_eqs),
-                               skip_0_entries=False)
+        jacobian_equations, jacobian_entries = \
+            format_jacobian(self._jacobian_equations, self._jacobian_matrix, self._printer,
+                            partial(self._print_rhs_with_modifiers,
+                                    modifiers_with_defining_eqs=modifiers_with_defining_eqs),
+                            skip_0_entries=False)
+        if self._diagonal_jacobian:  # the off-diagonal entries are not calculated, so don't print them
+            jacobian_entries = [entry for entry in jacobian_entries if entry['i'] == entry['j']]
+        return jacobian_equations, jacobian_entries
@@ -9,11 +9,16 @@ class GeneralisedRushLarsenFirstOrderModelOpt(GeneralisedRushLarsenFirstOrderMod
     """ Holds template and information specific for the GeneralisedRushLarsenOpt model type"""
 
     def __init__(self, model, file_name, **kwargs):
-        self._lookup_tables = LookupTables(model, lookup_params=kwargs.get('lookup_table', DEFAULT_LOOKUP_PARAMETERS))
+        self._lookup_tables = LookupTables(model, lookup_params=kwargs.get('lookup_table', DEFAULT_LOOKUP_PARAMETERS),
+                                           interpolation=kwargs.get('lookup_table_interpolation', 'linear'),
+                                           tolerance=kwargs.get('lookup_table_tolerance', None),
+                                           two_dimensional=kwargs.get('lookup_table_2d', False))
 
         super().__init__(model, file_name, **kwargs)
         self._vars_for_template['model_type'] += 'Opt'
         self._vars_for_template['lookup_parameters'] = self._lookup_tables.print_lookup_parameters(self._printer)
+        self._vars_for_template['lookup_parameters_2d'] = \
+            self._lookup_tables.print_lookup_parameters_2d(self._printer)
 
     def _get_stimulus(self):
         """ Get the partially evaluated stimulus currents in the model"""
@@ -64,23 +69,22 @@ class GeneralisedRushLarsenFirstOrderModelOpt(GeneralisedRushLarsenFirstOrderMod
         with self._lookup_tables.method_being_printed('ComputeDerivedQuantities'):
             return super()._format_derived_quant_eqs()
 
-    def eq_in_evaluate_y_derivative(self, eq, used_equations):
-        """Indicate if the lhs of equation eq appears in used_equations"""
-        super().eq_in_evaluate_y_derivative(eq, used_equations)
-        if eq['in_evaluate_y_derivative'][-1]:
-            # Reprint to indicate use of lookup table
-            with self._lookup_tables.method_being_printed('ComputeOneStepExceptVoltage' +
-                                                          str(len(eq['in_evaluate_y_derivative']) - 1)):
-                modifiers_with_defining_eqs = \
-                    set((eq.lhs for eq in self._derivative_equations)) | self._model.state_vars
-                eq['rhs'] = self._print_rhs_with_modifiers(eq['sympy_lhs'], eq['sympy_rhs'],
-                                                           modifiers_with_defining_eqs)
-
-    def eq_in_evaluate_partial_derivative(self, eq, used_jacobian_vars):
-        """Indicate if the lhs of equation eq appears in used_jacobian_vars"""
-        super().eq_in_evaluate_partial_derivative(eq, used_jacobian_vars)
-        if eq['in_evaluate_partial_derivative'][-1]:
-            # Reprint to indicate use of lookup table
-            with self._lookup_tables.method_being_printed('EvaluatePartialDerivative' +
-                                                          str(len(eq['in_evaluate_partial_derivative']) - 1)):
-                eq['rhs'] = self._printer.doprint(eq['sympy_rhs'])
+    def eq_in_evaluate_y_derivative(self, eq, derivatives):
+        """Store the bitset of the derivatives the lhs of equation eq is used in"""
+        super().eq_in_evaluate_y_derivative(eq, derivatives)
+        modifiers_with_defining_eqs = set((eq.lhs for eq in self._derivative_equations)) | self._model.state_vars
+        for i in range(derivatives.bit_length()):
+            if derivatives[i]:
+                # Reprint to indicate use of lookup table
+                with self._lookup_tables.method_being_printed('ComputeOneStepExceptVoltage' + str(i)):
+                    eq['rhs'] = self._print_rhs_with_modifiers(eq['sympy_lhs'], eq['sympy_rhs'],
+                                                               modifiers_with_defining_eqs)
+
+    def eq_in_evaluate_partial_derivative(self, eq, derivatives):
+        """Store the bitset of the (diagonal) jacobian entries the lhs of equation eq is used in"""
+        super().eq_in_evaluate_partial_derivative(eq, derivatives)
+        for i in range(derivatives.bit_length()):
+            if derivatives[i]:
+                # Reprint to indicate use of lookup table
+                with self._lookup_tables.method_being_printed('EvaluatePartialDerivative' + str(i)):
+                    eq['rhs'] = self._printer.doprint(eq['sympy_rhs'])
@@ -1,7 +1,11 @@
 import logging
+import weakref
+from functools import lru_cache
 
 import cellmlmanip
+import networkx as nx
 from cellmlmanip.model import DataDirectionFlow
+from cellmlmanip.parser import Transpiler
 from cellmlmanip.rdf import create_rdf_node
 from cellmlmanip.units import UnitStore
 from pint import DimensionalityError
@@ -16,7 +20,15 @@ from sympy import (
 )
 
 from chaste_codegen import LOGGER, CodegenError
-from chaste_codegen._math_functions import MATH_FUNC_SYMPY_MAPPING
+from chaste_codegen._math_functions import (
+    MATH_FUNC_SYMPY_MAPPING,
+    abs_,
+    acos_,
+    cos_,
+    exp_,
+    sin_,
+    sqrt_,
+)
 from chaste_codegen._optimize import optimize_expr_for_c_output
 from chaste_codegen._rdf import (
     OXMETA,
@@ -24,7 +36,11 @@ from chaste_codegen._rdf import (
     get_MultipleUsesAllowed_tags,
     get_variables_transitively,
 )
+from chaste_codegen._timings import timed
+
 
+# Per model, the information get_equations_for caches about the model's equation graph (see _get_equations_cache)
+_EQUATIONS_CACHES = weakref.WeakKeyDictionary()
 
 MEMBRANE_VOLTAGE_INDEX = 0  # default index for voltage in state vector
 CYTOSOLIC_CALCIUM_CONCENTRATION_INDEX = 1  # default index for cytosolic calcium concentration in state vector
@@ -36,26 +52,74 @@ STIM_PARAM_TAGS = (('membrane_stimulus_current_amplitude', 'uA_per_cm2', True),
                    ('membrane_stimulus_current_end', 'millisecond', False))
 
 
+@lru_cache(maxsize=None)
+def _register_mathml_handlers():
+    """ Set transpiler to produce our custom classes in order to avoid premature simplification/canonisation.
+
+    This happens (once) when this module is imported, so code loading models with ``cellmlmanip.load_model`` directly
+    should import ``chaste_codegen.model_with_conversions`` first.
+    """
+    Transpiler.set_mathml_handler('exp', exp_)
+    Transpiler.set_mathml_handler('abs', abs_)
+    Transpiler.set_mathml_handler('acos', acos_)
+    Transpiler.set_mathml_handler('cos', cos_)
+    Transpiler.set_mathml_handler('sqrt', sqrt_)
+    Transpiler.set_mathml_handler('sin', sin_)
+
+
+_register_mathml_handlers()
+
+
+@timed('load_model')
 def load_model_with_conversions(model_file, use_modifiers=False, quiet=False, skip_singularity_fixes=False,
-                                skip_conversions=False):
+                                skip_conversions=False, cache=None):
+    """ Load a cellml model, remove fixable singularities and add the conversions needed for code generation.
+
+    :param cache: optional :class:`chaste_codegen._model_cache.ModelCache`, to re-use models converted previously.
+                  The model's key in the cache is stored as ``model.cache_key``, to cache analyses of the model.
+    """
+    _register_mathml_handlers()
     if quiet:
         LOGGER.setLevel(logging.ERROR)
+    if cache is None:
+        return _load_model_with_conversions(model_file, use_modifiers, skip_singularity_fixes, skip_conversions)
+
+    # quiet is part of the key, as messages not logged while converting can't be replayed when loading from the cache
+    key = cache.get_key(model_file, use_modifiers=use_modifiers, quiet=quiet,
+                        skip_singularity_fixes=skip_singularity_fixes, skip_conversions=skip_conversions)
+    model = cache.load(key)
+    if model is not None:
+        # conversion rules are registered with the unit registry, which is not cached
+        if hasattr(model, '_config_capacitance_call'):
+            _add_conversion_rules(model)
+    else:
+        with cache.record_log() as log_records:
+            model = _load_model_with_conversions(model_file, use_modifiers, skip_singularity_fixes, skip_conversions)
+        cache.store(key, model, log_records)
+    model.cache_key = key
+    return model
+
+
+def _load_model_with_conversions(model_file, use_modifiers, skip_singularity_fixes, skip_conversions):
     try:
-        model = cellmlmanip.load_model(model_file)
+        with timed('parse'):
+            model = cellmlmanip.load_model(model_file)
     except Exception as e:
         raise CodegenError('Could not load cellml model: \n    ' + str(e))
     if not skip_singularity_fixes:
-        V = model.get_variable_by_ontology_term((OXMETA, 'membrane_voltage'))
-        tagged = set(model.get_variables_by_rdf((PYCMLMETA, 'modifiable-parameter'), 'yes', sort=False))
-        annotated = set(filter(lambda q: model.has_ontology_annotation(q, OXMETA), model.variables()))
-        excluded = (tagged | annotated) - set(model.get_derived_quantities(sort=False))
+        with timed('remove_fixable_singularities'):
+            V = model.get_variable_by_ontology_term((OXMETA, 'membrane_voltage'))
+            tagged = set(model.get_variables_by_rdf((PYCMLMETA, 'modifiable-parameter'), 'yes', sort=False))
+            annotated = set(filter(lambda q: model.has_ontology_annotation(q, OXMETA), model.variables()))
+            excluded = (tagged | annotated) - set(model.get_derived_quantities(sort=False))
 
-        model.remove_fixable_singularities(V, exclude=excluded)
+            model.remove_fixable_singularities(V, exclude=excluded)
     if not skip_conversions:
         add_conversions(model, use_modifiers=use_modifiers)
     return model
 
 
+@timed('add_conversions')
 def add_conversions(model, use_modifiers=True, skip_chaste_stimulus_conversion=False):
     # We are adding attributes to the model from cellmlmanip. This could break if the api changes
     # The check  below guards against this
@@ -154,14 +218,51 @@ def get_equations_for(model, variables, recurse=True, filter_modifiable_paramete
             with optimisations around using log10, and powers of whole numbers applied to rhs
             as well as modifiable parameters filtered out if required.
     """
-    equations = [eq for eq in model.get_equations_for(variables, recurse=recurse)
-                 if not filter_modifiable_parameters_lhs or eq.lhs not in model.modifiable_parameters]
+    cache = _get_equations_cache(model)
+    graph, ancestors, optimised = cache['graph'], cache['ancestors'], cache['optimised']
+
+    # Create set of variables for which we require equations
+    required_variables = set()
+    for output in variables:
+        required_variables.add(output)
+        if recurse:
+            if output not in ancestors:
+                ancestors[output] = nx.ancestors(graph, output)
+            required_variables.update(ancestors[output])
+        else:
+            required_variables.update(graph.pred[output])
+
+    # Get the equations in the same order as cellmlmanip.Model.get_equations_for
+    sorted_variables = sorted(required_variables & cache['order'].keys(), key=cache['order'].get)
+    equations = [graph.nodes[var]['equation'] for var in sorted_variables]
+    equations = [eq for eq in equations if eq is not None and
+                 (not filter_modifiable_parameters_lhs or eq.lhs not in model.modifiable_parameters)]
     if optimise:
         for i, eq in enumerate(equations):
-            equations[i] = Eq(eq.lhs, optimize_expr_for_c_output(eq.rhs))
+            if eq not in optimised:
+                optimised[eq] = Eq(eq.lhs, optimize_expr_for_c_output(eq.rhs))
+            equations[i] = optimised[eq]
     return equations
 
 
+def _get_equations_cache(model):
+    """Get the cached information about the equation graph of model used by get_equations_for
+
+    Holds the graph, the position of each variable in the order in which cellmlmanip sorts equations, the ancestors of
+    variables in the graph (found so far) and the optimised equations (optimised so far). The graph (and with it the
+    cache) is replaced by cellmlmanip whenever equations are added to or removed from the model.
+    """
+    graph = model.graph_with_sympy_numbers
+    cache = _EQUATIONS_CACHES.get(model)
+    if cache is None or cache['graph'] is not graph:
+        cache = _EQUATIONS_CACHES[model] = \
+            {'graph': graph,
+             'order': {var: i for i, var in enumerate(nx.lexicographical_topological_sort(graph, key=str))},
+             'ancestors': {},
+             'optimised': {}}
+    return cache
+
+
 def state_var_key_order(model, var):
     """Returns a key to order state variables in the same way as pycml does"""
     if isinstance(var, Derivative):
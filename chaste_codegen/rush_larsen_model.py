@@ -24,16 +24,18 @@ class RushLarsenModel(ChasteModel):
 
     def _get_non_linear_state_vars(self):
         """ Get and store the non_linear state vars """
-        derivative_equations = \
-            set(partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False))
-        self._non_linear_state_vars = \
-            get_non_linear_state_vars(derivative_equations, self._model.membrane_voltage_var,
-                                      self._model.state_vars)
-
-    def _get_formatted_alpha_beta(self):
-        """Gets the information for r_alpha_or_tau, r_beta_or_inf in the c++ output and formatted equations
-
-        Rearranges in the form (inf-x)/tau
+        def non_linear_state_vars():
+            derivative_equations = \
+                set(partial_eval(self._derivative_equations, self._model.y_derivatives, keep_multiple_usages=False))
+            return get_non_linear_state_vars(derivative_equations, self._model.membrane_voltage_var,
+                                             self._model.state_vars)
+        self._non_linear_state_vars = self._cached_analysis('non_linear_state_vars', non_linear_state_vars)
+
+    def _get_alpha_beta(self):
+        """Matches the derivatives of the linear state vars to alpha*(1-x) - beta*x or (inf-x)/tau
+
+        Returns a list with for each derivative in self._model.y_derivatives either ('alphabeta', alpha, beta),
+        ('inftau', tau, inf) or None if there is no match.
         """
         def match_alpha_beta(expr, x):  # expr already in piecewise_fold form
             """Match alpha*(1-x) - beta*x"""
@@ -55,7 +57,7 @@ class RushLarsenModel(ChasteModel):
                 i, t = match[inf], match[tau]
             return {'inf': i, 'tau': t}
 
-        derivative_alpha_beta, vars_in_derivative_alpha_beta = [], set()
+        alpha_beta = []
 
         # Substitute non-linear bits into derivative equations, so that we can pattern match
         linear_derivs_eqs = subst_deriv_eqs_non_linear_vars(self._model.y_derivatives, self._non_linear_state_vars,
@@ -74,11 +76,25 @@ class RushLarsenModel(ChasteModel):
                     it = match_inf_tau(eq.rhs, eq.lhs.args[0])
 
             # check if there was a match
-            if ab['alpha'] is not None or it['tau'] is not None:
-                eq = next(filter(lambda e: e.lhs == deriv, linear_derivs_eqs))
-                r_alpha_or_tau = ab['alpha'] if ab['alpha'] is not None else it['tau']
-                r_beta_or_inf = ab['beta'] if ab['beta'] is not None else it['inf']
-                derivative_alpha_beta.append({'type': 'alphabeta' if ab['alpha'] is not None else 'inftau',
+            if ab['alpha'] is not None:
+                alpha_beta.append(('alphabeta', ab['alpha'], ab['beta']))
+            elif it['tau'] is not None:
+                alpha_beta.append(('inftau', it['tau'], it['inf']))
+            else:
+                alpha_beta.append(None)
+        return alpha_beta
+
+    def _get_formatted_alpha_beta(self):
+        """Gets the information for r_alpha_or_tau, r_beta_or_inf in the c++ output and formatted equations
+
+        Rearranges in the form (inf-x)/tau
+        """
+        derivative_alpha_beta, vars_in_derivative_alpha_beta = [], set()
+        alpha_beta = self._cached_analysis('alpha_beta', self._get_alpha_beta)
+        for deriv, match in zip(self._model.y_derivatives, alpha_beta):
+            if match is not None:
+                match_type, r_alpha_or_tau, r_beta_or_inf = match
+                derivative_alpha_beta.append({'type': match_type,
                                               'r_alpha_or_tau': self._printer.doprint(r_alpha_or_tau),
                                               'r_beta_or_inf': self._printer.doprint(r_beta_or_inf)})
                 vars_in_derivative_alpha_beta.update(r_alpha_or_tau.free_symbols | r_beta_or_inf.free_symbols)
@@ -1,9 +1,13 @@
 import os
 import re
+from unittest import mock
 
 import pytest
 
 from chaste_codegen import DATA_DIR, load_model_with_conversions
+from chaste_codegen._config import get_cache_subdir
+from chaste_codegen._load_template import template_cache_dir
+from chaste_codegen._rdf import ontology_index_dir
 from chaste_codegen._script_utils import write_file
 
 
@@ -17,6 +21,18 @@ VERSION_REGEX = re.compile(r'(//! This source file was generated from CellML by
 cached_models = {}
 
 
+@pytest.fixture(scope='session', autouse=True)
+def cache_dir(tmp_path_factory):
+    """ Keep the caches used by the tests (and the processes started by them) out of the user's cache folder """
+    cache_home = str(tmp_path_factory.mktemp('cache'))
+    cache_dir = os.path.join(cache_home, 'chaste_codegen', 'models')
+    with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}), \
+            mock.patch('chaste_codegen._command_line_script.DEFAULT_CACHE_DIR', cache_dir), \
+            template_cache_dir(get_cache_subdir(cache_dir, 'templates')), \
+            ontology_index_dir(get_cache_subdir(cache_dir, 'ontology')):
+        yield cache_dir
+
+
 def cache_model(model_name):
     return cached_models.setdefault(model_name, load_model_with_conversions(model_name))
 
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+from unittest import mock
+
+from chaste_codegen import LOGGER
+from chaste_codegen._benchmark_script import chaste_codegen_bench, compare_results
+from chaste_codegen.tests.conftest import TESTS_FOLDER
+
+
+def _results(load, convert):
+    return {'models': {'model': {'load': {'with_conversions': load}, 'peak_rss': None,
+                                 'model_types': {'normal': {'convert': convert, 'generate': 0.01},
+                                                 'cvode': {'error': 'CodegenError: failed'}}}}}
+
+
+def test_compare_results():
+    LOGGER.info('Testing comparing benchmark results\n')
+    baseline = _results(1.0, 0.5)
+    assert compare_results(baseline, baseline, 1.25) == []
+    assert compare_results(_results(1.2, 0.6), baseline, 1.25) == []
+    assert compare_results(_results(2.0, 2.0), baseline, 1.25) == \
+        [('model', 'normal/convert', 0.5, 2.0), ('model', 'load_with_conversions', 1.0, 2.0)]
+    # times below MIN_COMPARE_TIME are ignored
+    assert compare_results(_results(0.05, 0.05), _results(0.01, 0.01), 1.25) == []
+
+
+def test_benchmark_script(tmp_path):
+    LOGGER.info('Testing the benchmark script\n')
+    tmp_path = str(tmp_path)
+    results_file = os.path.join(tmp_path, 'results.json')
+    model_file = os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml')
+    testargs = ['chaste_codegen_bench', model_file, '--model-types', 'normal', 'rush-larsen-c', 'cvode-opt',
+                '--output', results_file]
+    with mock.patch.object(sys, 'argv', testargs):
+        assert chaste_codegen_bench() == 0
+
+    with open(results_file, 'r') as f:
+        results = json.load(f)
+    result = results['models']['test_V_not_state_mparam']
+    assert sorted(result['load']) == ['with_conversions', 'without_conversions']
+    assert sorted(result['model_types']) == ['cvode-opt', 'normal', 'rush-larsen-c']
+    assert all(sorted(timings) == ['convert', 'generate'] for timings in result['model_types'].values())
+    assert result['peak_rss'] > 0
+
+    # Compare with a baseline in which everything was a lot faster
+    for load in result['load']:
+        result['load'][load] /= 100
+    baseline_file = os.path.join(tmp_path, 'baseline.json')
+    with open(baseline_file, 'w') as f:
+        json.dump(results, f)
+    testargs = ['chaste_codegen_bench', model_file, '--model-types', 'normal', '--compare', baseline_file]
+    with mock.patch.object(sys, 'argv', testargs), mock.patch('chaste_codegen._benchmark_script.MIN_COMPARE_TIME', 0):
+        assert chaste_codegen_bench() == 1
+
+
+def test_benchmark_script_no_models(tmp_path):
+    LOGGER.info('Testing the benchmark script without models\n')
+    testargs = ['chaste_codegen_bench', str(tmp_path)]
+    with mock.patch.object(sys, 'argv', testargs):
+        assert chaste_codegen_bench() == 1
@@ -12,9 +12,12 @@ from chaste_codegen import (
     add_conversions,
     load_model_with_conversions,
 )
+from chaste_codegen._optimize import optimize_expr_for_c_output
 from chaste_codegen._rdf import OXMETA
+from chaste_codegen.model_with_conversions import get_equations_for
 from chaste_codegen.tests.conftest import (
     CELLML_FOLDER,
+    TESTS_FOLDER,
     cache_model,
     compare_model_against_reference,
     load_chaste_models,
@@ -399,3 +402,34 @@ def test_stimulus_not_tagged():
     with pytest.raises(CodegenError, match='Ionic variables should not be a function of time. '
                                            'This is often caused by missing membrane_stimulus_current tag.'):
         add_conversions(chaste_model)
+
+
+def test_get_equations_for():
+    model = load_model_with_conversions(os.path.join(TESTS_FOLDER,
+                                                     'test_luo_rudy_1991_with_range_cap_dimensionless.cellml'))
+
+    def expected_equations(variables, recurse=True):
+        return [eq for eq in model.get_equations_for(variables, recurse=recurse)
+                if eq.lhs not in model.modifiable_parameters]
+
+    derivs = model.y_derivatives
+    for variables in (derivs, derivs[:1], derivs[1:], model.modifiable_parameters, []):
+        for recurse in (True, False):
+            assert get_equations_for(model, variables, recurse=recurse, optimise=False) == \
+                expected_equations(variables, recurse=recurse)
+
+    # equations are optimised once per model
+    equations = get_equations_for(model, derivs)
+    assert [eq.rhs for eq in equations] == [optimize_expr_for_c_output(eq.rhs) for eq in expected_equations(derivs)]
+    assert all(eq is cached_eq for eq, cached_eq in zip(equations, get_equations_for(model, derivs[1:] + derivs[:1])))
+
+    # the cache is replaced when the equations of the model change
+    var = model.add_variable('new_variable', model.membrane_voltage_var.units)
+    new_eq = sp.Eq(var, model.membrane_voltage_var * 2)
+    model.add_equation(new_eq)
+    assert get_equations_for(model, [var], optimise=False) == expected_equations([var])
+    assert new_eq in get_equations_for(model, [var], optimise=False)
+    model.remove_equation(new_eq)
+    with pytest.raises(Exception, match='The node new_variable is not in the digraph'):
+        get_equations_for(model, [var])
+    assert get_equations_for(model, derivs, optimise=False) == expected_equations(derivs)
@@ -1,16 +1,22 @@
 import logging
 import os
 import shutil
+import subprocess
 import sys
 from unittest import mock
 
 import chaste_codegen as cg
 from chaste_codegen import LOGGER
 from chaste_codegen._command_line_script import (
+    EXTENSION_LOOKUP_FROM_CONVERSION_TYPE,
+    EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME,
+    TRANSLATOR_NAMES,
+    TRANSLATOR_NAMES_OPT,
     TRANSLATORS,
     TRANSLATORS_OPT,
     TRANSLATORS_WITH_MODIFIERS,
     chaste_codegen,
+    use_caches,
 )
 from chaste_codegen.tests.conftest import CELLML_FOLDER, TESTS_FOLDER, compare_file_against_reference
 
@@ -24,6 +30,40 @@ def test_script_TRANSLATORS(capsys):
     LOGGER.info('Testing help for command line script\n')
     assert all((k[2:] in TRANSLATORS.keys() for k in TRANSLATORS_WITH_MODIFIERS))
     assert all((k in TRANSLATORS for k in TRANSLATORS_OPT))
+    for translators, names in ((TRANSLATORS, TRANSLATOR_NAMES), (TRANSLATORS_OPT, TRANSLATOR_NAMES_OPT)):
+        assert {k: (t[0].__name__,) + t[1:] for k, t in translators.items()} == names
+    assert {t.__name__: ext for t, ext in EXTENSION_LOOKUP_FROM_CONVERSION_TYPE.items()} == \
+        EXTENSION_LOOKUP_FROM_TRANSLATOR_NAME
+
+
+# Time budget (in seconds) for importing the command line script, which should not import the heavy dependencies
+IMPORT_TIME_BUDGET = 1.0
+
+LAZY_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from chaste_codegen._command_line_script import chaste_codegen
+print(time.perf_counter() - start)
+sys.argv = ['chaste_codegen'] + sys.argv[1:]
+chaste_codegen()
+print(' '.join(m for m in ('sympy', 'cellmlmanip', 'jinja2', 'rdflib', 'pint') if m in sys.modules))
+"""
+
+
+def test_script_lazy_imports():
+    """Test --show-outputs works without importing sympy, cellmlmanip etc, within the import time budget"""
+    LOGGER.info('Testing lazy imports for command line script\n')
+    model_file = os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml')
+    args = ['--show-outputs', '--opt', '--cvode', model_file]
+    result = subprocess.run([sys.executable, '-c', LAZY_IMPORT_SCRIPT] + args, capture_output=True, text=True,
+                            check=True)
+    import_time, *outputs, heavy_modules = result.stdout.splitlines()
+    assert [os.path.basename(o) for o in outputs] == ['test_V_not_state_mparamCvode.hpp',
+                                                      'test_V_not_state_mparamCvode.cpp',
+                                                      'test_V_not_state_mparamCvodeOpt.hpp',
+                                                      'test_V_not_state_mparamCvodeOpt.cpp']
+    assert heavy_modules == ''
+    assert float(import_time) < IMPORT_TIME_BUDGET
 
 
 def test_script_help(capsys):
@@ -586,6 +626,62 @@ def test_script_GRL2Opt(tmp_path):
                                    os.path.join(tmp_path, 'dynamic_viswanathan_model_1999_epi.cpp'))
 
 
+def test_script_GRL1_diagonal_jacobian(tmp_path):
+    """Convert a Generalised RushLarsen First Order model type, calculating only the diagonal of the jacobian"""
+    LOGGER.info('Testing model Generalised RushLarsen First Order with --diagonal-jacobian, for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    generated = []
+    for diagonal_jacobian in ([], ['--diagonal-jacobian']):
+        output_dir = os.path.join(tmp_path, str(len(generated)))
+        testargs = ['chaste_codegen', model_file, '--grl1', '--output-dir', output_dir, '--no-cache'] + \
+            diagonal_jacobian
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        with open(os.path.join(output_dir, 'test_luo_rudy_1991_with_range_cap_dimensionlessGRL1.cpp')) as f:
+            generated.append(f.read())
+    # a partial derivative is still calculated for each state variable, with fewer common terms
+    assert generated[1].count('partialF = ') == generated[0].count('partialF = ') > 0
+    assert generated[1].count('const double var_x') < generated[0].count('const double var_x')
+
+
+def test_script_CVODE_cse_hash(tmp_path):
+    """Convert a CVODE model type with analytic jacobian, using the hash-consing cse"""
+    LOGGER.info('Testing model CVODE with --cse hash, for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    generated = []
+    for cse in ([], ['--cse', 'hash']):
+        output_dir = os.path.join(tmp_path, str(len(generated)))
+        testargs = ['chaste_codegen', model_file, '--cvode', '-j', '--output-dir', output_dir, '--no-cache'] + cse
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        with open(os.path.join(output_dir, 'test_luo_rudy_1991_with_range_cap_dimensionlessCvode.cpp')) as f:
+            generated.append(f.read())
+    # the same jacobian entries are calculated, with different common terms
+    assert generated[1].count('IJth(rJacobian') == generated[0].count('IJth(rJacobian') > 0
+    assert generated[1] != generated[0]
+
+
+def test_script_opt_piecewise_fold_lift(tmp_path):
+    """Convert an Opt model type, folding piecewise expressions with --piecewise-fold lift"""
+    LOGGER.info('Testing model Opt with --piecewise-fold lift, for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    generated = []
+    for piecewise_fold in ('sympy', 'lift'):
+        output_dir = os.path.join(tmp_path, piecewise_fold)
+        testargs = ['chaste_codegen', model_file, '--opt', '--output-dir', output_dir, '--no-cache',
+                    '--piecewise-fold', piecewise_fold]
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        with open(os.path.join(output_dir, 'test_luo_rudy_1991_with_range_cap_dimensionlessOpt.cpp')) as f:
+            generated.append(f.read())
+    # the same piecewise expressions are generated
+    assert generated[1].count(' ? ') == generated[0].count(' ? ') > 0
+    assert len(generated[1].splitlines()) == len(generated[0].splitlines())
+
+
 def test_script_CVODE_DATA_CLAMP(tmp_path):
     """Convert a CVODE with Data Clamp model type"""
     LOGGER.info('Testing model CVODE with data clamp ,  for command line script\n')
@@ -651,6 +747,90 @@ def test_script_lookup_table(tmp_path):
                                    os.path.join(tmp_path, 'beeler_reuter_model_1977_lookup_tables.cpp'))
 
 
+def test_script_lookup_table_cubic_with_tolerance(tmp_path):
+    """Convert a model with cubic lookup tables, with automatically chosen step size"""
+    LOGGER.info('Testing cubic lookup tables with tolerance,  for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    outfile = os.path.join(tmp_path, 'test_luo_rudy_1991_cubic_lookup_tables.cpp')
+    # Call commandline script
+    testargs = ['chaste_codegen', model_file, '--opt', '-o', outfile,
+                '--lookup-table', 'membrane_voltage', '-150.0001', '199.9999', '0.001',
+                '--lookup-table-interpolation', 'cubic', '--lookup-table-tolerance', '1e-6']
+
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+    # Check output
+    reference = os.path.join(os.path.join(TESTS_FOLDER), 'chaste_reference_models', 'Opt')
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_cubic_lookup_tables.hpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_cubic_lookup_tables.hpp'))
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_cubic_lookup_tables.cpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_cubic_lookup_tables.cpp'))
+
+
+def test_script_lazy_lookup_tables(tmp_path):
+    """Convert a model with lookup tables that only interpolate the columns read"""
+    LOGGER.info('Testing lazy lookup tables,  for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    outfile = os.path.join(tmp_path, 'test_luo_rudy_1991_lazy_lookup_tables.cpp')
+    # Call commandline script
+    testargs = ['chaste_codegen', model_file, '--opt', '-o', outfile, '--lazy-lookup-tables']
+
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+    # Check output
+    reference = os.path.join(os.path.join(TESTS_FOLDER), 'chaste_reference_models', 'Opt')
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_lazy_lookup_tables.hpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_lazy_lookup_tables.hpp'))
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_lazy_lookup_tables.cpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_lazy_lookup_tables.cpp'))
+
+
+def test_script_lookup_table_2d(tmp_path, caplog):
+    """Convert a model with a 2-D lookup table for an expression depending on both voltage and calcium"""
+    LOGGER.info('Testing 2-D lookup tables,  for command line script\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_calcium_dependent_inactivation.cellml')
+    outfile = os.path.join(tmp_path, 'test_luo_rudy_1991_2d_lookup_tables.cpp')
+    # Call commandline script
+    testargs = ['chaste_codegen', model_file, '--opt', '-o', outfile,
+                '--lookup-table', 'membrane_voltage', '-100.0001', '49.9999', '0.1',
+                '--lookup-table', 'cytosolic_calcium_concentration', '0.00001', '0.01001', '0.0001',
+                '--lookup-table-2d']
+
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+    assert 'Using a 1502 x 102 2-D lookup table for membrane_voltage and cytosolic_calcium_concentration' in \
+        caplog.text
+    # Check output
+    reference = os.path.join(os.path.join(TESTS_FOLDER), 'chaste_reference_models', 'Opt')
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_2d_lookup_tables.hpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_2d_lookup_tables.hpp'))
+    compare_file_against_reference(os.path.join(reference, 'test_luo_rudy_1991_2d_lookup_tables.cpp'),
+                                   os.path.join(tmp_path, 'test_luo_rudy_1991_2d_lookup_tables.cpp'))
+
+
+def test_script_lookup_table_interpolation_wrong_args(caplog):
+    LOGGER.info('Testing lookup table interpolation and tolerance wrong arguments,  for command line script\n')
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    for args, error in ((['--lookup-table-interpolation', 'cubic'],
+                         'Can only use --lookup-table-interpolation and --lookup-table-tolerance in combination with '
+                         '--opt'),
+                        (['--lookup-table-tolerance', '1e-6'],
+                         'Can only use --lookup-table-interpolation and --lookup-table-tolerance in combination with '
+                         '--opt'),
+                        (['--opt', '--lookup-table-tolerance', '0'], '--lookup-table-tolerance needs to be positive!'),
+                        (['--lazy-lookup-tables'], 'Can only use --lazy-lookup-tables in combination with --opt'),
+                        (['--lookup-table-2d'], 'Can only use --lookup-table-2d in combination with --opt')):
+        caplog.clear()
+        testargs = ['chaste_codegen', model_file] + args
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        assert 'ERROR' in caplog.text
+        assert error in caplog.text
+
+
 def test_script_lookup_table_no_opt(caplog):
     """Convert a model with custom lookup table"""
     LOGGER.info('Testing custom lookup tables,  for command line script\n')
@@ -918,3 +1098,164 @@ def test_script_RL_C_double_type(caplog):
     assert 'ERROR' in caplog.text
     assert "--rush-larsen-labview and --rush-larsen-c cannot be used in combination with other model convertion types" \
         in caplog.text
+
+
+def test_script_batch(caplog, tmp_path):
+    """Convert a list of models in batch mode, continuing past models that fail"""
+    caplog.set_level(logging.INFO, logger='chaste_codegen')
+    LOGGER.info('Testing --batch with a list of models\n')
+    tmp_path = str(tmp_path)
+    model_names = ['test_V_not_state_derived_quant', 'test_V_not_state_mparam', 'test_wrong_units_voltage']
+    manifest = os.path.join(tmp_path, 'models.txt')
+    with open(manifest, 'w') as f:
+        f.write('# models to convert\n\n')
+        for model_name in model_names:
+            f.write(os.path.join(TESTS_FOLDER, model_name + '.cellml') + '\n')
+
+    testargs = ['chaste_codegen', manifest, '--batch', '--jobs', '2', '--output-dir', tmp_path]
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+
+    assert 'Converted 2 of 3 models' in caplog.text
+    assert '1 of 3 models failed to convert' in caplog.text
+    assert 'units of membrane_voltage need to be dimensionally equivalent to Volt' in caplog.text
+
+    reference = os.path.join(TESTS_FOLDER, 'chaste_reference_models', 'Normal')
+    for model_name in model_names[:2]:
+        for ext in ('.hpp', '.cpp'):
+            compare_file_against_reference(os.path.join(reference, model_name + ext),
+                                           os.path.join(tmp_path, model_name + ext))
+    assert not os.path.exists(os.path.join(tmp_path, 'test_wrong_units_voltage.cpp'))
+
+
+def test_script_batch_show_outputs(capsys):
+    """Show outputs for all models in a folder in batch mode"""
+    LOGGER.info('Testing --batch with a folder and --show-outputs\n')
+    testargs = ['chaste_codegen', TESTS_FOLDER, '--batch', '--cvode', '--show-outputs', '--output-dir', '/cellml']
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+        output = str(capsys.readouterr().out).replace("\\", "/")
+    assert "/cellml/test_V_not_state_mparamCvode.hpp" in output
+    assert "/cellml/test_piecewises_beCvode.cpp" in output
+
+
+def test_script_batch_wrong_args(caplog):
+    """Check error messages for options that can't be used in batch mode"""
+    LOGGER.info('Testing --batch with invalid options\n')
+    for testargs, error in ((['chaste_codegen', 'bla', '--batch'], 'Could not find batch folder or file bla'),
+                            (['chaste_codegen', TESTS_FOLDER, '--batch', '-o', 'bla.cpp'],
+                             '-o cannot be used with --batch!'),
+                            (['chaste_codegen', TESTS_FOLDER, '--batch', '-c', 'bla'],
+                             '-c cannot be used with --batch!'),
+                            (['chaste_codegen', TESTS_FOLDER, '--batch', '--jobs', '0'],
+                             '--jobs needs to be at least 1!'),
+                            (['chaste_codegen', TESTS_FOLDER, '--batch', '--timings', 'timings.json'],
+                             '--timings and --profile cannot be used with --batch!'),
+                            (['chaste_codegen', os.path.join(TESTS_FOLDER, 'chaste_reference_models'), '--batch'],
+                             'No cellml files found in')):
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        assert error in caplog.text
+
+
+def test_script_incremental(caplog, tmp_path):
+    """Check code is only regenerated and files only written when needed with --incremental"""
+    caplog.set_level(logging.INFO, logger='chaste_codegen')
+    LOGGER.info('Testing --incremental\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(tmp_path, 'test_V_not_state_mparam.cellml')
+    shutil.copyfile(os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml'), model_file)
+    cpp_file = os.path.join(tmp_path, 'test_V_not_state_mparam.cpp')
+    testargs = ['chaste_codegen', model_file, '--incremental', '--no-cache']
+
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+    assert os.path.isfile(os.path.join(tmp_path, 'test_V_not_state_mparam.manifest.json'))
+    os.utime(cpp_file, (0, 0))
+
+    # Nothing changed, the model isn't even loaded
+    caplog.clear()
+    with mock.patch.object(sys, 'argv', testargs):
+        with mock.patch('chaste_codegen._command_line_script.load_cellml_model') as load_model:
+            chaste_codegen()
+            load_model.assert_not_called()
+    assert 'test_V_not_state_mparam is up to date' in caplog.text
+
+    # Options that don't change the generated code don't regenerate it either
+    for options in (['--translator-jobs', '2'], ['--timings', os.path.join(tmp_path, 'timings.json')],
+                    ['--profile', os.path.join(tmp_path, 'profile')]):
+        caplog.clear()
+        with mock.patch.object(sys, 'argv', testargs + options):
+            chaste_codegen()
+        assert 'test_V_not_state_mparam is up to date' in caplog.text
+
+    # Changed options regenerate the code, but files with unchanged content are not written
+    with mock.patch.object(sys, 'argv', testargs + ['--skip-singularity-fixes']):
+        chaste_codegen()
+    assert os.path.getmtime(cpp_file) == 0
+
+    # Changed outputs are regenerated
+    with open(cpp_file, 'a') as f:
+        f.write('// edited\n')
+    with mock.patch.object(sys, 'argv', testargs + ['--skip-singularity-fixes']):
+        chaste_codegen()
+    assert os.path.getmtime(cpp_file) != 0
+    reference = os.path.join(TESTS_FOLDER, 'chaste_reference_models', 'Normal')
+    compare_file_against_reference(os.path.join(reference, 'test_V_not_state_mparam.cpp'), cpp_file)
+
+
+def test_script_use_caches(tmp_path):
+    """Check compiled templates and the ontology index are stored next to the model cache given with --cache-dir, and
+    not with --no-cache"""
+    import chaste_codegen._load_template as load_template
+    import chaste_codegen._rdf as rdf
+    tmp_path = str(tmp_path)
+    previous = load_template._template_cache_dir
+    with use_caches(os.path.join(tmp_path, 'models'), False):
+        assert rdf._ontology_index_dir == os.path.join(tmp_path, 'ontology')
+        assert load_template._template_cache_dir == os.path.join(tmp_path, 'templates')
+        with use_caches(os.path.join(tmp_path, 'models'), True):
+            assert rdf._ontology_index_dir is None
+            assert load_template._template_cache_dir is None
+        assert rdf._ontology_index_dir == os.path.join(tmp_path, 'ontology')
+        assert load_template._template_cache_dir == os.path.join(tmp_path, 'templates')
+    assert load_template._template_cache_dir == previous
+
+    # --no-cache only applies to the conversion it is given for
+    model_file = os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml')
+    with mock.patch.object(sys, 'argv', ['chaste_codegen', model_file, '--no-cache', '--output-dir', tmp_path]):
+        chaste_codegen()
+    assert load_template._template_cache_dir == previous
+
+
+def test_script_translator_jobs(tmp_path):
+    """Generate code for several model types in parallel, which should give the same code as generating in turn"""
+    LOGGER.info('Testing --translator-jobs\n')
+    tmp_path = str(tmp_path)
+    model_file = os.path.join(TESTS_FOLDER, 'test_piecewises_be.cellml')
+    for output_dir, jobs in (('sequential', '1'), ('parallel', '3')):
+        testargs = ['chaste_codegen', model_file, '--normal', '--cvode', '--cvode-data-clamp', '--backward-euler',
+                    '--translator-jobs', jobs, '--output-dir', os.path.join(tmp_path, output_dir)]
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+
+    generated_files = sorted(os.listdir(os.path.join(tmp_path, 'sequential')))
+    assert len(generated_files) == 8
+    assert sorted(os.listdir(os.path.join(tmp_path, 'parallel'))) == generated_files
+    for file in generated_files:
+        compare_file_against_reference(os.path.join(tmp_path, 'sequential', file),
+                                       os.path.join(tmp_path, 'parallel', file))
+
+
+def test_script_translator_jobs_wrong_args(caplog):
+    """Check error messages for invalid --translator-jobs"""
+    LOGGER.info('Testing --translator-jobs with invalid options\n')
+    model_file = os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml')
+    for testargs, error in ((['chaste_codegen', model_file, '--translator-jobs', '0'],
+                             '--translator-jobs needs to be at least 1!'),
+                            (['chaste_codegen', TESTS_FOLDER, '--batch', '--translator-jobs', '2'],
+                             '--translator-jobs cannot be used with --batch, use --jobs instead!')):
+        caplog.clear()
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        assert error in caplog.text
@@ -0,0 +1,66 @@
+import pytest
+import sympy as sp
+
+import chaste_codegen._cse
+from chaste_codegen._cse import cse, cse_engine
+
+
+x, y, z = sp.symbols('x y z')
+
+
+def unfold(replacements, reduced):
+    for symbol, expr in reversed(replacements):
+        reduced = [e.xreplace({symbol: expr}) for e in reduced]
+    return reduced
+
+
+def test_cse():
+    exprs = [sp.exp(x + y) * z + sp.sin(x + y), sp.exp(x + y) / z, x * y * z, sp.cos(x * y) + x * y]
+    with cse_engine('hash'):
+        replacements, reduced = cse(exprs)
+    x0, x1, x2 = sp.symbols('x0 x1 x2')
+    # only repeated subexpressions are extracted, subexpressions of extracted subexpressions come first.
+    # x * y isn't a subexpression of x * y * z
+    assert replacements == [(x0, x + y), (x1, sp.exp(x0)), (x2, x * y)]
+    assert reduced == [x1 * z + sp.sin(x0), x1 / z, x * y * z, sp.cos(x2) + x2]
+    assert unfold(replacements, reduced) == exprs
+
+    # without extracting the cheap sums and products
+    with cse_engine('hash'):
+        replacements, reduced = cse(exprs, min_cost=2)
+    assert replacements == [(x0, sp.exp(x + y))]
+    assert unfold(replacements, reduced) == exprs
+
+    # derivatives are printed as variables and not extracted
+    derivative = sp.Derivative(sp.Function('f')(x), x)
+    with cse_engine('hash'):
+        assert cse([derivative * 2, derivative + 1]) == ([], [derivative * 2, derivative + 1])
+
+
+def test_cse_matrix_and_expression():
+    matrix = sp.Matrix([[sp.exp(x + y), 0], [0, 2 * sp.exp(x + y)]])
+    with cse_engine('hash'):
+        replacements, reduced = cse(matrix, symbols=sp.numbered_symbols('v'))
+        assert replacements == [(sp.Symbol('v0'), sp.exp(x + y))]
+        assert reduced == [sp.Matrix([[sp.Symbol('v0'), 0], [0, 2 * sp.Symbol('v0')]])]
+
+        replacements, reduced = cse(sp.Piecewise((sp.exp(x + y), x > 0), (2 * sp.exp(x + y), True)))
+        assert unfold(replacements, reduced) == [sp.Piecewise((sp.exp(x + y), x > 0), (2 * sp.exp(x + y), True))]
+        assert len(replacements) == 1
+
+
+def test_cse_engine():
+    exprs = [x * y * z, sp.cos(x * y) + x * y]
+    # sympy's cse is used by default
+    assert chaste_codegen._cse._engine == 'sympy'
+    assert cse(exprs, order='none') == sp.cse(exprs, order='none')
+    with cse_engine('hash'):
+        assert cse(exprs) != sp.cse(exprs)
+        with cse_engine('sympy'):
+            assert cse(exprs) == sp.cse(exprs)
+        assert chaste_codegen._cse._engine == 'hash'
+    assert chaste_codegen._cse._engine == 'sympy'
+
+    with pytest.raises(AssertionError, match='Expecting engine to be one of'):
+        with cse_engine('other'):
+            pass
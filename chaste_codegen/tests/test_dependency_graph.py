@@ -0,0 +1,72 @@
+import os
+
+import pytest
+import sympy as sp
+
+from chaste_codegen._dependency_graph import Bitset, DependencyGraph, get_dependency_graph
+from chaste_codegen.tests.conftest import TESTS_FOLDER, cache_model
+
+
+@pytest.fixture(scope='session')
+def lr_model():
+    return cache_model(os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml'))
+
+
+def get_equations_by_fixed_point(model, equations, variables):
+    """ Find the equations needed for variables the way the analysis used to, by repeatedly filtering equations"""
+    variables = set(variables)
+    num_variables, eqs = -1, set()
+    while num_variables < len(variables):
+        num_variables = len(variables)
+        eqs = set(filter(lambda eq: eq.lhs in variables, equations))
+        variables.update(model.find_variables_and_derivatives([eq.rhs for eq in eqs]))
+    return eqs
+
+
+def test_equations_for(lr_model):
+    equations = lr_model.derivative_equations
+    graph = get_dependency_graph(lr_model, equations)
+    assert graph is get_dependency_graph(lr_model, list(equations))
+
+    voltage_derivs = [d for d in lr_model.y_derivatives if d.args[0] == lr_model.membrane_voltage_var]
+    other_derivs = [d for d in lr_model.y_derivatives if d.args[0] != lr_model.membrane_voltage_var]
+    for derivs in (voltage_derivs, other_derivs, lr_model.y_derivatives, other_derivs[:1], []):
+        assert graph.equations_for(derivs) == get_equations_by_fixed_point(lr_model, equations, derivs)
+
+    # every equation comes after the equations it depends on in the topological order
+    position = {i: p for p, i in enumerate(graph.topological_order)}
+    for i, dependants in enumerate(graph.dependants):
+        assert all(position[i] < position[j] for j in dependants)
+
+    eq = equations[-1]
+    assert graph.free_symbols([eq]) == eq.rhs.free_symbols
+
+
+def test_cyclic_dependencies():
+    x, y = sp.symbols('x y')
+    graph = DependencyGraph([sp.Eq(x, y + 1), sp.Eq(y, 2)], lambda exprs: set().union(*(e.free_symbols for e in exprs)))
+    assert graph.topological_order == [1, 0]
+    assert graph.equations_for([x]) == {sp.Eq(x, y + 1), sp.Eq(y, 2)}
+    assert graph.equations_for([y]) == {sp.Eq(y, 2)}
+
+    with pytest.raises(AssertionError, match='Expecting equations without cyclic dependencies'):
+        DependencyGraph([sp.Eq(x, y + 1), sp.Eq(y, x)], lambda exprs: set().union(*(e.free_symbols for e in exprs)))
+
+
+def test_dependants_masks():
+    x, y, z, w = sp.symbols('x y z w')
+    graph = DependencyGraph([sp.Eq(x, y + z), sp.Eq(y, z), sp.Eq(z, 2), sp.Eq(w, z)],
+                            lambda exprs: set().union(*(e.free_symbols for e in exprs)))
+    # bit 0 for everything used for x, bit 1 for everything used for w
+    assert graph.dependants_masks([0b01, 0, 0, 0b10]) == [0b01, 0b01, 0b11, 0b10]
+    assert graph.dependants_masks([0, 0, 0, 0]) == [0, 0, 0, 0]
+
+    with pytest.raises(AssertionError, match='Expecting a bitset for each equation'):
+        graph.dependants_masks([0])
+
+
+def test_bitset():
+    bitset = Bitset(0b101)
+    assert [bitset[i] for i in range(4)] == [True, False, True, False]
+    assert bitset == 5
+    assert not Bitset(0)[0]
@@ -3,10 +3,16 @@ import os
 import pytest
 import sympy as sp
 
+from chaste_codegen import subs_math_func_placeholders
 from chaste_codegen._chaste_printer import ChastePrinter
-from chaste_codegen._jacobian import format_jacobian, get_jacobian
+from chaste_codegen._jacobian import (
+    format_jacobian,
+    get_jacobian,
+    get_jacobian_chain_rule,
+    get_jacobian_diagonal,
+)
 from chaste_codegen._partial_eval import partial_eval
-from chaste_codegen.tests.conftest import TESTS_FOLDER
+from chaste_codegen.tests.conftest import TESTS_FOLDER, cache_model
 
 
 @pytest.fixture(scope='session')
@@ -49,6 +55,73 @@ def test_get_jacobian(jacobian):
     assert str(jacobian_matrix) == expected or str(jacobian_matrix) == expected_python36
 
 
+def test_get_jacobian_matches_dense(state_vars, derivatives_eqs):
+    lhs_to_keep = [eq.lhs for eq in derivatives_eqs if len(eq.lhs.args) > 0 and eq.lhs.args[0] in state_vars]
+    derivatives_eqs = partial_eval(derivatives_eqs, lhs_to_keep, keep_multiple_usages=False)
+    jacobian_equations, jacobian_matrix = get_jacobian(state_vars, derivatives_eqs)
+
+    dense = sp.Matrix([eq.rhs for eq in derivatives_eqs]).jacobian(sp.Matrix(state_vars))
+    assert (jacobian_matrix.xreplace(dict(reversed(jacobian_equations))) - dense).is_zero_matrix
+
+
+def test_get_jacobian_diagonal(state_vars, derivatives_eqs, jacobian):
+    lhs_to_keep = [eq.lhs for eq in derivatives_eqs if len(eq.lhs.args) > 0 and eq.lhs.args[0] in state_vars]
+    derivatives_eqs = partial_eval(derivatives_eqs, lhs_to_keep, keep_multiple_usages=False)
+    jacobian_equations, jacobian_matrix = get_jacobian_diagonal(state_vars, derivatives_eqs)
+
+    def substitute_common_terms(expr, equations):
+        for lhs, rhs in reversed(equations):
+            expr = expr.xreplace({lhs: rhs})
+        return expr
+
+    assert jacobian_matrix.shape == jacobian[1].shape
+    assert jacobian_matrix.is_diagonal()
+    assert len(jacobian_equations) < len(jacobian[0])
+    for i in range(len(state_vars)):
+        assert substitute_common_terms(jacobian_matrix[i, i], jacobian_equations) == \
+            substitute_common_terms(jacobian[1][i, i], jacobian[0])
+
+
+@pytest.mark.parametrize(('model_name', 'keeps_intermediate_variables'), [
+    ('test_luo_rudy_1991_with_range_cap_dimensionless', True),
+    # the derivative doesn't depend on the state var
+    ('test_V_not_state_mparam', False),
+])
+def test_get_jacobian_chain_rule(model_name, keeps_intermediate_variables):
+    model = cache_model(os.path.join(TESTS_FOLDER, model_name + '.cellml'))
+    state_vars = model.get_state_variables()
+    derivatives_eqs = model.get_equations_for(model.get_derivatives())
+    lhs_to_keep = [eq.lhs for eq in derivatives_eqs if len(eq.lhs.args) > 0 and eq.lhs.args[0] in state_vars]
+    jacobian = get_jacobian(state_vars, partial_eval(derivatives_eqs, lhs_to_keep, keep_multiple_usages=False))
+    jacobian_equations, jacobian_matrix = get_jacobian_chain_rule(state_vars, derivatives_eqs)
+    # the intermediate variables used are kept in the common expressions
+    assert any(eq[0] in model.variables() for eq in jacobian_equations) == keeps_intermediate_variables
+
+    def evaluate(jacobian_equations, jacobian_matrix):
+        for lhs, rhs in reversed(jacobian_equations):
+            jacobian_matrix = jacobian_matrix.xreplace({lhs: rhs})
+        values = {state_var: 0.5 for state_var in state_vars}
+        values[model.membrane_voltage_var] = -80.0
+        return subs_math_func_placeholders(jacobian_matrix).xreplace(values).evalf()
+
+    expected = evaluate(*jacobian)
+    assert expected.free_symbols == set()
+    actual = evaluate(jacobian_equations, jacobian_matrix)
+    for expected_entry, entry in zip(expected, actual):
+        assert abs(entry - expected_entry) <= 1e-8 * max(1, abs(expected_entry))
+
+    jacobian_equations, jacobian_matrix = get_jacobian_chain_rule(state_vars, derivatives_eqs, diagonal=True)
+    assert jacobian_matrix.is_diagonal()
+    actual = evaluate(jacobian_equations, jacobian_matrix)
+    for i in range(len(state_vars)):
+        assert abs(actual[i, i] - expected[i, i]) <= 1e-8 * max(1, abs(expected[i, i]))
+
+    assert get_jacobian_chain_rule([], derivatives_eqs) == ([], sp.Matrix([]))
+    with pytest.raises(AssertionError, match='Expecting derivative equations to define the derivatives of all state '
+                                             'vars'):
+        get_jacobian_chain_rule(state_vars, derivatives_eqs[:1])
+
+
 def test_format_wrong_params1():
     with pytest.raises(AssertionError, match='Expecting list of equation tuples'):
         format_jacobian([1, 2], [], ChastePrinter(), None)
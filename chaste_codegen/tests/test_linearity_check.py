@@ -1,9 +1,16 @@
 import os
 
 import pytest
+import sympy as sp
+from cellmlmanip.model import Variable
 from cellmlmanip.printer import Printer
 
-from chaste_codegen._linearity_check import KINDS, get_non_linear_state_vars, subst_deriv_eqs_non_linear_vars
+from chaste_codegen._linearity_check import (
+    KINDS,
+    get_linear_coefficients,
+    get_non_linear_state_vars,
+    subst_deriv_eqs_non_linear_vars,
+)
 from chaste_codegen._rdf import OXMETA
 from chaste_codegen.tests.conftest import TESTS_FOLDER
 
@@ -54,6 +61,27 @@ def test_get_non_linear_state_vars(non_linear_state_vars):
     assert str(non_linear_state_vars) == expected, str(non_linear_state_vars)
 
 
+def test_get_non_linear_state_vars_shared_sub_expressions():
+    V, x, y, z, w, time = (Variable(name, 'dimensionless') for name in ('V', 'x', 'y', 'z', 'w', 'time'))
+    rate = sp.log(V + 2) * sp.Piecewise((V, V > 0), (2 * V, True))  # used by several derivatives
+    derivative_equations = [sp.Eq(sp.Derivative(x, time), rate * (1 - x)),
+                            sp.Eq(sp.Derivative(y, time), rate * x * y),
+                            sp.Eq(sp.Derivative(z, time), sp.Piecewise((z, V > 0), (rate * z / V, True))),
+                            sp.Eq(sp.Derivative(w, time), sp.Piecewise((w, w > 0), (2 * w, True))),
+                            sp.Eq(sp.Derivative(V, time), rate * x * y * V)]
+    assert get_non_linear_state_vars(derivative_equations, V, [V, x, y, z, w]) == {y, w}
+
+
+def test_get_linear_coefficients():
+    x, a, b, V = sp.symbols('x a b V')
+    g, h = sp.Wild('g', exclude=[x]), sp.Wild('h', exclude=[x])
+    for expr in (a * (1 - x) - b * x, (a - x) / b, sp.exp(V) * x + sp.exp(2 * V) * x + V, (a + b) ** 2 * (x - 1) / V,
+                 2.5 * x + 1, -x, x, sp.Integer(3), a * x ** 2 + x, x * sp.exp(x), 1 / (x + 1)):
+        match = expr.expand().match(g + h * x)
+        assert get_linear_coefficients(expr, x) == ((match[g], match[h]) if match is not None else None)
+    assert get_linear_coefficients(a * (1 - x) - b * x, x) == (a, -a - b)
+
+
 def test_wrong_params_subst_deriv_eqs3():
     with pytest.raises(AssertionError, match="membrane_voltage_var should be a cellmlmanip.Variable"):
         subst_deriv_eqs_non_linear_vars([1], [1, 2], None, [1, 2], None)
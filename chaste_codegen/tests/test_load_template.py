@@ -2,11 +2,14 @@
 # Tests templating functionality
 #
 import logging
+import os
 
 import jinja2
 import pytest
 
 import chaste_codegen as cg
+import chaste_codegen._load_template
+from chaste_codegen._load_template import set_template_cache_dir, template_cache_dir
 
 
 # Show more logging output
@@ -27,3 +30,30 @@ def test_missing_variable_raises_exception():
     template = cg.load_template('hello.txt')
     with pytest.raises(jinja2.UndefinedError):
         template.render()
+
+
+def test_template_cache(tmp_path):
+    # Compiled templates are stored in the template cache and re-used
+    cache_dir = os.path.join(str(tmp_path), 'templates')
+    previous = chaste_codegen._load_template._template_cache_dir
+    with template_cache_dir(cache_dir):
+        assert cg.load_template('hello.txt').render(name='Michael') == 'Hello Michael!\n'
+        cached_files = os.listdir(cache_dir)
+        assert len(cached_files) == 1
+    assert chaste_codegen._load_template._template_cache_dir == previous
+
+    with template_cache_dir(cache_dir):
+        assert cg.load_template('hello.txt').render(name='Michael') == 'Hello Michael!\n'
+        assert os.listdir(cache_dir) == cached_files
+
+    # Templates can still be loaded if the cache can't be created
+    not_a_folder = os.path.join(str(tmp_path), 'file.txt')
+    open(not_a_folder, 'w').close()
+    with template_cache_dir(os.path.join(not_a_folder, 'templates')):
+        assert cg.load_template('hello.txt').render(name='Michael') == 'Hello Michael!\n'
+
+    try:
+        set_template_cache_dir(None)
+        assert cg.load_template('hello.txt').render(name='Michael') == 'Hello Michael!\n'
+    finally:
+        set_template_cache_dir(previous)
@@ -1,9 +1,18 @@
 import os
 
 import pytest
+from cellmlmanip.model import Quantity, Variable
+from sympy import Symbol, preorder_traversal
 
+from chaste_codegen import load_model_with_conversions
 from chaste_codegen._chaste_printer import ChastePrinter
-from chaste_codegen._lookup_tables import _EXPENSIVE_FUNCTIONS, DEFAULT_LOOKUP_PARAMETERS, LookupTables
+from chaste_codegen._lookup_tables import (
+    _EXPENSIVE_FUNCTIONS,
+    DEFAULT_LOOKUP_PARAMETERS,
+    LookupTables,
+    _annotate,
+    interpolate,
+)
 from chaste_codegen.tests.conftest import TESTS_FOLDER
 
 
@@ -29,7 +38,8 @@ def test_no_method_printed_for(s_model):
 
     assert len(params_for_printing) == 1
     assert sorted(params_for_printing[0].keys()) == \
-        ['lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag', 'table_used_in_methods', 'var']
+        ['interpolation', 'lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
+         'table_used_in_methods', 'var']
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['mTableMins'] == -250.0
@@ -57,7 +67,8 @@ def test_method_printed_for(s_model):
 
     assert len(params_for_printing) == 1
     assert sorted(params_for_printing[0].keys()) == \
-        ['lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag', 'table_used_in_methods', 'var']
+        ['interpolation', 'lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
+         'table_used_in_methods', 'var']
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['mTableMins'] == -250.0
@@ -86,7 +97,8 @@ def test_nested_method_printed_for(s_model):
 
     assert len(params_for_printing) == 1
     assert sorted(params_for_printing[0].keys()) == \
-        ['lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag', 'table_used_in_methods', 'var']
+        ['interpolation', 'lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
+         'table_used_in_methods', 'var']
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['mTableMins'] == -250.0
@@ -116,7 +128,8 @@ def test_multiple_methods_printed_for(s_model):
 
     assert len(params_for_printing) == 1
     assert sorted(params_for_printing[0].keys()) == \
-        ['lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag', 'table_used_in_methods', 'var']
+        ['interpolation', 'lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
+         'table_used_in_methods', 'var']
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['mTableMins'] == -250.0
@@ -148,7 +161,7 @@ def test_change_lookup_table(be_model):
 
     assert len(params_for_printing) == 2
     assert all([sorted(p.keys()) ==
-                ['lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
+                ['interpolation', 'lookup_epxrs', 'mTableMaxs', 'mTableMins', 'mTableSteps', 'metadata_tag',
                  'table_used_in_methods', 'var'] for p in params_for_printing])
     assert params_for_printing[0]['metadata_tag'] == 'membrane_voltage'
     assert params_for_printing[0]['mTableMins'] == -25.0001
@@ -191,3 +204,107 @@ def test_no_calc_after_print(s_model):
 
     with pytest.raises(ValueError, match="Cannot calculate lookup tables after printing has started"):
         lut.calc_lookup_tables(s_model.equations)
+
+
+def test_interpolate():
+    # linear interpolation is exact for linear functions, cubic (Catmull-Rom) interpolation for quadratic ones
+    def linear(i):
+        return 3.0 * i - 2.0
+
+    def quadratic(i):
+        return 2.0 * i * i - i + 1.0
+
+    for factor in (0.0, 0.3, 0.5, 1.0):
+        assert interpolate(linear, 5, factor) == pytest.approx(linear(5 + factor))
+        assert interpolate(linear, 5, factor, 'cubic') == pytest.approx(linear(5 + factor))
+        assert interpolate(quadratic, 5, factor, 'cubic') == pytest.approx(quadratic(5 + factor))
+    assert interpolate(quadratic, 5, 0.5) != pytest.approx(quadratic(5.5))
+
+
+def test_wrong_interpolation():
+    with pytest.raises(AssertionError, match='Expecting interpolation to be one of'):
+        LookupTables(None, interpolation='quadratic')
+    with pytest.raises(AssertionError, match='Expecting tolerance to be positive'):
+        LookupTables(None, tolerance=-1.0)
+
+
+def test_select_step():
+    model = load_model_with_conversions(os.path.join(TESTS_FOLDER,
+                                                     'test_luo_rudy_1991_with_range_cap_dimensionless.cellml'))
+    steps = {}
+    for interpolation, tolerance in (('linear', None), ('linear', 1e-4), ('cubic', 1e-4), ('cubic', 1e-8)):
+        lut = LookupTables(model, lookup_params=[['membrane_voltage', -100.0, 50.0, 0.001]],
+                           interpolation=interpolation, tolerance=tolerance)
+        lut.calc_lookup_tables(model.equations)
+        params = lut.print_lookup_parameters(ChastePrinter(lookup_table_function=lut.print_lut_expr))
+        assert params[0]['interpolation'] == interpolation
+        steps[(interpolation, tolerance)] = params[0]['mTableSteps']
+    assert steps[('linear', None)] == 0.001
+    assert steps[('linear', 1e-4)] > 0.001
+    assert steps[('cubic', 1e-4)] > steps[('linear', 1e-4)]
+    assert steps[('cubic', 1e-4)] > steps[('cubic', 1e-8)]
+
+
+def test_annotate():
+    model = load_model_with_conversions(os.path.join(TESTS_FOLDER,
+                                                     'test_luo_rudy_1991_with_range_cap_dimensionless.cellml'))
+    annotations = {}
+    for eq in model.equations:
+        for expr in preorder_traversal(eq.rhs):
+            used_vars = set(filter(lambda v: not isinstance(v, Quantity), expr.atoms(Variable, Symbol)))
+            assert _annotate(expr, annotations) == (expr.has(*_EXPENSIVE_FUNCTIONS), used_vars)
+
+    # annotations are shared by the lookup tables for the same model
+    lut = LookupTables(model)
+    lut.calc_lookup_tables(model.equations)
+    assert LookupTables(model)._annotations is lut._annotations
+    assert all(eq.rhs in lut._annotations for eq in model.equations)
+
+
+def test_two_dimensional(caplog):
+    model = load_model_with_conversions(os.path.join(TESTS_FOLDER,
+                                                     'test_luo_rudy_1991_calcium_dependent_inactivation.cellml'))
+    lookup_params = [['membrane_voltage', -100.0, 50.0, 0.01], ['cytosolic_calcium_concentration', 0.0, 0.01, 0.0001]]
+    for two_dimensional in (False, True):
+        caplog.clear()
+        lut = LookupTables(model, lookup_params=lookup_params, two_dimensional=two_dimensional)
+        lut.calc_lookup_tables(model.equations)
+        printer = ChastePrinter(lookup_table_function=lut.print_lut_expr)
+        output = ''
+        for eq in model.equations:
+            with lut.method_being_printed('template_method'):
+                output += printer.doprint(eq.rhs)
+        params_2d = lut.print_lookup_parameters_2d(printer)
+        params = lut.print_lookup_parameters(printer)
+        assert [p['metadata_tag'] for p in params] == ['membrane_voltage', 'cytosolic_calcium_concentration']
+
+        if not two_dimensional:
+            assert params_2d == []
+            assert '_lt_2d_0_row' not in output
+            assert ('1 expressions depend on both membrane_voltage and cytosolic_calcium_concentration, a 2-D lookup '
+                    'table would save 1 expensive function calls per evaluation') in caplog.text
+        else:
+            assert '_lt_2d_0_row[0]' in output
+            assert len(params_2d) == 1
+            assert params_2d[0]['metadata_tags'] == ('membrane_voltage', 'cytosolic_calcium_concentration')
+            assert params_2d[0]['vars'] == ('membrane$V', 'intracellular_calcium_concentration$Cai')
+            assert params_2d[0]['mTableMins'] == (-100.0, 0.0)
+            assert params_2d[0]['mTableMaxs'] == (50.0, 0.01)
+            # the table would have 15002 x 102 entries, so the voltage step is increased
+            assert params_2d[0]['mTableSteps'] == (0.02, 0.0001)
+            assert params_2d[0]['mTableSizes'] == (7502, 102)
+            assert params_2d[0]['key_indices'] == (0, 1)
+            assert params_2d[0]['new_keys'] == []
+            assert params_2d[0]['table_used_in_methods'] == {'template_method'}
+            assert params_2d[0]['lookup_epxrs'] == \
+                [['1.0 / (1.0 + exp((-0.0006 * exp(membrane$V / 50.0) + intracellular_calcium_concentration$Cai) / '
+                  '0.0001))', False]]
+
+    # Without the equation using log(Cai) there is no 1-D calcium table, so the 2-D table adds it as a keying variable
+    lut = LookupTables(model, lookup_params=lookup_params, two_dimensional=True)
+    lut.calc_lookup_tables([eq for eq in model.equations if not str(eq.lhs).endswith('$E_si')])
+    printer = ChastePrinter(lookup_table_function=lut.print_lut_expr)
+    params_2d = lut.print_lookup_parameters_2d(printer)
+    assert [p['metadata_tag'] for p in lut.print_lookup_parameters(printer)] == ['membrane_voltage']
+    assert params_2d[0]['key_indices'] == (0, 1)
+    assert [p['metadata_tag'] for p in params_2d[0]['new_keys']] == ['cytosolic_calcium_concentration']
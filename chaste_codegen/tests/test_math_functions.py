@@ -3,6 +3,9 @@
 #
 # import pytest
 import logging
+import os
+import subprocess
+import sys
 
 import pytest
 from sympy import (
@@ -26,6 +29,7 @@ from chaste_codegen import (
     sqrt_,
     subs_math_func_placeholders,
 )
+from chaste_codegen.tests.conftest import TESTS_FOLDER
 
 
 # Show more logging output
@@ -82,3 +86,25 @@ def test_substitute_math_func_(x, expr):
     expr2 = (expr * exp_(x) + abs_(1 - 2) + acos_(0) * sin_(pi / 2) * cos_(0)) / sqrt_(x)
     expr_placeholders_replaced = subs_math_func_placeholders(expr2)
     assert expr_placeholders_replaced == (expr * exp(x) + Abs(1 - 2) + acos(0) * sin(pi / 2) * cos(0)) / sqrt(x)
+
+
+MATHML_HANDLERS_SCRIPT = """
+import sys
+import cellmlmanip
+from chaste_codegen import exp_, model_with_conversions
+if sys.argv[1] == 'True':
+    model = model_with_conversions.load_model_with_conversions(sys.argv[2])
+else:
+    model = cellmlmanip.load_model(sys.argv[2])
+print(any(eq.rhs.has(exp_) for eq in model.equations))
+"""
+
+
+@pytest.mark.parametrize('with_conversions', [False, True])
+def test_mathml_handlers(with_conversions):
+    """ Models use our math functions once chaste_codegen.model_with_conversions has been imported, whether loaded
+    with load_model_with_conversions or with cellmlmanip.load_model """
+    model_file = os.path.join(TESTS_FOLDER, 'test_luo_rudy_1991_with_range_cap_dimensionless.cellml')
+    result = subprocess.run([sys.executable, '-c', MATHML_HANDLERS_SCRIPT, str(with_conversions), model_file],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'True'
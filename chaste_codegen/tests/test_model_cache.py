@@ -0,0 +1,187 @@
+import logging
+import os
+import sys
+from unittest import mock
+
+import pytest
+from cellmlmanip.units import UnitStore
+
+from chaste_codegen import LOGGER, load_model_with_conversions
+from chaste_codegen._command_line_script import chaste_codegen
+from chaste_codegen._linearity_check import get_non_linear_state_vars
+from chaste_codegen._model_cache import (
+    ModelCache,
+    can_pickle_models,
+    dump_analysis_result,
+    load_analysis_result,
+)
+from chaste_codegen.tests.conftest import TESTS_FOLDER, compare_file_against_reference
+
+
+MODEL_FILE = os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ModelCache(str(tmp_path / 'cache'))
+
+
+def _cache_files(cache):
+    return sorted(os.listdir(cache.cache_dir)) if os.path.isdir(cache.cache_dir) else []
+
+
+def test_get_key(cache, tmp_path):
+    LOGGER.info('Testing model cache keys\n')
+    key = cache.get_key(MODEL_FILE, use_modifiers=False)
+    assert key == cache.get_key(MODEL_FILE, use_modifiers=False)
+    assert key != cache.get_key(MODEL_FILE, use_modifiers=True)
+    assert key != cache.get_key(os.path.join(TESTS_FOLDER, 'test_V_not_state_derived_quant.cellml'),
+                                use_modifiers=False)
+    # The key depends on the content of the file, not its name
+    copy = str(tmp_path / 'copy.cellml')
+    with open(MODEL_FILE, 'rb') as f_in, open(copy, 'wb') as f_out:
+        f_out.write(f_in.read())
+    assert key == cache.get_key(copy, use_modifiers=False)
+
+
+def test_load_from_cache(cache):
+    LOGGER.info('Testing loading a converted model from the cache\n')
+    model = load_model_with_conversions(MODEL_FILE, cache=cache)
+    assert len(_cache_files(cache)) == 1
+
+    cached_model = load_model_with_conversions(MODEL_FILE, cache=cache)
+    assert cached_model is not model
+    assert len(_cache_files(cache)) == 1
+    assert str(cached_model.state_vars) == str(model.state_vars)
+    assert str(cached_model.y_derivatives) == str(model.y_derivatives)
+    assert str(cached_model.ionic_vars) == str(model.ionic_vars)
+    assert str(cached_model.stimulus_params) == str(model.stimulus_params)
+    assert [str(eq) for eq in cached_model.derivative_equations] == [str(eq) for eq in model.derivative_equations]
+    assert cached_model.membrane_voltage_var in set(cached_model.variables())
+    assert cached_model.units.format(cached_model.units.evaluate_units(cached_model.membrane_voltage_var)) == \
+        model.units.format(model.units.evaluate_units(model.membrane_voltage_var))
+    # variables of the cached model are distinct from those of the model converted earlier
+    assert cached_model.membrane_voltage_var != model.membrane_voltage_var
+
+
+def test_can_pickle_models(cache, monkeypatch):
+    LOGGER.info('Testing models are loaded without the cache if they can not be restored\n')
+    assert can_pickle_models()
+    # e.g. if a dependency no longer numbers unit stores the same way
+    can_pickle_models.cache_clear()
+    monkeypatch.delattr(UnitStore, '_next_id')
+    try:
+        assert not can_pickle_models()
+    finally:
+        monkeypatch.undo()
+        can_pickle_models.cache_clear()
+
+    with mock.patch('chaste_codegen._model_cache.can_pickle_models', return_value=False):
+        model = load_model_with_conversions(MODEL_FILE, cache=cache)
+        assert model.state_vars
+        assert _cache_files(cache) == []
+        cache.store('a', model)
+        assert _cache_files(cache) == []
+
+
+def test_cache_replays_log(cache, caplog):
+    LOGGER.info('Testing messages are repeated when loading a model from the cache\n')
+    model_file = os.path.join(TESTS_FOLDER, 'test_V_not_state_derived_quant.cellml')
+    caplog.set_level(logging.INFO, logger='chaste_codegen')
+    caplog.clear()
+    load_model_with_conversions(model_file, cache=cache)
+    messages = [r.getMessage() for r in caplog.records if r.name == 'chaste_codegen']
+    assert messages
+    caplog.clear()
+    load_model_with_conversions(model_file, cache=cache)
+    assert [r.getMessage() for r in caplog.records if r.name == 'chaste_codegen'] == messages
+
+
+def test_corrupt_cache_entry(cache, caplog):
+    LOGGER.info('Testing unreadable cache entries are ignored\n')
+    load_model_with_conversions(MODEL_FILE, cache=cache)
+    cache_file = os.path.join(cache.cache_dir, _cache_files(cache)[0])
+    with open(cache_file, 'wb') as f:
+        f.write(b'not a model')
+    model = load_model_with_conversions(MODEL_FILE, cache=cache)
+    assert model.state_vars
+    assert 'Ignoring unreadable cached model' in caplog.text
+    # The entry has been replaced
+    assert cache.load(cache.get_key(MODEL_FILE, use_modifiers=False, quiet=False, skip_singularity_fixes=False,
+                                    skip_conversions=False)) is not None
+
+
+def test_cache_eviction(cache):
+    LOGGER.info('Testing least recently used models are removed from a full cache\n')
+    model = load_model_with_conversions(MODEL_FILE)
+    cache.store('a', model)
+    size = os.path.getsize(os.path.join(cache.cache_dir, 'a.pickle'))
+    cache.max_size = 2 * size
+    os.utime(os.path.join(cache.cache_dir, 'a.pickle'), (0, 0))
+    cache.store('b', model)
+    assert _cache_files(cache) == ['a.pickle', 'b.pickle']
+    assert cache.load('a') is not None  # a is now the most recently used
+    cache.store('c', model)
+    assert _cache_files(cache) == ['a.pickle', 'c.pickle']
+    assert cache.load('b') is None
+
+
+def test_script_cache(tmp_path):
+    LOGGER.info('Testing --cache-dir and --no-cache\n')
+    tmp_path = str(tmp_path)
+    cache_dir = os.path.join(tmp_path, 'cache')
+    reference = os.path.join(TESTS_FOLDER, 'chaste_reference_models', 'Normal')
+    for run in range(2):  # first run fills the cache, second run uses it
+        testargs = ['chaste_codegen', MODEL_FILE, '--output-dir', tmp_path, '--cache-dir', cache_dir]
+        with mock.patch.object(sys, 'argv', testargs):
+            chaste_codegen()
+        assert len(os.listdir(cache_dir)) == 1
+        for ext in ('.hpp', '.cpp'):
+            compare_file_against_reference(os.path.join(reference, 'test_V_not_state_mparam' + ext),
+                                           os.path.join(tmp_path, 'test_V_not_state_mparam' + ext))
+
+    no_cache_dir = os.path.join(tmp_path, 'no_cache')
+    testargs = ['chaste_codegen', MODEL_FILE, '--output-dir', tmp_path, '--cache-dir', no_cache_dir, '--no-cache']
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+    assert not os.path.exists(no_cache_dir)
+
+
+def test_analysis_result(cache):
+    LOGGER.info('Testing pickling analysis results\n')
+    model = load_model_with_conversions(MODEL_FILE, cache=cache)
+    result = ([model.membrane_voltage_var], {eq.lhs: eq.rhs for eq in model.derivative_equations})
+    cached_model = load_model_with_conversions(MODEL_FILE, cache=cache)
+    assert cached_model.cache_key == model.cache_key
+
+    loaded = load_analysis_result(dump_analysis_result(result), cached_model)
+    # the loaded result uses the variables of the model it is loaded for
+    assert loaded[0][0] is cached_model.membrane_voltage_var
+    assert [str(lhs) for lhs in loaded[1]] == [str(lhs) for lhs in result[1]]
+    assert set(cached_model.find_variables_and_derivatives(loaded[1].values())) <= \
+        set(cached_model.variables()) | set(cached_model.y_derivatives)
+
+    key = cache.get_analysis_key(model.cache_key, 'BackwardEulerModel', use_analytic_jacobian=False)
+    assert key != cache.get_analysis_key(model.cache_key, 'BackwardEulerModel', use_analytic_jacobian=True)
+    assert cache.load_analysis(key) == {}
+    cache.store_analysis(key, {'result': dump_analysis_result(result)})
+    assert load_analysis_result(cache.load_analysis(key)['result'], model)[0][0] is model.membrane_voltage_var
+
+
+def test_script_analysis_cache(tmp_path):
+    LOGGER.info('Testing analysis results are re-used with --cache-dir\n')
+    tmp_path = str(tmp_path)
+    cache_dir = os.path.join(tmp_path, 'cache')
+    generated = []
+    for run in range(2):  # first run fills the cache, second run (with a different class name) uses it
+        output_dir = os.path.join(tmp_path, str(run))
+        testargs = ['chaste_codegen', MODEL_FILE, '--backward-euler', '--output-dir', output_dir,
+                    '--cache-dir', cache_dir, '-c', 'Cell' + str(run)]
+        with mock.patch.object(sys, 'argv', testargs), \
+                mock.patch('chaste_codegen.backward_euler_model.get_non_linear_state_vars',
+                           side_effect=AssertionError('analysis not cached') if run else get_non_linear_state_vars):
+            chaste_codegen()
+        assert len(os.listdir(cache_dir)) == 2  # the model and the analysis
+        with open(os.path.join(output_dir, 'test_V_not_state_mparamBackwardEuler.cpp')) as f:
+            generated.append([line.replace('Cell' + str(run), 'Cell') for line in f if not line.startswith('//! on ')])
+    assert generated[0] == generated[1]
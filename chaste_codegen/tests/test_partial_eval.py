@@ -1,10 +1,22 @@
 import os
 
 import pytest
-from sympy import Eq, Piecewise, symbols
+from sympy import (
+    Eq,
+    Piecewise,
+    exp,
+    piecewise_fold,
+    symbols,
+)
 
-from chaste_codegen._partial_eval import partial_eval
-from chaste_codegen.tests.conftest import TESTS_FOLDER
+from chaste_codegen._cse import cse_engine
+from chaste_codegen._partial_eval import (
+    fold_piecewises,
+    lift_piecewises,
+    partial_eval,
+    piecewise_fold_engine,
+)
+from chaste_codegen.tests.conftest import TESTS_FOLDER, cache_model
 
 
 def test_wrong_params():
@@ -38,3 +50,48 @@ def test_partial_eval_piecewise():
     eqs = [Eq(x, 25), Eq(y, 26), Eq(z, Piecewise((1.2, x < y), (x, True)))]
     partial_eval_eqs = partial_eval(eqs, [z])
     assert partial_eval_eqs == [Eq(z, 1.2)]
+
+
+@pytest.mark.parametrize('engine', ['sympy', 'hash'])
+def test_fold_piecewises(engine):
+    x, y = symbols('x, y')
+    expr = exp(x + y) * Piecewise((x, x < y), (y, True)) + exp(x + y)
+    with cse_engine(engine):
+        assert fold_piecewises(expr) == piecewise_fold(expr)
+
+
+def test_lift_piecewises():
+    x, y = symbols('x, y')
+    p1 = Piecewise((x, x < y), (y, True))
+    p2 = Piecewise((2 * x, x < y), (y + 1, True))
+    p3 = Piecewise((x, y < 1), (2, True))
+
+    # lifted through sums, products, powers and functions
+    assert lift_piecewises(exp(p1) * 2 + 1) == Piecewise((2 * exp(x) + 1, x < y), (2 * exp(y) + 1, True))
+    assert lift_piecewises(p1 ** 2) == Piecewise((x ** 2, x < y), (y ** 2, True))
+
+    # piecewise expressions with the same conditions are combined piece by piece
+    assert lift_piecewises(p1 * p2) == Piecewise((2 * x ** 2, x < y), (y * (y + 1), True))
+    # otherwise all combinations are made
+    assert lift_piecewises(p1 + p3) == Piecewise((2 * x, (x < y) & (y < 1)), (x + 2, x < y), (x + y, y < 1),
+                                                 (y + 2, True))
+    assert lift_piecewises(p1 + p3, max_pieces=2) == p1 + p3
+
+    # nested piecewise expressions are flattened, dropping unreachable pieces
+    nested = Piecewise((Piecewise((x, x < y), (y, True)) + 1, x < y), (y, x < y), (0, True))
+    assert lift_piecewises(nested) == Piecewise((x + 1, x < y), (0, True))
+    assert lift_piecewises(x + y) == x + y
+
+
+def test_piecewise_fold_engine():
+    model = cache_model(os.path.join(TESTS_FOLDER, 'test_piecewises_be.cellml'))
+    derivatives = model.get_derivatives()
+    equations = model.get_equations_for(derivatives)
+    with piecewise_fold_engine('lift'):
+        derivative_eqs = partial_eval(equations, derivatives)
+    assert derivative_eqs == partial_eval(equations, derivatives)
+    assert any(eq.rhs.has(Piecewise) for eq in derivative_eqs)
+
+    with pytest.raises(AssertionError, match='Expecting engine to be one of'):
+        with piecewise_fold_engine('other'):
+            pass
@@ -182,3 +182,55 @@ class TestChastePrinter(object):
     def test_ITE(self, printer, x, y):
         expr = sp.ITE(x < 0.0, x < y, y < 0.0)
         assert printer.doprint(expr) == '((x < 0) ? (x < y) : (y < 0))'
+
+    def test_cached_printing(self, x, y):
+        cache = cg.PrintCache()
+        config = ['a']
+
+        def symbol_function(symbol):
+            return config[0] + '_' + symbol.name
+
+        cached_printer = cg.ChastePrinter(symbol_function=symbol_function, cache=cache, cache_key=lambda: config[0])
+        uncached_printer = cg.ChastePrinter(symbol_function=symbol_function)
+        expr = sp.exp(x) + 2 * sp.exp(x) * y
+        expected = uncached_printer.doprint(expr)
+        assert 'a_x' in expected
+        assert cached_printer.doprint(expr) == expected
+        misses = cache.misses
+        assert cached_printer.doprint(expr) == expected
+        assert cache.misses == misses and cache.hits > 0
+
+        # A different configuration is printed (and cached) separately
+        config[0] = 'b'
+        assert cached_printer.doprint(expr) == uncached_printer.doprint(expr) == expected.replace('a_', 'b_')
+        assert cache.misses > misses
+
+    def test_cached_printing_lookup_tables(self, x, y):
+        # Printers sharing a cache pass the lookup table expressions in cached entries to their lookup table function
+        cache = cg.PrintCache()
+        used = {'a': [], 'b': []}
+
+        def lookup_table_function(name):
+            return lambda expr: used[name].append(expr) or '_lt_0_row[0]' if expr == sp.exp(x) else None
+
+        printers = [cg.ChastePrinter(lookup_table_function=lookup_table_function(name), cache=cache,
+                                     cache_key=lambda: 'config') for name in ('a', 'b')]
+        expr = 2 * sp.exp(x) * y
+        assert printers[0].doprint(expr) == '2 * y * _lt_0_row[0]'
+        assert used == {'a': [sp.exp(x)], 'b': []}
+        misses = cache.misses
+        assert printers[1].doprint(expr) == '2 * y * _lt_0_row[0]'
+        assert cache.misses == misses
+        assert printers[1].doprint(sp.exp(x) * y) == 'y * _lt_0_row[0]'
+        assert used == {'a': [sp.exp(x)], 'b': [sp.exp(x), sp.exp(x)]}
+
+    def test_print_cache_eviction(self):
+        cache = cg.PrintCache(max_size=2)
+        assert cache.get('a', lambda: 1) == 1
+        assert cache.get('b', lambda: 2) == 2
+        assert cache.get('a', lambda: 3) == 1
+        assert cache.get('c', lambda: 4) == 4
+        assert len(cache) == 2
+        # b was least recently used, so it has been evicted
+        assert cache.get('b', lambda: 5) == 5
+        assert (cache.hits, cache.misses) == (1, 4)
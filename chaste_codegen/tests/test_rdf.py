@@ -1,15 +1,25 @@
 import os
+from unittest import mock
 
 import pytest
+import rdflib
 from cellmlmanip.rdf import create_rdf_node
 
-from chaste_codegen import DATA_DIR, CodegenError, load_model_with_conversions
+import chaste_codegen._rdf
+from chaste_codegen import (
+    DATA_DIR,
+    MODULE_DIR,
+    CodegenError,
+    load_model_with_conversions,
+)
 from chaste_codegen._rdf import (
     BQBIOL,
     OXMETA,
     PRED_IS,
     PRED_IS_VERSION_OF,
+    get_MultipleUsesAllowed_tags,
     get_variables_transitively,
+    ontology_index_dir,
 )
 
 
@@ -47,3 +57,31 @@ def test_rdf_error():
     model_name = os.path.join(TESTS_FOLDER, 'rdf_error_TenTusscher2006Epi.cellml')
     with pytest.raises(CodegenError, match='does not refer to any existing variable in the model.'):
         load_model_with_conversions(model_name)
+
+
+def test_ontology_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(chaste_codegen._rdf, '_ONTOLOGY_INDEX', None)
+    with ontology_index_dir(str(tmp_path)):
+        index = chaste_codegen._rdf._load_ontology_index()
+    index_files = os.listdir(str(tmp_path))
+    assert len(index_files) == 1 and index_files[0].startswith('oxford-metadata-')
+
+    ontology = rdflib.Graph()
+    ontology.parse(os.path.join(MODULE_DIR, 'ontologies', 'oxford-metadata.ttl'), format='turtle')
+    for term in (create_rdf_node((OXMETA, 'IonicCurrent')), create_rdf_node((OXMETA, 'Concentration'))):
+        assert set(index['types'][term]) == set(ontology.transitive_subjects(rdflib.RDF.type, term))
+    assert 'hodgkin_huxley_gate' in get_MultipleUsesAllowed_tags()
+
+    # The stored index is used in later runs
+    monkeypatch.setattr(chaste_codegen._rdf, '_ONTOLOGY_INDEX', None)
+    with ontology_index_dir(str(tmp_path)), mock.patch('chaste_codegen._rdf._build_ontology_index') as build:
+        assert chaste_codegen._rdf._load_ontology_index() == index
+        build.assert_not_called()
+
+    # Without a folder the index isn't read or stored
+    monkeypatch.setattr(chaste_codegen._rdf, '_ONTOLOGY_INDEX', None)
+    with ontology_index_dir(None), mock.patch('chaste_codegen._rdf._build_ontology_index',
+                                              wraps=chaste_codegen._rdf._build_ontology_index) as build:
+        assert chaste_codegen._rdf._load_ontology_index() == index
+        build.assert_called_once()
+    assert os.listdir(str(tmp_path)) == index_files
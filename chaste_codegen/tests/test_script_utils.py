@@ -3,7 +3,12 @@ import random
 
 import pytest
 
-from chaste_codegen._script_utils import write_file
+from chaste_codegen._script_utils import (
+    file_hash,
+    read_manifest,
+    write_file,
+    write_manifest,
+)
 
 
 def test_wrong_params1():
@@ -22,3 +27,24 @@ def test_save_reload(tmp_path):
     file_contents = str([random.random() for _ in range(1000)])
     write_file(file_name, file_contents)
     assert open(file_name, 'r').read() == file_contents
+
+
+def test_write_only_if_changed(tmp_path):
+    file_name = os.path.join(str(tmp_path), "model.cpp")
+    write_file(file_name, "//! on 2020-01-01 10:00:00\nint x;\n")
+    # Only the generation date differs: the file is left alone
+    assert not write_file(file_name, "//! on 2021-02-02 11:11:11\nint x;\n", only_if_changed=True)
+    assert open(file_name, 'r').read() == "//! on 2020-01-01 10:00:00\nint x;\n"
+    assert write_file(file_name, "//! on 2021-02-02 11:11:11\nint y;\n", only_if_changed=True)
+    assert open(file_name, 'r').read() == "//! on 2021-02-02 11:11:11\nint y;\n"
+    assert write_file(os.path.join(str(tmp_path), "new.cpp"), "int x;\n", only_if_changed=True)
+
+
+def test_manifest(tmp_path):
+    file_name = os.path.join(str(tmp_path), "model.manifest.json")
+    assert read_manifest(file_name) is None
+    manifest = {'translator': 'NormalChasteModel', 'files': {'model.cpp': file_hash(__file__)}}
+    write_manifest(file_name, manifest)
+    assert read_manifest(file_name) == manifest
+    write_file(file_name, "{not json")
+    assert read_manifest(file_name) is None
@@ -0,0 +1,86 @@
+import json
+import os
+import pstats
+import sys
+from unittest import mock
+
+from chaste_codegen import LOGGER
+from chaste_codegen._command_line_script import chaste_codegen
+from chaste_codegen._timings import (
+    add_phases,
+    is_recording,
+    profile,
+    record_timings,
+    timed,
+)
+from chaste_codegen.tests.conftest import TESTS_FOLDER
+
+
+@timed('decorated')
+def _decorated(n):
+    return [0] * n
+
+
+def test_record_timings():
+    LOGGER.info('Testing recording timings\n')
+    assert not is_recording()
+    with timed('not recorded'):
+        pass
+    with record_timings() as timings:
+        assert is_recording()
+        with timed('outer'):
+            _decorated(100000)
+            _decorated(10)
+            with timed('inner'):
+                pass
+            add_phases([{'name': 'other_process', 'calls': 2, 'wall_time': 1.5, 'peak_memory': None}])
+    assert not is_recording()
+
+    report = timings.report()
+    phases = {phase['name']: phase for phase in report['phases']}
+    assert list(phases) == ['outer/decorated', 'outer/inner', 'outer/other_process', 'outer']
+    assert phases['outer/decorated']['calls'] == 2
+    assert phases['outer/decorated']['peak_memory'] >= 100000 * 8
+    assert phases['outer']['peak_memory'] >= phases['outer/decorated']['peak_memory']
+    assert phases['outer/other_process'] == {'name': 'outer/other_process', 'calls': 2, 'wall_time': 1.5,
+                                             'peak_memory': None}
+    assert phases['outer']['wall_time'] <= report['total_wall_time']
+
+
+def test_record_timings_without_memory():
+    LOGGER.info('Testing recording timings without tracing memory\n')
+    with record_timings(trace_memory=False) as timings:
+        _decorated(10)
+    assert timings.report()['phases'] == [{'name': 'decorated', 'calls': 1, 'wall_time': mock.ANY,
+                                           'peak_memory': None}]
+
+
+def test_profile(tmp_path):
+    LOGGER.info('Testing profiling\n')
+    stats_file = os.path.join(str(tmp_path), 'profile', 'stats.pstats')
+    with profile(stats_file):
+        _decorated(10)
+    assert any(func[2] == '_decorated' for func in pstats.Stats(stats_file).stats)
+    with profile(None) as profiler:
+        assert profiler is None
+
+
+def test_script_timings_and_profile(tmp_path):
+    LOGGER.info('Testing --timings and --profile\n')
+    tmp_path = str(tmp_path)
+    timings_file = os.path.join(tmp_path, 'timings.json')
+    testargs = ['chaste_codegen', os.path.join(TESTS_FOLDER, 'test_V_not_state_mparam.cellml'), '--cvode', '--opt',
+                '--use-analytic-jacobian', '--output-dir', tmp_path, '--no-cache', '--timings', timings_file,
+                '--profile', os.path.join(tmp_path, 'profile')]
+    with mock.patch.object(sys, 'argv', testargs):
+        chaste_codegen()
+
+    with open(timings_file, 'r') as f:
+        phases = [phase['name'] for phase in json.load(f)['phases']]
+    for phase in ('load_model/parse', 'load_model/add_conversions', 'load_model',
+                  'CvodeChasteModel/__init__/get_jacobian/cse', 'CvodeChasteModel/generate_chaste_code/render',
+                  'OptCvodeChasteModel/__init__/calc_lookup_tables', 'OptCvodeChasteModel'):
+        assert phase in phases
+    assert sorted(os.listdir(os.path.join(tmp_path, 'profile'))) == \
+        ['test_V_not_state_mparam.load.pstats', 'test_V_not_state_mparamCvode.pstats',
+         'test_V_not_state_mparamCvodeOpt.pstats']
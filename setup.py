@@ -81,6 +81,8 @@ setup(
         'console_scripts': [
             'chaste_codegen='
             'chaste_codegen._command_line_script:chaste_codegen',
+            'chaste_codegen_bench='
+            'chaste_codegen._benchmark_script:chaste_codegen_bench',
         ],
     },
 )